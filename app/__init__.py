@@ -4,6 +4,7 @@ from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 
 from app.config import config
+from app.json_provider import FastJSONProvider
 
 # 拡張機能の初期化
 db: SQLAlchemy = SQLAlchemy()
@@ -16,12 +17,29 @@ def create_app(config_name: str = "default") -> Flask:
 
     # 設定の読み込み
     app.config.from_object(config[config_name])
+    app.json = FastJSONProvider(app)
+
+    # リードレプリカをバインドとして登録（DatabaseServiceの読み取りで使用）
+    binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+    for i, url in enumerate(app.config.get("SQLALCHEMY_REPLICA_URIS", [])):
+        binds[f"replica_{i}"] = url
+    app.config["SQLALCHEMY_BINDS"] = binds
 
     # 拡張機能の初期化
     db.init_app(app)
     migrate.init_app(app, db)
     CORS(app, origins=app.config["CORS_ORIGINS"])
 
+    # クエリ数・DB時間の計測（遅いクエリ・N+1の検出）
+    from app.query_metrics import init_query_metrics
+
+    init_query_metrics(app)
+
+    # 銘柄データの読み取りキャッシュ（DatabaseServiceが参照）
+    from app.services.stock_cache import create_stock_cache
+
+    app.extensions["stock_cache"] = create_stock_cache(app.config)
+
     # ブループリントの登録
     from app.routes.main import main as main_blueprint
 
@@ -31,4 +49,9 @@ def create_app(config_name: str = "default") -> Flask:
 
     app.register_blueprint(api_blueprint, url_prefix="/api")
 
+    # CLIコマンドの登録
+    from app.cli import register_commands
+
+    register_commands(app)
+
     return app
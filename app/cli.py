@@ -0,0 +1,268 @@
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, TypeVar, cast
+
+import click
+from flask import Flask, current_app
+from flask.cli import with_appcontext
+
+from app.services.database import DatabaseService
+from app.services.fetch_log import FetchLogWriter
+from app.services.job_runner import job_runner
+from app.services.partitioning import PartitionError, partition_manager
+from app.services.price_bars import INTERVAL_SECONDS, PriceBarService
+from app.services.snapshot import PARTITION_CHOICES, SNAPSHOT_FORMATS, SnapshotWriter
+from app.services.yahoo_finance import YahooFinanceService
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def _with_appcontext(f: F) -> F:
+    """型注釈付きの with_appcontext（Flask 3.0の定義は型注釈がないため）"""
+    return cast(F, with_appcontext(f))
+
+
+def _read_symbols(path: str) -> List[str]:
+    """シンボル一覧ファイルを読み込み（1行1シンボル、CSVの場合は先頭列）"""
+    symbols: List[str] = []
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            symbol = line.split(",")[0].strip()
+            if not symbol or symbol.startswith("#") or symbol in seen:
+                continue
+            seen.add(symbol)
+            symbols.append(symbol)
+    return symbols
+
+
+def _load_checkpoint(path: str) -> Dict[str, List[str]]:
+    """チェックポイントを読み込み"""
+    if not os.path.exists(path):
+        return {"completed": [], "failed": []}
+    with open(path, "r", encoding="utf-8") as f:
+        data: Dict[str, List[str]] = json.load(f)
+    return data
+
+
+def _save_checkpoint(path: str, checkpoint: Dict[str, List[str]]) -> None:
+    """チェックポイントを保存（書き込み途中の中断に備えて置き換えで保存）"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+@click.command("backfill")
+@click.argument("symbols_file", type=click.Path(exists=True, dir_okay=False))
+@click.option("--concurrency", default=4, show_default=True, help="同時取得数")
+@click.option("--batch-size", default=50, show_default=True, help="バッチサイズ")
+@click.option(
+    "--checkpoint",
+    "checkpoint_path",
+    default=None,
+    help="チェックポイントファイル（既定: <SYMBOLS_FILE>.checkpoint.json）",
+)
+@click.option("--restart", is_flag=True, help="チェックポイントを破棄して最初から実行")
+@click.option(
+    "--interval",
+    type=click.Choice(list(INTERVAL_SECONDS)),
+    default="1d",
+    show_default=True,
+    help="足の種類",
+)
+@_with_appcontext
+def backfill_command(
+    symbols_file: str,
+    concurrency: int,
+    batch_size: int,
+    checkpoint_path: str,
+    restart: bool,
+    interval: str,
+) -> None:
+    """シンボル一覧ファイルから株価データを一括取得（中断後は再開可能）"""
+    checkpoint_path = checkpoint_path or f"{symbols_file}.checkpoint.json"
+    if restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    symbols = _read_symbols(symbols_file)
+    checkpoint = _load_checkpoint(checkpoint_path)
+    completed = set(checkpoint["completed"])
+    pending = [symbol for symbol in symbols if symbol not in completed]
+
+    click.echo(
+        f"対象 {len(symbols)} 件 / 完了済み {len(symbols) - len(pending)} 件 / "
+        f"残り {len(pending)} 件"
+    )
+
+    yahoo_service = YahooFinanceService()
+    db_service = DatabaseService()
+    log_writer = FetchLogWriter()
+    task_id = str(uuid.uuid4())
+    started = time.monotonic()
+    processed = 0
+    failed: List[str] = []
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start : start + batch_size]
+
+            # 取得は並列、保存はアプリケーションコンテキストを持つこのスレッドで実行
+            results = executor.map(
+                yahoo_service.fetch_stock_data_with_attempt,
+                batch,
+                [interval] * len(batch),
+            )
+            for symbol, (stock_data, attempt) in zip(batch, results):
+                if yahoo_service.store_fetch_result(
+                    task_id, stock_data, attempt, db_service, log_writer
+                ):
+                    checkpoint["completed"].append(symbol)
+                else:
+                    failed.append(symbol)
+
+            processed += len(batch)
+            checkpoint["failed"] = failed
+            _save_checkpoint(checkpoint_path, checkpoint)
+
+            elapsed = time.monotonic() - started
+            rate = processed / elapsed if elapsed > 0 else 0.0
+            eta = (len(pending) - processed) / rate if rate > 0 else 0.0
+            click.echo(
+                f"{processed}/{len(pending)} 件処理 "
+                f"({rate:.1f} 件/秒, 残り約 {eta:.0f} 秒, 失敗 {len(failed)} 件)"
+            )
+
+    log_writer.flush()
+    click.echo(f"完了: 成功 {processed - len(failed)} 件 / 失敗 {len(failed)} 件")
+    if failed:
+        click.echo("失敗したシンボルは再実行時に再取得されます")
+
+
+@click.command("maintain-bars")
+@_with_appcontext
+def maintain_bars_command() -> None:
+    """保持期間を過ぎた価格バーを上位の足へ集約して削除（cron等で定期実行）"""
+    try:
+        created = partition_manager.ensure_partitions()
+    except PartitionError as e:
+        raise click.ClickException(str(e))
+    if created:
+        click.echo(f"パーティション作成: {len(created)} 件")
+
+    results = PriceBarService().apply_retention()
+    for interval, counts in results.items():
+        click.echo(
+            f"{interval}: 集約 {counts['rolled_up']} 件 / 削除 {counts['purged']} 件 / "
+            f"パーティション削除 {counts['dropped_partitions']} 件"
+        )
+
+
+@click.command("partition-bars")
+@_with_appcontext
+def partition_bars_command() -> None:
+    """既存の price_bars をパーティション化したテーブルへ移行（PostgreSQLのみ）"""
+    if not partition_manager.is_supported():
+        click.echo("PostgreSQL以外ではパーティション分割は不要です")
+        return
+
+    result = partition_manager.convert_table()
+    if result["converted"]:
+        click.echo(f"移行完了: {result['rows']} 行をパーティションへ移しました")
+    else:
+        click.echo("移行済みです（不足していたパーティションを作成しました）")
+    created = partition_manager.ensure_partitions()
+    click.echo(f"月別パーティション作成: {len(created)} 件")
+
+
+@click.command("snapshot")
+@click.argument("output_dir", required=False)
+@click.option(
+    "--format",
+    "file_format",
+    type=click.Choice(SNAPSHOT_FORMATS),
+    default="arrow",
+    show_default=True,
+    help="出力形式（arrowはメモリマップで読み込み可能）",
+)
+@click.option(
+    "--partition-by",
+    type=click.Choice(PARTITION_CHOICES),
+    default="symbol",
+    show_default=True,
+    help="パーティション単位",
+)
+@click.option(
+    "--interval",
+    "intervals",
+    type=click.Choice(list(INTERVAL_SECONDS)),
+    multiple=True,
+    help="対象の足の種類（複数指定可、既定は全て）",
+)
+@click.option("--keep", type=int, default=None, help="保持するスナップショット数")
+@_with_appcontext
+def snapshot_command(
+    output_dir: str,
+    file_format: str,
+    partition_by: str,
+    intervals: List[str],
+    keep: int,
+) -> None:
+    """価格バーのスナップショットを列指向ファイルに書き出し（日次のcron等で実行）"""
+    output_dir = output_dir or current_app.config["SNAPSHOT_DIR"]
+    if keep is None:
+        keep = current_app.config.get("SNAPSHOT_KEEP", 7)
+
+    try:
+        writer = SnapshotWriter(output_dir, file_format, partition_by)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = writer.write(list(intervals) or None, keep=keep)
+    for interval, summary in manifest["intervals"].items():
+        click.echo(
+            f"{interval}: {summary['rows']} 行 / "
+            f"{len(summary['partitions'])} パーティション"
+        )
+    click.echo(f"スナップショット作成: {manifest['snapshot_id']}")
+
+
+@click.command("resume-tasks")
+@click.option(
+    "--stale-seconds",
+    type=int,
+    default=None,
+    help="生存時刻がこの秒数以上更新されていない実行中タスクを停止したものとみなす（既定: FETCH_TASK_STALE_SECONDS）",
+)
+@_with_appcontext
+def resume_tasks_command(stale_seconds: int) -> None:
+    """停止したプロセスの取得タスクを残りの銘柄から再開し、完了まで実行する
+
+    デプロイ・再起動後に1回（またはcron等で定期的に）実行する。実行中のプロセスの
+    タスクは生存時刻が更新され続けるため対象にならず、停止したタスクも比較付き更新で
+    引き受けるため、同時に複数実行しても同じタスクを二重に再開しない。
+    """
+    result = YahooFinanceService().resume_interrupted_tasks(
+        stale_seconds or current_app.config["FETCH_TASK_STALE_SECONDS"]
+    )
+    click.echo(
+        f"取得タスク 再開: {len(result['resumed'])} 件 / 中断: {len(result['interrupted'])} 件"
+    )
+
+    # コマンドの終了とともにワーカーが止まらないよう、登録したジョブの完了を待つ
+    job_runner.shutdown()
+    for task_id in result["resumed"]:
+        click.echo(f"{task_id}: 完了")
+
+
+def register_commands(app: Flask) -> None:
+    """CLIコマンドを登録"""
+    app.cli.add_command(backfill_command)
+    app.cli.add_command(maintain_bars_command)
+    app.cli.add_command(partition_bars_command)
+    app.cli.add_command(snapshot_command)
+    app.cli.add_command(resume_tasks_command)
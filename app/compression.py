@@ -0,0 +1,57 @@
+import gzip
+from typing import Optional
+
+from flask import Blueprint, current_app, request
+from flask.wrappers import Response
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli未インストール環境ではgzipのみ
+    brotli = None
+
+
+def _choose_encoding() -> Optional[str]:
+    """Accept-Encodingから使用する圧縮方式を決定（brotli優先）"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress_response(response: Response) -> Response:
+    """一定サイズ以上のレスポンスを圧縮"""
+    response.vary.add("Accept-Encoding")
+
+    # ストリーミング（エクスポート等）は先頭バイトを即時返すため対象外
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or not 200 <= response.status_code < 300
+    ):
+        return response
+
+    data = response.get_data()
+    if len(data) < current_app.config.get("COMPRESSION_MIN_SIZE", 1024):
+        return response
+
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+
+    level = current_app.config.get("COMPRESSION_LEVEL", 6)
+    if encoding == "br":
+        compressed = brotli.compress(data, quality=min(level, 11))
+    else:
+        compressed = gzip.compress(data, compresslevel=level)
+
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def init_compression(blueprint: Blueprint) -> None:
+    """ブループリントのレスポンスに圧縮を適用"""
+    blueprint.after_request(compress_response)
@@ -14,12 +14,175 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = os.environ.get("FLASK_ENV") == "development"
 
-    # Yahoo Finance 設定
-    YAHOO_FINANCE_BASE_URL = os.environ.get(
-        "YAHOO_FINANCE_BASE_URL", "https://query1.finance.yahoo.com"
+    # リードレプリカ設定（カンマ区切りで複数指定可、未指定時はプライマリのみ）
+    SQLALCHEMY_REPLICA_URIS = [
+        url.strip()
+        for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",")
+        if url.strip()
+    ]
+    # 書き込み直後はこの秒数だけプライマリから読む（read-your-writes）
+    REPLICA_READ_YOUR_WRITES_SECONDS = int(
+        os.environ.get("REPLICA_READ_YOUR_WRITES_SECONDS", 5)
     )
+
+    # Yahoo Finance 設定（接続先は YAHOO_HOSTS を参照）
     YAHOO_FINANCE_TIMEOUT = int(os.environ.get("YAHOO_FINANCE_TIMEOUT", 30))
 
+    # Redis 設定
+    REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+    # プログレス管理設定（file: ローカルファイル / redis: 複数ワーカー共有）
+    PROGRESS_BACKEND = os.environ.get("PROGRESS_BACKEND", "file")
+    PROGRESS_FILE = os.environ.get("PROGRESS_FILE", "progress_data.json")
+    PROGRESS_TTL_SECONDS = int(os.environ.get("PROGRESS_TTL_SECONDS", 7 * 24 * 3600))
+
+    # 取得ログ（FetchLog）の一括書き込み設定
+    FETCH_LOG_BATCH_SIZE = int(os.environ.get("FETCH_LOG_BATCH_SIZE", 100))
+    FETCH_LOG_FLUSH_INTERVAL = float(os.environ.get("FETCH_LOG_FLUSH_INTERVAL", 5.0))
+
+    # シンボル検証（取得要求のシンボルをマスタと保存済みシンボルで検証、マスタがなければ検証しない）
+    SYMBOL_VALIDATION_ENABLED = (
+        os.environ.get("SYMBOL_VALIDATION_ENABLED", "True").lower() == "true"
+    )
+    # シンボルマスタ設定（CSV: symbol,name,exchange）
+    SYMBOL_MASTER_PATH = os.environ.get("SYMBOL_MASTER_PATH", "data/symbol_master.csv")
+    SYMBOL_MASTER_REFRESH_SECONDS = int(
+        os.environ.get("SYMBOL_MASTER_REFRESH_SECONDS", 3600)
+    )
+    SYMBOL_NEGATIVE_CACHE_SECONDS = int(
+        os.environ.get("SYMBOL_NEGATIVE_CACHE_SECONDS", 3600)
+    )
+    SYMBOL_NEGATIVE_CACHE_MAX_ENTRIES = int(
+        os.environ.get("SYMBOL_NEGATIVE_CACHE_MAX_ENTRIES", 10000)
+    )
+    # マスタにないシンボルをYahoo Financeの検索APIで確認するか（要求内で1件ずつ問い合わせる）
+    SYMBOL_VALIDATION_REMOTE_FALLBACK = (
+        os.environ.get("SYMBOL_VALIDATION_REMOTE_FALLBACK", "False").lower() == "true"
+    )
+
+    # 価格バー設定（足の種類ごとの保持日数、Noneは無期限）
+    PRICE_BAR_RETENTION_DAYS = {
+        "1m": int(os.environ.get("PRICE_BAR_RETENTION_1M_DAYS", 7)),
+        "5m": int(os.environ.get("PRICE_BAR_RETENTION_5M_DAYS", 60)),
+        "15m": int(os.environ.get("PRICE_BAR_RETENTION_15M_DAYS", 60)),
+        "1h": int(os.environ.get("PRICE_BAR_RETENTION_1H_DAYS", 730)),
+        "1d": None,
+    }
+    # PostgreSQLの月別パーティションを何か月先まで事前作成するか
+    PRICE_BAR_PARTITION_MONTHS_AHEAD = int(
+        os.environ.get("PRICE_BAR_PARTITION_MONTHS_AHEAD", 3)
+    )
+
+    # スクリーナー設定（保持する日足の本数と、他プロセスの更新を取り込む再構築間隔）
+    SCREENER_WINDOW = int(os.environ.get("SCREENER_WINDOW", 260))
+    SCREENER_REFRESH_SECONDS = int(os.environ.get("SCREENER_REFRESH_SECONDS", 300))
+
+    # 相関分析の結果キャッシュ件数
+    ANALYTICS_CACHE_SIZE = int(os.environ.get("ANALYTICS_CACHE_SIZE", 128))
+
+    # バックテスト設定（プロセス数が2以上かつ実行件数が閾値以上のときプロセスプールで分割実行）
+    BACKTEST_WORKERS = int(os.environ.get("BACKTEST_WORKERS", 0))
+    BACKTEST_PARALLEL_MIN_RUNS = int(os.environ.get("BACKTEST_PARALLEL_MIN_RUNS", 200))
+
+    # 価格バースナップショットの出力先と保持世代数
+    SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "data/snapshots")
+    SNAPSHOT_KEEP = int(os.environ.get("SNAPSHOT_KEEP", 7))
+
+    # Yahoo Finance上流ホスト（カンマ区切り、先頭を優先）とサーキットブレーカー・ヘッジ設定
+    # 未設定時は従来の YAHOO_FINANCE_BASE_URL を単一ホストとして使う
+    YAHOO_HOSTS = [
+        host.strip()
+        for host in os.environ.get(
+            "YAHOO_HOSTS",
+            os.environ.get(
+                "YAHOO_FINANCE_BASE_URL",
+                "https://query1.finance.yahoo.com,https://query2.finance.yahoo.com",
+            ),
+        ).split(",")
+        if host.strip()
+    ]
+    UPSTREAM_FAILURE_THRESHOLD = int(os.environ.get("UPSTREAM_FAILURE_THRESHOLD", 5))
+    UPSTREAM_RESET_SECONDS = float(os.environ.get("UPSTREAM_RESET_SECONDS", 30))
+    UPSTREAM_HEDGE_ENABLED = (
+        os.environ.get("UPSTREAM_HEDGE_ENABLED", "False").lower() == "true"
+    )
+    # 直近の応答時間のこのパーセンタイルを超えたら別ホストへヘッジ要求を送る
+    UPSTREAM_HEDGE_PERCENTILE = float(os.environ.get("UPSTREAM_HEDGE_PERCENTILE", 0.95))
+
+    # 株価データ取得ジョブのワーカー数（0はリクエスト内で同期実行）と優先度レーン設定
+    # 重みはレーン間の実行比率、上限はレーンごとの同時実行数（bulk・scheduledの上限の
+    # 合計をワーカー数未満にしておくと、interactiveは常に空きワーカーで実行される）
+    FETCH_WORKERS = int(os.environ.get("FETCH_WORKERS", 4))
+    FETCH_LANE_WEIGHTS = {
+        name.strip(): int(value)
+        for name, _, value in (
+            item.partition(":")
+            for item in os.environ.get(
+                "FETCH_LANE_WEIGHTS", "interactive:8,scheduled:3,bulk:1"
+            ).split(",")
+        )
+        if value.strip()
+    }
+    FETCH_LANE_CAPS = {
+        name.strip(): int(value)
+        for name, _, value in (
+            item.partition(":")
+            for item in os.environ.get("FETCH_LANE_CAPS", "scheduled:1,bulk:2").split(
+                ","
+            )
+        )
+        if value.strip()
+    }
+    # lane未指定時、この件数以下はinteractive、超える場合はbulkとして扱う
+    FETCH_INTERACTIVE_MAX_SYMBOLS = int(
+        os.environ.get("FETCH_INTERACTIVE_MAX_SYMBOLS", 20)
+    )
+
+    # 実行中のタスクは待機中も含めて一定間隔で生存時刻を更新し、flask resume-tasks は
+    # 生存時刻がこの秒数以上更新されていないタスクを停止したプロセスのものとみなして再開する
+    FETCH_TASK_HEARTBEAT_SECONDS = float(
+        os.environ.get("FETCH_TASK_HEARTBEAT_SECONDS", 30)
+    )
+    FETCH_TASK_STALE_SECONDS = int(os.environ.get("FETCH_TASK_STALE_SECONDS", 600))
+
+    # リアルタイム株価配信（銘柄ごとのポーリング間隔と、更新がない間の接続維持の間隔）
+    QUOTE_POLL_SECONDS = float(os.environ.get("QUOTE_POLL_SECONDS", 5))
+    QUOTE_STREAM_HEARTBEAT_SECONDS = float(
+        os.environ.get("QUOTE_STREAM_HEARTBEAT_SECONDS", 15)
+    )
+
+    # 銘柄データの読み取りキャッシュ（local: プロセス内のみ / redis: ワーカー間で共有し、
+    # 更新時はpub/subで全ワーカーのプロセス内キャッシュを無効化）
+    # localは他のワーカーの更新を無効化できずTTLの間古い値を返すため、既定は無効とし、
+    # 複数ワーカーで有効にする場合はredisを使う
+    STOCK_CACHE_ENABLED = (
+        os.environ.get("STOCK_CACHE_ENABLED", "False").lower() == "true"
+    )
+    STOCK_CACHE_BACKEND = os.environ.get("STOCK_CACHE_BACKEND", "local")
+    STOCK_CACHE_TTL_SECONDS = float(os.environ.get("STOCK_CACHE_TTL_SECONDS", 60))
+    STOCK_CACHE_MAX_ENTRIES = int(os.environ.get("STOCK_CACHE_MAX_ENTRIES", 1000))
+    # プロセス内キャッシュのメモリ上限（シリアライズ後のバイト数）
+    STOCK_CACHE_MAX_BYTES = int(
+        os.environ.get("STOCK_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+    )
+
+    # リクエストのプロファイル取得（トークン未設定時は無効。X-Profile-Tokenヘッダーで
+    # 個別に、または管理APIで有効化した期間中はサンプリングで取得する）
+    PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN", "")
+    PROFILING_MAX_PER_MINUTE = int(os.environ.get("PROFILING_MAX_PER_MINUTE", 6))
+    PROFILING_KEEP = int(os.environ.get("PROFILING_KEEP", 20))
+    PROFILING_TOP_N = int(os.environ.get("PROFILING_TOP_N", 30))
+    # 有効化の状態・取得結果の保存先（local: プロセスごと / redis: 全ワーカーで共有）
+    PROFILING_BACKEND = os.environ.get("PROFILING_BACKEND", "local")
+
+    # SQLクエリの計測（リクエストごとのクエリ数・DB時間をX-DB-*ヘッダーと
+    # /api/metrics/db で出力し、遅いクエリと同じクエリの繰り返し（N+1）をログに出す）
+    SQL_METRICS_ENABLED = (
+        os.environ.get("SQL_METRICS_ENABLED", "True").lower() == "true"
+    )
+    SQL_SLOW_QUERY_MS = float(os.environ.get("SQL_SLOW_QUERY_MS", 100))
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.environ.get("SQL_N_PLUS_ONE_THRESHOLD", 10))
+
     # CORS設定
     CORS_ORIGINS = ["http://localhost:8000", "http://127.0.0.1:8000"]
 
@@ -27,6 +190,10 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     JSON_SORT_KEYS = False
 
+    # レスポンス圧縮設定（このサイズ未満は圧縮しない）
+    COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+    COMPRESSION_LEVEL = int(os.environ.get("COMPRESSION_LEVEL", 6))
+
     # ページネーション設定
     DEFAULT_PER_PAGE = 12
     MAX_PER_PAGE = 100
@@ -55,6 +222,10 @@ class TestingConfig(Config):
     TESTING = True
     WTF_CSRF_ENABLED = False
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+    # インメモリDBは接続ごとに別のDBになるため、取得ジョブは同期実行する
+    FETCH_WORKERS = 0
+    # 上流の検索APIに問い合わせないよう、検証はテストごとに有効化する
+    SYMBOL_VALIDATION_ENABLED = False
 
 
 # 環境別設定マッピング
@@ -1,6 +1,7 @@
 from datetime import datetime, timezone
 from typing import Any, Dict
 
+from sqlalchemy import event
 from sqlalchemy.dialects.postgresql import JSON
 
 from app import db
@@ -39,6 +40,13 @@ class StockData(db.Model):
     # 履歴データ（JSON形式）
     historical_data = db.Column(JSON, nullable=True)
 
+    # 配当・株式分割イベントと累積調整係数（JSON形式、イベント追加時のみ再計算）
+    corporate_actions = db.Column(JSON, nullable=True)
+    adjustment_factors = db.Column(JSON, nullable=True)
+
+    # 取り込み時のデータ品質レポート（JSON形式）
+    quality_report = db.Column(JSON, nullable=True)
+
     # タイムスタンプ
     created_at = db.Column(
         db.DateTime,
@@ -50,6 +58,7 @@ class StockData(db.Model):
         nullable=False,
         default=lambda: datetime.now(timezone.utc),
         onupdate=lambda: datetime.now(timezone.utc),
+        index=True,
     )
 
     def __repr__(self) -> str:
@@ -67,6 +76,8 @@ class StockData(db.Model):
             "timezone": self.timezone,
             "exchange": self.exchange,
             "historical_data": self.historical_data,
+            "corporate_actions": self.corporate_actions,
+            "quality_report": self.quality_report,
             "created_at": (self.created_at.isoformat() if self.created_at else None),
             "updated_at": (self.updated_at.isoformat() if self.updated_at else None),
         }
@@ -76,6 +87,20 @@ class FetchLog(db.Model):
     """データ取得ログモデル"""
 
     __tablename__ = "fetch_logs"
+    __table_args__ = (
+        # 集計（/api/fetch-logs/stats）用のカバリングインデックス
+        db.Index(
+            "ix_fetch_logs_started_at_covering", "started_at", "status", "duration_ms"
+        ),
+        db.Index(
+            "ix_fetch_logs_symbol_started_at_covering",
+            "symbol",
+            "started_at",
+            "status",
+            "duration_ms",
+        ),
+        db.Index("ix_fetch_logs_task_id_status", "task_id", "status"),
+    )
 
     # 主キー
     id = db.Column(db.Integer, primary_key=True)
@@ -96,6 +121,7 @@ class FetchLog(db.Model):
         default=lambda: datetime.now(timezone.utc),
     )
     completed_at = db.Column(db.DateTime, nullable=True)
+    duration_ms = db.Column(db.Float, nullable=True)
 
     # 取得データへのリンク
     stock_data_id = db.Column(
@@ -124,5 +150,54 @@ class FetchLog(db.Model):
             "completed_at": (
                 self.completed_at.isoformat() if self.completed_at else None
             ),
+            "duration_ms": self.duration_ms,
             "stock_data_id": self.stock_data_id,
         }
+
+
+class PriceBar(db.Model):
+    """価格バー（足）モデル
+
+    足の種類（interval）ごとに保持し、保持期間は設定 PRICE_BAR_RETENTION_DAYS で管理する。
+    bar_time は足の開始時刻（UTC、タイムゾーンなし）。
+    """
+
+    __tablename__ = "price_bars"
+    # PostgreSQLでは足の種類→月の2段階で宣言的パーティション分割する（SQLiteでは無視）
+    __table_args__ = {"postgresql_partition_by": "LIST (interval)"}
+
+    # 主キー（シンボル・足種別・時刻の範囲検索にそのまま使用）
+    symbol = db.Column(db.String(20), primary_key=True)
+    interval = db.Column(db.String(5), primary_key=True)
+    bar_time = db.Column(db.DateTime, primary_key=True)
+
+    # 四本値・出来高
+    open = db.Column(db.Float, nullable=True)
+    high = db.Column(db.Float, nullable=True)
+    low = db.Column(db.Float, nullable=True)
+    close = db.Column(db.Float, nullable=True)
+    volume = db.Column(db.BigInteger, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"<PriceBar {self.symbol} {self.interval} {self.bar_time}>"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """辞書形式でデータを返す"""
+        return {
+            "symbol": self.symbol,
+            "interval": self.interval,
+            "bar_time": self.bar_time.isoformat() if self.bar_time else None,
+            "open": self.open,
+            "high": self.high,
+            "low": self.low,
+            "close": self.close,
+            "volume": self.volume,
+        }
+
+
+@event.listens_for(PriceBar.__table__, "after_create")
+def _create_price_bar_partitions(target: Any, connection: Any, **kw: Any) -> None:
+    """price_bars作成後に足の種類ごとのパーティションを作成"""
+    from app.services.partitioning import create_interval_partitions
+
+    create_interval_partitions(connection)
@@ -0,0 +1,402 @@
+import base64
+import cProfile
+import hmac
+import json
+import marshal
+import math
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import UTC, datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from flask import Blueprint, current_app, g, request
+from flask.wrappers import Response
+
+from app.config import Config
+
+# プロファイル取得を指示・認証するヘッダー
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+# 管理用エンドポイント（プロファイル対象外）
+ADMIN_PATH_PREFIX = "/api/admin/"
+# Redis共有時の取得中フラグの期限（取得中のワーカーが停止した場合に枠を戻す）
+ACTIVE_TTL_SECONDS = 60
+# Redis共有時の取得結果の保持期間
+PROFILE_TTL_SECONDS = 24 * 60 * 60
+
+
+def _function_name(key: Any) -> str:
+    filename, line, name = key
+    return f"{filename}:{line}({name})"
+
+
+def summarize_profile(profiler: cProfile.Profile, top_n: int) -> List[Dict[str, Any]]:
+    """累積時間の上位の関数と、その主な呼び出し元を返す"""
+    stats = pstats.Stats(profiler)
+    entries = sorted(
+        stats.stats.items(),  # type: ignore[attr-defined]
+        key=lambda item: item[1][3],
+        reverse=True,
+    )[:top_n]
+
+    summary = []
+    for key, (_, ncalls, tottime, cumtime, callers) in entries:
+        top_callers = sorted(callers.items(), key=lambda c: c[1][3], reverse=True)[:3]
+        summary.append(
+            {
+                "function": _function_name(key),
+                "calls": ncalls,
+                "tottime_ms": round(tottime * 1000, 3),
+                "cumtime_ms": round(cumtime * 1000, 3),
+                "callers": [_function_name(caller) for caller, _ in top_callers],
+            }
+        )
+    return summary
+
+
+class ProfileStore:
+    """リクエストのプロファイル取得の制御と、取得結果のリングバッファ
+
+    トークン付きヘッダーのリクエスト、または管理APIで有効化した期間中に
+    パスが一致するリクエストを ``sample_rate`` の割合でプロファイルする。
+    負荷時でも安全に使えるよう、同時に取得するのは1件のみとし、
+    1分あたりの取得件数も ``max_per_minute`` で制限する。
+
+    ``redis_client`` を指定すると、有効化の状態・取得結果・件数制限・同時取得の枠を
+    Redisで全ワーカーと共有する。未指定時はすべてプロセス内に保持するため、
+    複数ワーカーでは管理APIの有効化や取得結果が受け付けたワーカーにしか見えない。
+    """
+
+    def __init__(
+        self,
+        keep: int = 20,
+        max_per_minute: int = 6,
+        redis_client: Any = None,
+        key_prefix: str = "profiling",
+        toggle_cache_seconds: float = 1.0,
+    ) -> None:
+        self.keep = keep
+        self.max_per_minute = max_per_minute
+        self.profiles: Deque[Dict[str, Any]] = deque(maxlen=keep)
+        self.skipped = 0
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        # リクエストごとにRedisを参照しないよう、有効化の状態を短時間保持する
+        self.toggle_cache_seconds = toggle_cache_seconds
+        self._toggle_checked = 0.0
+        self._started: Deque[float] = deque()
+        self._active = threading.Lock()
+        self._lock = threading.Lock()
+        self._toggle: Optional[Dict[str, Any]] = None
+
+    def _key(self, name: str) -> str:
+        return f"{self.key_prefix}:{name}"
+
+    def enable(
+        self, path_prefix: str, sample_rate: float, duration_seconds: float
+    ) -> Dict[str, Any]:
+        """一定期間、パスが一致するリクエストのサンプリング取得を有効化"""
+        toggle = {
+            "path_prefix": path_prefix,
+            "sample_rate": sample_rate,
+            "expires_at": time.time() + duration_seconds,
+        }
+        if self.redis is not None:
+            self.redis.set(
+                self._key("toggle"),
+                json.dumps(toggle),
+                ex=max(1, math.ceil(duration_seconds)),
+            )
+        with self._lock:
+            self._toggle = toggle
+            self._toggle_checked = time.monotonic()
+        return self.status()
+
+    def disable(self) -> None:
+        if self.redis is not None:
+            self.redis.delete(self._key("toggle"))
+        with self._lock:
+            self._toggle = None
+            self._toggle_checked = time.monotonic()
+
+    def _current_toggle(self) -> Optional[Dict[str, Any]]:
+        """有効化の状態（Redis共有時は一定間隔で再取得、期限切れはNone）"""
+        refresh = False
+        if self.redis is not None:
+            with self._lock:
+                now = time.monotonic()
+                if now - self._toggle_checked >= self.toggle_cache_seconds:
+                    self._toggle_checked = now
+                    refresh = True
+        if refresh:
+            # Redisに接続できない間は無効として扱い、リクエストは通常どおり処理する
+            try:
+                raw = self.redis.get(self._key("toggle"))
+            except Exception as e:
+                print(f"プロファイル設定の取得エラー: {e}")
+                raw = None
+            with self._lock:
+                self._toggle = json.loads(raw) if raw else None
+
+        with self._lock:
+            toggle = self._toggle
+            if toggle is not None and toggle["expires_at"] <= time.time():
+                toggle = self._toggle = None
+            return toggle
+
+    def _skip(self) -> None:
+        """取得しなかった件数を記録"""
+        if self.redis is not None:
+            try:
+                self.redis.incr(self._key("skipped"))
+            except Exception as e:
+                print(f"プロファイル件数の記録エラー: {e}")
+        else:
+            with self._lock:
+                self.skipped += 1
+
+    def status(self) -> Dict[str, Any]:
+        toggle = self._current_toggle()
+        if self.redis is not None:
+            stored = int(self.redis.llen(self._key("profiles")))
+            skipped = int(self.redis.get(self._key("skipped")) or 0)
+        else:
+            with self._lock:
+                stored, skipped = len(self.profiles), self.skipped
+        return {
+            "enabled": toggle is not None,
+            "path_prefix": toggle["path_prefix"] if toggle else None,
+            "sample_rate": toggle["sample_rate"] if toggle else None,
+            "expires_at": (
+                datetime.fromtimestamp(toggle["expires_at"], UTC).isoformat()
+                if toggle
+                else None
+            ),
+            "stored": stored,
+            "skipped": skipped,
+        }
+
+    def wants(self, path: str, explicit: bool) -> bool:
+        """このリクエストをプロファイル対象とするか"""
+        if explicit:
+            return True
+        toggle = self._current_toggle()
+        return (
+            toggle is not None
+            and path.startswith(toggle["path_prefix"])
+            and random.random() < toggle["sample_rate"]
+        )
+
+    def try_start(self) -> bool:
+        """レート制限と同時取得数の枠を確保（確保できなければFalse）"""
+        if self.redis is not None:
+            return self._try_start_shared()
+
+        now = time.monotonic()
+        with self._lock:
+            while self._started and now - self._started[0] >= 60:
+                self._started.popleft()
+            if len(self._started) >= self.max_per_minute:
+                self.skipped += 1
+                return False
+            if not self._active.acquire(blocking=False):
+                self.skipped += 1
+                return False
+            self._started.append(now)
+            return True
+
+    def _try_start_shared(self) -> bool:
+        """全ワーカーで共有する枠を確保（1分ごとの件数と、期限付きの取得中フラグ）"""
+        if not self._active.acquire(blocking=False):
+            self._skip()
+            return False
+
+        reserved = False
+        try:
+            reserved = self._reserve_shared()
+        except Exception as e:
+            # Redisに接続できない場合は取得しない
+            print(f"プロファイル取得枠の確保エラー: {e}")
+        finally:
+            if not reserved:
+                self._active.release()
+        if not reserved:
+            self._skip()
+        return reserved
+
+    def _reserve_shared(self) -> bool:
+        # 取得中のワーカーが停止しても枠が戻るよう、フラグには期限を付ける
+        if not self.redis.set(self._key("active"), "1", ex=ACTIVE_TTL_SECONDS, nx=True):
+            return False
+
+        minute_key = self._key(f"started:{int(time.time() // 60)}")
+        started = self.redis.incr(minute_key)
+        self.redis.expire(minute_key, 120)
+        if started > self.max_per_minute:
+            self.redis.delete(self._key("active"))
+            return False
+        return True
+
+    def finish(self, record: Optional[Dict[str, Any]]) -> None:
+        """取得枠を解放し、結果を保存"""
+        if self.redis is not None:
+            try:
+                try:
+                    if record is not None:
+                        self._store_shared(record)
+                finally:
+                    self.redis.delete(self._key("active"))
+            except Exception as e:
+                # 削除できなかった取得中フラグは期限切れで解放される
+                print(f"プロファイル保存エラー: {e}")
+            finally:
+                self._active.release()
+            return
+
+        if record is not None:
+            with self._lock:
+                self.profiles.append(record)
+        self._active.release()
+
+    def _store_shared(self, record: Dict[str, Any]) -> None:
+        """取得結果をRedisに保存し、新しい順の一覧を ``keep`` 件に切り詰める"""
+        encoded = {**record, "raw": base64.b64encode(record["raw"]).decode("ascii")}
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.set(
+            self._key(f"profile:{record['id']}"),
+            json.dumps(encoded),
+            ex=PROFILE_TTL_SECONDS,
+        )
+        pipe.lpush(self._key("profiles"), record["id"])
+        pipe.ltrim(self._key("profiles"), 0, self.keep - 1)
+        pipe.execute()
+
+    def _load_shared(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.redis.get(self._key(f"profile:{profile_id}"))
+        if not raw:
+            return None
+        record: Dict[str, Any] = json.loads(raw)
+        record["raw"] = base64.b64decode(record["raw"])
+        return record
+
+    def _records(self) -> List[Dict[str, Any]]:
+        """保存済みプロファイル（新しい順）"""
+        if self.redis is not None:
+            ids = self.redis.lrange(self._key("profiles"), 0, self.keep - 1)
+            loaded = (self._load_shared(profile_id) for profile_id in ids)
+            return [record for record in loaded if record is not None]
+        with self._lock:
+            return list(reversed(self.profiles))
+
+    def list(self) -> List[Dict[str, Any]]:
+        """保存済みプロファイルの一覧（新しい順、生データ・詳細は除く）"""
+        return [
+            {k: v for k, v in record.items() if k not in ("raw", "top")}
+            for record in self._records()
+        ]
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        if self.redis is not None:
+            if profile_id not in self.redis.lrange(self._key("profiles"), 0, -1):
+                return None
+            return self._load_shared(profile_id)
+        with self._lock:
+            for record in self.profiles:
+                if record["id"] == profile_id:
+                    return record
+        return None
+
+
+def create_profile_store() -> ProfileStore:
+    """設定に応じたプロファイル保存先を生成（redis: 全ワーカーで共有）"""
+    redis_client = None
+    if Config.PROFILING_BACKEND == "redis":
+        from app.services.redis_client import create_redis_client
+
+        redis_client = create_redis_client(Config.REDIS_URL)
+
+    return ProfileStore(
+        Config.PROFILING_KEEP, Config.PROFILING_MAX_PER_MINUTE, redis_client
+    )
+
+
+profile_store = create_profile_store()
+
+
+def is_authorized() -> bool:
+    """プロファイル用トークンの検証（トークン未設定時は常に無効）"""
+    token = current_app.config.get("PROFILING_TOKEN") or ""
+    supplied = request.headers.get(PROFILE_TOKEN_HEADER, "")
+    return bool(token) and hmac.compare_digest(supplied, token)
+
+
+def start_profiling() -> None:
+    """対象のリクエストであればプロファイルを開始"""
+    if not current_app.config.get("PROFILING_TOKEN"):
+        return
+    if request.path.startswith(ADMIN_PATH_PREFIX):
+        return
+
+    explicit = PROFILE_TOKEN_HEADER in request.headers and is_authorized()
+    if not profile_store.wants(request.path, explicit):
+        return
+    if not profile_store.try_start():
+        return
+
+    g.profile_started = time.perf_counter()
+    g.profiler = cProfile.Profile()
+    g.profiler.enable()
+
+
+def stop_profiling(response: Response) -> Response:
+    """プロファイルを終了して保存し、レスポンスにIDを付与"""
+    profiler: Optional[cProfile.Profile] = g.pop("profiler", None)
+    if profiler is None:
+        return response
+
+    profiler.disable()
+    record = None
+    try:
+        profiler.create_stats()
+        record = {
+            "id": uuid.uuid4().hex,
+            "method": request.method,
+            "path": request.full_path.rstrip("?"),
+            "status": response.status_code,
+            "created_at": datetime.now(UTC).isoformat(),
+            "duration_ms": round(
+                (time.perf_counter() - g.pop("profile_started")) * 1000, 3
+            ),
+            "top": summarize_profile(
+                profiler, current_app.config.get("PROFILING_TOP_N", 30)
+            ),
+            # pstats.Stats / snakeviz 等でそのまま読み込める形式
+            "raw": marshal.dumps(profiler.stats),
+        }
+        response.headers["X-Profile-Id"] = record["id"]
+    except Exception as e:
+        print(f"プロファイル保存エラー: {e}")
+    finally:
+        profile_store.finish(record)
+    return response
+
+
+def abort_profiling(error: Optional[BaseException]) -> None:
+    """after_requestを通らずに終了したリクエストのプロファイルを破棄"""
+    profiler: Optional[cProfile.Profile] = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        profile_store.finish(None)
+
+
+def init_profiling(blueprint: Blueprint) -> None:
+    """ブループリントのリクエストにプロファイル取得を適用
+
+    圧縮等の他のafter_requestより先に登録し、それらの処理時間も含めて計測する。
+    """
+    blueprint.before_request(start_profiling)
+    blueprint.after_request(stop_profiling)
+    blueprint.teardown_request(abort_profiling)
@@ -0,0 +1,191 @@
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from flask import Flask, current_app, g, has_request_context, request
+from flask.wrappers import Response
+from sqlalchemy import event
+
+# SQL中の文字列・数値リテラル（ログ出力時に伏せる）
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """同じ形のSQLを同一視するため、空白を詰めてリテラルを?に置き換える"""
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def redact_parameters(parameters: Any) -> Any:
+    """バインドパラメータの値を伏せ、名前と件数のみ残す"""
+    if isinstance(parameters, dict):
+        return {name: "?" for name in parameters}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            # executemany
+            return [redact_parameters(parameters[0]), f"... {len(parameters)} rows"]
+        return ["?"] * len(parameters)
+    return "?"
+
+
+class QueryMetrics:
+    """エンドポイントごとのクエリ数・DB時間・遅いクエリ・N+1の集計"""
+
+    def __init__(self) -> None:
+        self._endpoints: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record_request(self, endpoint: str, stats: Dict[str, Any]) -> None:
+        with self._lock:
+            entry = self._endpoints.setdefault(
+                endpoint,
+                {
+                    "requests": 0,
+                    "queries": 0,
+                    "db_time_ms": 0.0,
+                    "max_queries": 0,
+                    "slow_queries": 0,
+                    "n_plus_one": 0,
+                },
+            )
+            entry["requests"] += 1
+            entry["queries"] += stats["count"]
+            entry["db_time_ms"] += stats["time_ms"]
+            entry["max_queries"] = max(entry["max_queries"], stats["count"])
+            entry["slow_queries"] += stats["slow"]
+            entry["n_plus_one"] += len(stats["n_plus_one"])
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """エンドポイントごとの累計と1リクエストあたりの平均"""
+        with self._lock:
+            endpoints = {name: dict(entry) for name, entry in self._endpoints.items()}
+        for entry in endpoints.values():
+            entry["db_time_ms"] = round(entry["db_time_ms"], 3)
+            entry["avg_queries"] = round(entry["queries"] / entry["requests"], 2)
+            entry["avg_db_time_ms"] = round(entry["db_time_ms"] / entry["requests"], 3)
+        return endpoints
+
+    def reset(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
+
+
+query_metrics = QueryMetrics()
+
+
+def _handle_error(exception_context: Any) -> None:
+    """失敗したクエリの開始時刻を破棄"""
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def _request_stats() -> Optional[Dict[str, Any]]:
+    if not has_request_context():
+        return None
+    stats: Optional[Dict[str, Any]] = g.get("query_stats")
+    return stats
+
+
+def _request_label() -> str:
+    """ログ用のリクエスト表記（パスの値を出さないようルールのパターンを使う）"""
+    rule = request.url_rule.rule if request.url_rule is not None else request.path
+    return f"{request.method} {rule}"
+
+
+def _before_cursor_execute(
+    conn: Any,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: Any,
+    executemany: bool,
+) -> None:
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(
+    conn: Any,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: Any,
+    executemany: bool,
+) -> None:
+    started = conn.info["query_started"].pop()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    stats = _request_stats()
+    if stats is None:
+        return
+
+    normalized = normalize_statement(statement)
+    stats["count"] += 1
+    stats["time_ms"] += elapsed_ms
+    stats["statements"][normalized] += 1
+
+    if elapsed_ms >= current_app.config.get("SQL_SLOW_QUERY_MS", 100):
+        stats["slow"] += 1
+        print(
+            f"遅いクエリ ({elapsed_ms:.1f}ms, {_request_label()}): "
+            f"{normalized} params={redact_parameters(parameters)}"
+        )
+
+    threshold = current_app.config.get("SQL_N_PLUS_ONE_THRESHOLD", 10)
+    if (
+        stats["statements"][normalized] == threshold
+        and normalized not in stats["n_plus_one"]
+    ):
+        stats["n_plus_one"].append(normalized)
+        print(
+            f"N+1の可能性 ({_request_label()}): "
+            f"同じクエリが{threshold}回以上実行されました: {normalized}"
+        )
+
+
+def start_request() -> None:
+    """リクエスト単位の集計を開始"""
+    g.query_stats = {
+        "count": 0,
+        "time_ms": 0.0,
+        "slow": 0,
+        "statements": Counter(),
+        "n_plus_one": [],
+    }
+
+
+def finish_request(response: Response) -> Response:
+    """リクエスト単位の集計を記録し、レスポンスヘッダーに付与"""
+    stats = g.pop("query_stats", None)
+    if stats is None:
+        return response
+
+    query_metrics.record_request(request.endpoint or request.path, stats)
+    response.headers["X-DB-Query-Count"] = str(stats["count"])
+    response.headers["X-DB-Time-Ms"] = f"{stats['time_ms']:.3f}"
+    return response
+
+
+def init_query_metrics(app: Flask) -> None:
+    """全エンジンにクエリ計測のイベントを登録し、リクエスト単位で集計する"""
+    from app import db
+
+    if not app.config.get("SQL_METRICS_ENABLED", True):
+        return
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if not event.contains(
+                engine, "before_cursor_execute", _before_cursor_execute
+            ):
+                event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+                event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+                event.listen(engine, "handle_error", _handle_error)
+
+    app.before_request(start_request)
+    app.after_request(finish_request)
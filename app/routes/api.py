@@ -1,18 +1,127 @@
-from typing import Tuple
+import csv
+import io
+import json
+from datetime import UTC, datetime, timedelta
+from typing import Any, Dict, Iterator, Optional, Tuple
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request, stream_with_context
 from flask.wrappers import Response
 
-from app.services.database import DatabaseService
+from app.compression import init_compression
+from app.config import Config
+from app.profiling import init_profiling, is_authorized, profile_store
+from app.query_metrics import query_metrics
+from app.services.adjustments import apply_adjustments
+from app.services.analytics import AnalyticsService
+from app.services.backtest import BacktestService, expand_grid, grid_size
+from app.services.database import DatabaseService, add_save_listener
+from app.services.fetch_stats import BUCKET_MINUTES, GROUP_BY_CHOICES, FetchStatsService
+from app.services.job_runner import LANES, job_runner
+from app.services.price_bars import INTERVAL_SECONDS, PriceBarService
 from app.services.progress import ProgressService
-from app.services.yahoo_finance import YahooFinanceService
+from app.services.quote_hub import QuoteHub, QuoteSubscription
+from app.services.screener import ScreenerService
+from app.services.symbol_index import SymbolIndexService
+from app.services.yahoo_finance import YahooFinanceService, fetch_fingerprint
 
 api = Blueprint("api", __name__)
+init_profiling(api)
+init_compression(api)
 
 # サービスのインスタンス化
 yahoo_service = YahooFinanceService()
 db_service = DatabaseService()
 progress_service = ProgressService()
+fetch_stats_service = FetchStatsService()
+symbol_index = SymbolIndexService()
+price_bar_service = PriceBarService()
+screener_service = ScreenerService()
+add_save_listener(screener_service.on_stock_saved)
+analytics_service = AnalyticsService()
+backtest_service = BacktestService()
+quote_hub = QuoteHub(yahoo_service.fetch_quote, Config.QUOTE_POLL_SECONDS)
+
+# 相関分析の上限（銘柄数・期間）
+MAX_CORRELATION_SYMBOLS = 500
+MAX_CORRELATION_LOOKBACK = 2520
+# リアルタイム配信で1接続あたりに購読できる銘柄数
+MAX_STREAM_SYMBOLS = 50
+# 管理APIでプロファイル取得を有効にできる最長時間（秒）
+MAX_PROFILING_SECONDS = 3600
+# バックテストの上限（パラメータの組み合わせ数×銘柄数）
+MAX_BACKTEST_RUNS = 10000
+
+# エクスポート時のCSV列
+EXPORT_CSV_COLUMNS = [
+    "id",
+    "symbol",
+    "company_name",
+    "current_price",
+    "currency",
+    "market_state",
+    "timezone",
+    "exchange",
+    "historical_data",
+    "created_at",
+    "updated_at",
+]
+
+
+def _parse_timestamp(value: str) -> datetime:
+    """UNIX秒またはISO 8601形式の文字列をUTC（タイムゾーンなし）に変換"""
+    try:
+        parsed = datetime.fromtimestamp(float(value), UTC)
+    except ValueError:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=UTC)
+    return parsed.astimezone(UTC).replace(tzinfo=None)
+
+
+def _is_true(value: Optional[str]) -> bool:
+    """クエリパラメータの真偽値を判定"""
+    return (value or "").lower() in ("1", "true", "yes")
+
+
+def _quote_events(subscription: QuoteSubscription, heartbeat: float) -> Iterator[str]:
+    """購読した株価の更新をServer-Sent Events形式で出力（切断時に購読解除）"""
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            updates = subscription.get(timeout=heartbeat)
+            if not updates:
+                # 更新がない間も接続を維持するためのコメント行
+                yield ": keepalive\n\n"
+            for quote in updates:
+                yield f"event: quote\ndata: {current_app.json.dumps(quote)}\n\n"
+    finally:
+        quote_hub.unsubscribe(subscription)
+
+
+def _export_ndjson(rows: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    """1行1JSONで出力"""
+    for row in rows:
+        yield current_app.json.dumps(row) + "\n"
+
+
+def _export_csv(rows: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    """CSVで出力（履歴データはJSON文字列として1列に格納）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(EXPORT_CSV_COLUMNS)
+    yield buffer.getvalue()
+
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        row["historical_data"] = (
+            json.dumps(row["historical_data"])
+            if row["historical_data"] is not None
+            else ""
+        )
+        writer.writerow([row[column] for column in EXPORT_CSV_COLUMNS])
+        yield buffer.getvalue()
 
 
 @api.route("/fetch-data", methods=["POST"])
@@ -25,8 +134,71 @@ def fetch_stock_data() -> Tuple[Response, int]:
         if not symbols:
             return jsonify({"error": "シンボルが指定されていません"}), 400
 
+        interval = data.get("interval", "1d")
+        if interval not in INTERVAL_SECONDS:
+            return jsonify({"error": "intervalは1m/5m/15m/1h/1dのいずれかです"}), 400
+
+        # 未指定時は銘柄数で判定（大量の取得は画面からの更新を待たせないようbulkへ）
+        lane = data.get("lane") or (
+            "interactive"
+            if len(symbols) <= current_app.config["FETCH_INTERACTIVE_MAX_SYMBOLS"]
+            else "bulk"
+        )
+        if lane not in LANES:
+            return jsonify({"error": f"laneは{'/'.join(LANES)}のいずれかです"}), 400
+
+        # マスタがあれば事前に検証する（マスタがない場合は上流へ1件ずつ問い合わせず、
+        # 無効なシンボルは取得時の失敗として取得ログに記録する）
+        validation_enabled = current_app.config.get("SYMBOL_VALIDATION_ENABLED", True)
+        if validation_enabled:
+            symbol_index.refresh_if_stale()
+        if validation_enabled and symbol_index.master_loaded:
+            remote_validator = (
+                yahoo_service.lookup_symbol
+                if current_app.config.get("SYMBOL_VALIDATION_REMOTE_FALLBACK")
+                else None
+            )
+            invalid_symbols = [
+                symbol
+                for symbol in symbols
+                if not symbol_index.validate(symbol, remote_validator)
+            ]
+            if invalid_symbols:
+                return (
+                    jsonify(
+                        {
+                            "error": "無効なシンボルが含まれています",
+                            "invalid_symbols": invalid_symbols,
+                        }
+                    ),
+                    400,
+                )
+
+        # 同じ冪等キー、または同じ内容で実行中のタスクがあればそのタスクを返す
+        idempotency_key = request.headers.get("Idempotency-Key") or data.get(
+            "idempotency_key"
+        )
+        existing_id = progress_service.find_duplicate(
+            fetch_fingerprint(symbols, interval), idempotency_key
+        )
+        if existing_id is not None:
+            return (
+                jsonify(
+                    {
+                        "message": "同じ内容のタスクが既に登録されています",
+                        "task_id": existing_id,
+                        "symbols": symbols,
+                        "interval": interval,
+                        "deduplicated": True,
+                    }
+                ),
+                200,
+            )
+
         # 非同期でデータ取得開始
-        task_id = yahoo_service.fetch_multiple_symbols(symbols)
+        task_id = yahoo_service.fetch_multiple_symbols(
+            symbols, interval, lane, idempotency_key
+        )
 
         return (
             jsonify(
@@ -34,6 +206,8 @@ def fetch_stock_data() -> Tuple[Response, int]:
                     "message": "データ取得を開始しました",
                     "task_id": task_id,
                     "symbols": symbols,
+                    "interval": interval,
+                    "lane": lane,
                 }
             ),
             202,
@@ -54,6 +228,105 @@ def get_fetch_status(task_id: str) -> Tuple[Response, int]:
         return jsonify({"error": str(e)}), 500
 
 
+@api.route("/fetch-status/<task_id>", methods=["DELETE"])
+def cancel_fetch_task(task_id: str) -> Tuple[Response, int]:
+    """データ取得タスクの取り消しAPI（実行中の銘柄の取得後に停止）"""
+    try:
+        status = progress_service.get_status(task_id)
+        if status is None:
+            return jsonify({"error": "タスクが見つかりません"}), 404
+        if status["status"] != "running":
+            return (
+                jsonify(
+                    {
+                        "error": "実行中のタスクではありません",
+                        "status": status["status"],
+                    }
+                ),
+                409,
+            )
+
+        progress_service.cancel_task(task_id)
+        return jsonify({"task_id": task_id, "status": "cancelled"}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/fetch-lanes")
+def get_fetch_lanes() -> Tuple[Response, int]:
+    """取得ジョブの優先度レーンごとの待ち件数・実行中件数API"""
+    try:
+        return jsonify({"lanes": job_runner.stats()}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/quotes/stream")
+def stream_quotes() -> Tuple[Response, int]:
+    """株価のリアルタイム配信API（Server-Sent Events）
+
+    ``symbols`` にカンマ区切りで銘柄を指定する。上流へのポーリングは銘柄ごとに
+    全接続で共有され、送信が遅い接続には最新値のみを送る。
+    """
+    try:
+        symbols = list(
+            dict.fromkeys(
+                symbol.strip()
+                for symbol in request.args.get("symbols", "").split(",")
+                if symbol.strip()
+            )
+        )
+        if not symbols:
+            return jsonify({"error": "シンボルが指定されていません"}), 400
+        if len(symbols) > MAX_STREAM_SYMBOLS:
+            return (
+                jsonify({"error": f"シンボルは{MAX_STREAM_SYMBOLS}件以内で指定してください"}),
+                400,
+            )
+
+        subscription = quote_hub.subscribe(symbols)
+        response = Response(
+            stream_with_context(
+                _quote_events(
+                    subscription, current_app.config["QUOTE_STREAM_HEARTBEAT_SECONDS"]
+                )
+            ),
+            mimetype="text/event-stream",
+        )
+        response.headers["Cache-Control"] = "no-cache"
+        # リバースプロキシ（nginx）でバッファリングさせない
+        response.headers["X-Accel-Buffering"] = "no"
+        return response, 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/cache/stats")
+def get_cache_stats() -> Tuple[Response, int]:
+    """銘柄データキャッシュのヒット率・使用メモリAPI"""
+    try:
+        cache = current_app.extensions.get("stock_cache")
+        if cache is None:
+            return jsonify({"enabled": False}), 200
+        return jsonify({"enabled": True, **cache.stats()}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/metrics/db")
+def get_db_metrics() -> Tuple[Response, int]:
+    """エンドポイントごとのクエリ数・DB時間・遅いクエリ・N+1検出件数API"""
+    try:
+        return jsonify({"endpoints": query_metrics.snapshot()}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @api.route("/stocks")
 def get_stocks() -> Tuple[Response, int]:
     """取得済み株価データ一覧API"""
@@ -86,12 +359,367 @@ def get_stocks() -> Tuple[Response, int]:
 def get_stock_detail(symbol: str) -> Tuple[Response, int]:
     """個別株価データ詳細API"""
     try:
-        stock_data = db_service.get_stock_by_symbol(symbol)
+        # since指定時は基準時刻以降の変更分のみを返す
+        if request.args.get("since"):
+            try:
+                since = _parse_timestamp(request.args["since"])
+            except ValueError:
+                return jsonify({"error": "sinceの形式が不正です"}), 400
+            stock_data = db_service.get_stock_changes(symbol, since)
+        else:
+            stock_data = db_service.get_stock_by_symbol(symbol)
 
         if not stock_data:
             return jsonify({"error": "指定されたシンボルのデータが見つかりません"}), 404
 
+        # adjusted=true指定時は配当・株式分割を反映した調整済み価格を返す
+        if _is_true(request.args.get("adjusted")) and stock_data.get("historical_data"):
+            stock_data["historical_data"] = apply_adjustments(
+                stock_data["historical_data"],
+                db_service.get_adjustment_factors(symbol),
+            )
+
         return jsonify(stock_data), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+@api.route("/stocks/<symbol>/bars")
+def get_stock_bars(symbol: str) -> Tuple[Response, int]:
+    """足の種類を指定した価格バー取得API"""
+    try:
+        interval = request.args.get("interval", "1d")
+        if interval not in INTERVAL_SECONDS:
+            return jsonify({"error": "intervalは1m/5m/15m/1h/1dのいずれかです"}), 400
+
+        try:
+            start = (
+                _parse_timestamp(request.args["start"])
+                if request.args.get("start")
+                else None
+            )
+            end = (
+                _parse_timestamp(request.args["end"])
+                if request.args.get("end")
+                else None
+            )
+        except ValueError:
+            return jsonify({"error": "start/endの形式が不正です"}), 400
+
+        bars = price_bar_service.get_bars(symbol, interval, start, end)
+        if _is_true(request.args.get("adjusted")):
+            bars = apply_adjustments(bars, db_service.get_adjustment_factors(symbol))
+        return jsonify(bars), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/changes")
+def get_changes() -> Tuple[Response, int]:
+    """変更フィードAPI（基準時刻以降に更新された銘柄と新しい足のみ）"""
+    try:
+        if not request.args.get("since"):
+            return jsonify({"error": "sinceが指定されていません"}), 400
+        try:
+            since = _parse_timestamp(request.args["since"])
+        except ValueError:
+            return jsonify({"error": "sinceの形式が不正です"}), 400
+
+        after_id = request.args.get("after_id", 0, type=int)
+        limit = min(request.args.get("limit", 100, type=int), 1000)
+
+        changes = db_service.get_changes(since, after_id, limit)
+        return jsonify(changes), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/export")
+def export_stocks() -> Tuple[Response, int]:
+    """株価データ一括エクスポートAPI（ストリーミング）"""
+    try:
+        export_format = request.args.get("format", "ndjson")
+        if export_format not in ("ndjson", "csv"):
+            return jsonify({"error": "formatはndjsonまたはcsvを指定してください"}), 400
+
+        updated_since: Optional[datetime] = None
+        if request.args.get("updated_since"):
+            try:
+                updated_since = _parse_timestamp(request.args["updated_since"])
+            except ValueError:
+                return jsonify({"error": "updated_sinceの形式が不正です"}), 400
+
+        rows = db_service.iter_stocks(
+            exchange=request.args.get("exchange"),
+            currency=request.args.get("currency"),
+            updated_since=updated_since,
+        )
+
+        if export_format == "csv":
+            body, mimetype = _export_csv(rows), "text/csv"
+        else:
+            body, mimetype = _export_ndjson(rows), "application/x-ndjson"
+
+        response = Response(stream_with_context(body), mimetype=mimetype)
+        response.headers[
+            "Content-Disposition"
+        ] = f"attachment; filename=stock_data.{export_format}"
+        return response, 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/fetch-logs/stats")
+def get_fetch_log_stats() -> Tuple[Response, int]:
+    """取得性能の集計API（レイテンシ・エラー率・スループット）"""
+    try:
+        group_by = request.args.get("group_by", "symbol")
+        bucket = request.args.get("bucket", "hour")
+        limit = min(request.args.get("limit", 100, type=int), 1000)
+
+        if group_by not in GROUP_BY_CHOICES:
+            return jsonify({"error": "group_byはsymbol/exchange/timeのいずれかです"}), 400
+        if bucket not in BUCKET_MINUTES:
+            return jsonify({"error": "bucketはminute/hour/dayのいずれかです"}), 400
+
+        try:
+            until = (
+                _parse_timestamp(request.args["until"])
+                if request.args.get("until")
+                else datetime.now(UTC).replace(tzinfo=None)
+            )
+            since = (
+                _parse_timestamp(request.args["since"])
+                if request.args.get("since")
+                else until - timedelta(hours=24)
+            )
+        except ValueError:
+            return jsonify({"error": "since/untilの形式が不正です"}), 400
+
+        stats = fetch_stats_service.get_stats(
+            since, until, group_by=group_by, bucket=bucket, limit=limit
+        )
+        return jsonify(stats), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/symbols/search")
+def search_symbols() -> Tuple[Response, int]:
+    """シンボル補完API（シンボル・会社名の前方一致）"""
+    try:
+        query = request.args.get("q", "")
+        limit = min(request.args.get("limit", 10, type=int), 50)
+
+        symbol_index.refresh_if_stale()
+        results = symbol_index.search(query, limit)
+
+        return jsonify({"query": query, "results": results}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/screener", methods=["POST"])
+def screen_stocks() -> Tuple[Response, int]:
+    """スクリーナーAPI（騰落率・出来高比率などの条件で全銘柄を絞り込み）"""
+    try:
+        data = request.get_json() or {}
+        filters = data.get("filters", [])
+        if not isinstance(filters, list):
+            return jsonify({"error": "filtersは配列で指定してください"}), 400
+        limit = min(int(data.get("limit", 50)), 500)
+
+        screener_service.refresh_if_stale()
+        try:
+            result = screener_service.screen(
+                filters,
+                sort=data.get("sort"),
+                order=data.get("order", "desc"),
+                limit=limit,
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        return jsonify(result), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/analytics/correlation", methods=["POST"])
+def get_correlation() -> Tuple[Response, int]:
+    """相関分析API（銘柄バスケットの日次リターンの相関・共分散行列）"""
+    try:
+        data = request.get_json() or {}
+        symbols = data.get("symbols", [])
+        lookback = data.get("lookback", 252)
+
+        if not isinstance(symbols, list) or len(symbols) < 2:
+            return jsonify({"error": "シンボルを2つ以上指定してください"}), 400
+        if len(symbols) > MAX_CORRELATION_SYMBOLS:
+            return (
+                jsonify({"error": f"シンボルは{MAX_CORRELATION_SYMBOLS}件までです"}),
+                400,
+            )
+        if not isinstance(lookback, int) or not (
+            2 <= lookback <= MAX_CORRELATION_LOOKBACK
+        ):
+            return (
+                jsonify({"error": f"lookbackは2〜{MAX_CORRELATION_LOOKBACK}の整数です"}),
+                400,
+            )
+
+        try:
+            result = analytics_service.correlation(symbols, lookback)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        return jsonify(result), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def _validate_backtest_request(data: Dict[str, Any]) -> Optional[str]:
+    """バックテストの入力を検証し、不正な場合はエラーメッセージを返す"""
+    symbols = data.get("symbols", [])
+    params = data.get("params", {})
+    lookback = data.get("lookback")
+    fee_bps = data.get("fee_bps", 0)
+
+    if not isinstance(symbols, list) or not symbols:
+        return "シンボルが指定されていません"
+    if not isinstance(params, dict):
+        return "paramsはオブジェクトで指定してください"
+    if lookback is not None and (not isinstance(lookback, int) or lookback < 2):
+        return "lookbackは2以上の整数です"
+    if not isinstance(fee_bps, (int, float)) or fee_bps < 0:
+        return "fee_bpsは0以上の数値です"
+
+    # 組み合わせを展開する前に候補数の積で上限を確認する
+    strategy = data.get("strategy", "")
+    runs = grid_size(strategy, params)
+    if strategy != "rebalance":
+        runs *= len(symbols)
+    if runs > MAX_BACKTEST_RUNS:
+        return f"実行件数は{MAX_BACKTEST_RUNS}件までです"
+    expand_grid(strategy, params)
+    return None
+
+
+@api.route("/backtest", methods=["POST"])
+def run_backtest() -> Tuple[Response, int]:
+    """バックテストAPI（移動平均クロス・しきい値・定期リバランス）"""
+    try:
+        data = request.get_json() or {}
+
+        try:
+            error = _validate_backtest_request(data)
+            if error:
+                return jsonify({"error": error}), 400
+
+            result = backtest_service.run(
+                data["symbols"],
+                data["strategy"],
+                data["params"],
+                lookback=data.get("lookback"),
+                fee_bps=data.get("fee_bps", 0),
+                include_equity=bool(data.get("include_equity", False)),
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        return jsonify(result), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/admin/profiling", methods=["GET", "POST"])
+def configure_profiling() -> Tuple[Response, int]:
+    """プロファイル取得の状態確認・有効化API（X-Profile-Tokenが必要）"""
+    try:
+        if not is_authorized():
+            return jsonify({"error": "認証に失敗しました"}), 403
+        if request.method == "GET":
+            return jsonify(profile_store.status()), 200
+
+        data = request.get_json() or {}
+        if not data.get("enabled", True):
+            profile_store.disable()
+            return jsonify(profile_store.status()), 200
+
+        sample_rate = float(data.get("sample_rate", 0.01))
+        duration = float(data.get("duration_seconds", 300))
+        if not 0 < sample_rate <= 1:
+            return jsonify({"error": "sample_rateは0より大きく1以下で指定してください"}), 400
+        if not 0 < duration <= MAX_PROFILING_SECONDS:
+            return (
+                jsonify(
+                    {"error": f"duration_secondsは{MAX_PROFILING_SECONDS}秒以内で指定してください"}
+                ),
+                400,
+            )
+
+        status = profile_store.enable(
+            data.get("path_prefix", "/api/"), sample_rate, duration
+        )
+        return jsonify(status), 200
+
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/admin/profiles")
+def list_profiles() -> Tuple[Response, int]:
+    """保存済みプロファイル一覧API"""
+    try:
+        if not is_authorized():
+            return jsonify({"error": "認証に失敗しました"}), 403
+        return jsonify({"profiles": profile_store.list()}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/admin/profiles/<profile_id>")
+def get_profile(profile_id: str) -> Tuple[Response, int]:
+    """プロファイルの上位の呼び出し経路API"""
+    try:
+        if not is_authorized():
+            return jsonify({"error": "認証に失敗しました"}), 403
+        record = profile_store.get(profile_id)
+        if record is None:
+            return jsonify({"error": "プロファイルが見つかりません"}), 404
+        return jsonify({k: v for k, v in record.items() if k != "raw"}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/admin/profiles/<profile_id>/download")
+def download_profile(profile_id: str) -> Tuple[Response, int]:
+    """プロファイルの生データ（pstats形式）のダウンロードAPI"""
+    try:
+        if not is_authorized():
+            return jsonify({"error": "認証に失敗しました"}), 403
+        record = profile_store.get(profile_id)
+        if record is None:
+            return jsonify({"error": "プロファイルが見つかりません"}), 404
+
+        response = Response(record["raw"], mimetype="application/octet-stream")
+        response.headers[
+            "Content-Disposition"
+        ] = f"attachment; filename=profile-{profile_id}.prof"
+        return response, 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
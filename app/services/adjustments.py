@@ -0,0 +1,128 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# 調整対象の価格系列
+PRICE_FIELDS = ("open", "high", "low", "close")
+
+
+def parse_events(events: Optional[Dict[str, Any]]) -> Dict[str, List[List[float]]]:
+    """Yahoo Financeのeventsを配当・分割の一覧（権利落ち日の昇順）に変換"""
+    events = events or {}
+    dividends = sorted(
+        [int(item["date"]), float(item["amount"])]
+        for item in (events.get("dividends") or {}).values()
+    )
+    splits = sorted(
+        [int(item["date"]), float(item["numerator"]), float(item["denominator"])]
+        for item in (events.get("splits") or {}).values()
+        if item.get("numerator") and item.get("denominator")
+    )
+    return {"dividends": dividends, "splits": splits}
+
+
+def _dividend_factor(
+    ex_date: int, amount: float, historical_data: Optional[Dict]
+) -> float:
+    """配当の調整係数（権利落ち前日終値に対する配当落ち分）"""
+    history = historical_data or {}
+    timestamps = np.array(history.get("timestamps") or [], dtype=float)
+    closes = np.array(history.get("close") or [], dtype=float)[: len(timestamps)]
+    before = np.flatnonzero((timestamps[: len(closes)] < ex_date) & ~np.isnan(closes))
+    if not len(before) or closes[before[-1]] <= amount:
+        # 前日終値が取得範囲外の場合は調整しない
+        return 1.0
+    return float(1 - amount / closes[before[-1]])
+
+
+def merge_actions(
+    existing: Optional[Dict[str, List[List[float]]]],
+    incoming: Dict[str, List[List[float]]],
+    historical_data: Optional[Dict],
+) -> Tuple[Dict[str, List[List[float]]], bool]:
+    """保存済みのイベントに新しいイベントを追加し、変更があったかを返す
+
+    Yahoo Financeは取得期間内のイベントしか返さないため、過去のイベントは保持し続ける。
+    配当の調整係数は初めて受け取った時点の前日終値で確定させ、以後は再計算しない。
+    """
+    merged: Dict[str, List[List[float]]] = {
+        "dividends": [list(item) for item in (existing or {}).get("dividends", [])],
+        "splits": [list(item) for item in (existing or {}).get("splits", [])],
+    }
+    changed = False
+
+    known_dividends = {int(item[0]) for item in merged["dividends"]}
+    for ex_date, amount in incoming.get("dividends", []):
+        if int(ex_date) not in known_dividends:
+            factor = _dividend_factor(int(ex_date), amount, historical_data)
+            merged["dividends"].append([int(ex_date), amount, factor])
+            changed = True
+
+    known_splits = {int(item[0]) for item in merged["splits"]}
+    for ex_date, numerator, denominator in incoming.get("splits", []):
+        if int(ex_date) not in known_splits:
+            merged["splits"].append([int(ex_date), numerator, denominator])
+            changed = True
+
+    merged["dividends"].sort()
+    merged["splits"].sort()
+    return merged, changed
+
+
+def compute_factors(actions: Dict[str, List[List[float]]]) -> Dict[str, Any]:
+    """配当ごとの累積調整係数を算出
+
+    Yahoo Financeのチャートの四本値・出来高は取得時点で株式分割が反映済みのため、
+    係数には配当のみを含める（分割はイベントとして記録するだけで価格には掛けない）。
+    ``price[i]`` は ``timestamps[i]`` 以降の全配当の係数の積で、
+    ``timestamps[i]`` より前の足に掛ける値。同日の配当は1つにまとめる。
+    """
+    dividends = sorted(
+        (int(ts), float(factor)) for ts, _, factor in actions.get("dividends", [])
+    )
+    if not dividends:
+        return {"timestamps": [], "price": []}
+
+    timestamps = np.array([ts for ts, _ in dividends], dtype=np.int64)
+    values = np.array([factor for _, factor in dividends], dtype=float)
+    unique, starts = np.unique(timestamps, return_index=True)
+    per_day = np.multiply.reduceat(values, starts)
+    cumulative = np.cumprod(per_day[::-1])[::-1]
+
+    return {
+        "timestamps": unique.tolist(),
+        "price": cumulative.tolist(),
+    }
+
+
+def apply_adjustments(
+    historical_data: Optional[Dict], factors: Optional[Dict[str, Any]]
+) -> Optional[Dict]:
+    """履歴データ（列形式）に累積調整係数を適用した調整済みの履歴を返す
+
+    保存されている四本値は分割調整済みのため、各足より後に発生した配当の係数を
+    二分探索で一括して割り当てる。出来高は調整しない。
+    """
+    if not historical_data or not historical_data.get("timestamps"):
+        return historical_data
+
+    adjusted = dict(historical_data)
+    adjusted["adjusted"] = True
+    if not factors or not factors.get("timestamps"):
+        return adjusted
+
+    timestamps = np.array(historical_data["timestamps"], dtype=float)
+    positions = np.searchsorted(factors["timestamps"], timestamps, side="right")
+    multipliers = np.append(factors["price"], 1.0)[positions]
+
+    for name in PRICE_FIELDS:
+        raw = historical_data.get(name)
+        if not raw:
+            continue
+        values = np.array(raw[: len(timestamps)], dtype=float)
+        scaled = values * multipliers[: len(values)]
+        adjusted[name] = [
+            None if np.isnan(value) else value for value in scaled.tolist()
+        ]
+
+    return adjusted
@@ -0,0 +1,142 @@
+import threading
+from collections import OrderedDict
+from datetime import UTC, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import current_app
+
+from app.services.database import DatabaseService
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def _matrix_to_list(matrix: np.ndarray) -> List[List[Optional[float]]]:
+    """NaN（分散ゼロの銘柄など）をNoneに置き換えてリスト化"""
+    result: List[List[Optional[float]]] = np.where(
+        np.isnan(matrix), None, matrix
+    ).tolist()
+    return result
+
+
+def align_closes(
+    histories: Dict[str, Dict], symbols: List[str], lookback: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """各銘柄の終値を日付で揃えた (日, 銘柄) の行列と日付配列を返す
+
+    いずれかの銘柄に足がある日を共通の日付軸とし、直近 ``lookback`` 本の
+    リターンが得られるよう ``lookback + 1`` 日分を切り出す。休場などで
+    足のない日は直前の終値で埋める。
+    """
+    days_per_symbol = []
+    closes_per_symbol = []
+    for symbol in symbols:
+        history = histories[symbol]
+        timestamps = np.array(history.get("timestamps") or [], dtype=float)
+        closes = np.array(history.get("close") or [], dtype=float)[: len(timestamps)]
+        valid = ~np.isnan(closes) & (closes > 0)
+        days_per_symbol.append(
+            timestamps[: len(closes)][valid].astype(np.int64) // SECONDS_PER_DAY
+        )
+        closes_per_symbol.append(closes[valid])
+
+    days = np.unique(np.concatenate(days_per_symbol))[-(lookback + 1) :]
+    matrix = np.full((len(days), len(symbols)), np.nan)
+    for column, (symbol_days, closes) in enumerate(
+        zip(days_per_symbol, closes_per_symbol)
+    ):
+        positions = np.searchsorted(days, symbol_days)
+        in_range = (positions < len(days)) & (
+            days[np.minimum(positions, len(days) - 1)] == symbol_days
+        )
+        # 同じ日に複数の足がある場合は後の足（最新値）で上書きされる
+        matrix[positions[in_range], column] = closes[in_range]
+
+    # 前方埋め：各セルに直近の有効な行番号を割り当てて参照する
+    rows = np.where(np.isnan(matrix), 0, np.arange(len(days))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    filled = matrix[rows, np.arange(len(symbols))]
+
+    return filled, days
+
+
+class AnalyticsService:
+    """銘柄バスケットのリターン相関・共分散の算出サービス"""
+
+    def __init__(self) -> None:
+        self._cache: "OrderedDict[Tuple[Any, ...], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cache_get(self, key: Tuple[Any, ...]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+            return result
+
+    def _cache_put(self, key: Tuple[Any, ...], result: Dict[str, Any]) -> None:
+        max_size = int(current_app.config.get("ANALYTICS_CACHE_SIZE", 128))
+        with self._lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > max_size:
+                self._cache.popitem(last=False)
+
+    def correlation(self, symbols: List[str], lookback: int = 252) -> Dict[str, Any]:
+        """日次対数リターンの相関行列・共分散行列を算出
+
+        結果は（銘柄の組、期間、各銘柄の更新時刻）をキーにキャッシュし、
+        いずれかの銘柄が更新されるまでは履歴データを読み直さない。
+        """
+        symbols = list(dict.fromkeys(symbols))
+        db_service = DatabaseService()
+
+        versions = db_service.get_versions(symbols)
+        # 行列の並びは指定順に従うため、銘柄の組は順序込みでキーにする
+        key = (
+            tuple(symbols),
+            lookback,
+            tuple(sorted(versions.items())),
+        )
+        cached = self._cache_get(key)
+        if cached is not None:
+            return {**cached, "cached": True}
+
+        histories = db_service.get_histories(symbols)
+        available = [
+            symbol
+            for symbol in symbols
+            if (histories.get(symbol) or {}).get("timestamps")
+        ]
+        missing = [symbol for symbol in symbols if symbol not in available]
+        if len(available) < 2:
+            raise ValueError("履歴データのある銘柄が2つ以上必要です")
+
+        closes, days = align_closes(histories, available, lookback)
+        returns = np.diff(np.log(closes), axis=0)
+        # 全銘柄のリターンが揃っている日だけを使う（上場前などの先頭欠損を除外）
+        returns = returns[~np.isnan(returns).any(axis=1)]
+        if len(returns) < 2:
+            raise ValueError("リターンを算出できる共通期間が不足しています")
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            covariance = np.cov(returns, rowvar=False)
+            correlation = np.corrcoef(returns, rowvar=False)
+
+        first_day = int(days[len(days) - len(returns) - 1])
+        result = {
+            "symbols": available,
+            "missing": missing,
+            "lookback": lookback,
+            "observations": int(len(returns)),
+            "start": datetime.fromtimestamp(first_day * SECONDS_PER_DAY, UTC)
+            .date()
+            .isoformat(),
+            "end": datetime.fromtimestamp(int(days[-1]) * SECONDS_PER_DAY, UTC)
+            .date()
+            .isoformat(),
+            "correlation": _matrix_to_list(correlation),
+            "covariance": _matrix_to_list(covariance),
+        }
+        self._cache_put(key, result)
+        return {**result, "cached": False}
@@ -0,0 +1,312 @@
+import itertools
+import math
+from concurrent.futures import ProcessPoolExecutor
+from datetime import UTC, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import current_app
+
+from app.services.analytics import SECONDS_PER_DAY, align_closes
+from app.services.database import DatabaseService
+
+# 戦略ごとのパラメータ名
+STRATEGIES = {
+    "sma_crossover": ("fast", "slow"),
+    "threshold": ("window", "threshold"),
+    "rebalance": ("period",),
+}
+# 年率換算に使う年間営業日数
+TRADING_DAYS = 252
+# ポートフォリオ単位の戦略の結果に付けるシンボル名
+PORTFOLIO_SYMBOL = "PORTFOLIO"
+
+
+def _candidates(strategy: str, params: Dict[str, Any]) -> List[List[Any]]:
+    """パラメータごとの候補値の一覧（単一値は1件のリストとして扱う）"""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"未対応の戦略です: {strategy}")
+
+    names = STRATEGIES[strategy]
+    missing = [name for name in names if name not in params]
+    if missing:
+        raise ValueError(f"パラメータが不足しています: {', '.join(missing)}")
+
+    return [
+        params[name] if isinstance(params[name], list) else [params[name]]
+        for name in names
+    ]
+
+
+def grid_size(strategy: str, params: Dict[str, Any]) -> int:
+    """組み合わせを展開せずに候補数の積（展開後の件数の上限）を返す"""
+    return math.prod(len(values) for values in _candidates(strategy, params))
+
+
+def expand_grid(strategy: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """パラメータの候補値から全組み合わせを生成（単一値はそのまま固定値として扱う）"""
+    candidates = _candidates(strategy, params)
+    names = STRATEGIES[strategy]
+    combos = [dict(zip(names, values)) for values in itertools.product(*candidates)]
+
+    for combo in combos:
+        for name, value in combo.items():
+            if name == "threshold":
+                if not isinstance(value, (int, float)):
+                    raise ValueError("thresholdは数値で指定してください")
+            elif not isinstance(value, int) or value < 1:
+                raise ValueError(f"{name}は1以上の整数で指定してください")
+
+    if strategy == "sma_crossover":
+        # 短期が長期以上の組み合わせは意味を持たないため除外
+        combos = [combo for combo in combos if combo["fast"] < combo["slow"]]
+        if not combos:
+            raise ValueError("fastはslowより小さい値を指定してください")
+    return combos
+
+
+def moving_average(closes: np.ndarray, window: int) -> np.ndarray:
+    """累積和による単純移動平均（有効な終値が期間に満たない間はNaN）
+
+    履歴の開始日が銘柄ごとに異なり先頭がNaNの列があっても、他の列や
+    その銘柄の履歴開始後の値に影響しないよう、NaNを0として累積し有効な本数で判定する。
+    """
+    valid = ~np.isnan(closes)
+    zeros = np.zeros((1, closes.shape[1]))
+    cumsum = np.vstack([zeros, np.cumsum(np.where(valid, closes, 0.0), axis=0)])
+    counts = np.vstack([zeros, np.cumsum(valid, axis=0)])
+    result = np.full(closes.shape, np.nan)
+    if window <= len(closes):
+        sums = cumsum[window:] - cumsum[:-window]
+        full = (counts[window:] - counts[:-window]) == window
+        result[window - 1 :] = np.where(full, sums / window, np.nan)
+    return result
+
+
+def _positions(
+    strategy: str, closes: np.ndarray, combos: List[Dict[str, Any]]
+) -> np.ndarray:
+    """各組み合わせ・各日・各銘柄の保有フラグ (組み合わせ, 日, 銘柄) を算出"""
+    positions = np.zeros((len(combos),) + closes.shape)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if strategy == "sma_crossover":
+            windows = {combo[name] for combo in combos for name in ("fast", "slow")}
+            averages = {window: moving_average(closes, window) for window in windows}
+            for i, combo in enumerate(combos):
+                positions[i] = averages[combo["fast"]] > averages[combo["slow"]]
+
+        elif strategy == "threshold":
+            # 直近 window 日のリターン（%）がしきい値以上の間だけ保有する
+            for i, combo in enumerate(combos):
+                window = combo["window"]
+                if window < len(closes):
+                    change = (closes[window:] / closes[:-window] - 1) * 100
+                    positions[i, window:] = change >= combo["threshold"]
+
+    return positions
+
+
+def _rebalance_equity(
+    closes: np.ndarray, combos: List[Dict[str, Any]], fee_rate: float = 0.0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """等金額で保有し period 日ごとにリバランスするポートフォリオの評価額
+
+    手数料はリバランス時の売買金額（値動きでずれた比率を等金額に戻す分）に対して課す。
+    """
+    days = len(closes)
+    equity = np.ones((len(combos), days, 1))
+    trades = np.zeros((len(combos), 1))
+
+    t = np.arange(1, days)
+    for i, combo in enumerate(combos):
+        period = combo["period"]
+        # 日 t の保有は直前のリバランス日 anchor の時点で等金額に揃えたもの
+        anchors = (t - 1) // period * period
+        with np.errstate(invalid="ignore", divide="ignore"):
+            relative = closes[t] / closes[anchors]
+        # 上場前など価格のない銘柄は現金（値動きなし）として扱う
+        relative = np.where(np.isnan(relative), 1.0, relative)
+        growth = relative.mean(axis=1)
+
+        # 区間末（次のリバランス日）までの伸び率を累積して区間をつなぐ
+        segment_ends = np.flatnonzero((t % period == 0) | (t == days - 1))
+        # 区間末の比率と等金額の差（売買金額の評価額に対する割合）
+        turnover = np.abs(relative[segment_ends] / growth[segment_ends, None] - 1).mean(
+            axis=1
+        )
+        segment_growth = growth[segment_ends] * (1 - fee_rate * turnover)
+        carried = np.concatenate([[1.0], np.cumprod(segment_growth)[:-1]])
+        segment_of_day = np.searchsorted(segment_ends, np.arange(len(t)))
+        equity[i, 1:, 0] = carried[segment_of_day] * growth
+        trades[i, 0] = len(segment_ends)
+
+    return equity, trades
+
+
+def run_strategy(
+    strategy: str,
+    closes: np.ndarray,
+    combos: List[Dict[str, Any]],
+    fee_rate: float = 0.0,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """戦略を全組み合わせ・全銘柄まとめて実行
+
+    評価額 (組み合わせ, 日, 銘柄)、売買回数と保有率 (組み合わせ, 銘柄) を返す。
+    シグナルは当日終値で判定し、翌日のリターンから反映する（先読みしない）。
+    プロセスプールから呼び出せるよう、アプリケーションコンテキストに依存しない。
+    """
+    if strategy == "rebalance":
+        equity, trades = _rebalance_equity(closes, combos, fee_rate)
+        return equity, trades, np.ones_like(trades)
+
+    positions = _positions(strategy, closes, combos)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns = np.nan_to_num(closes[1:] / closes[:-1] - 1)
+
+    held = positions[:, :-1]
+    changes = np.abs(np.diff(positions, axis=1, prepend=0))[:, 1:]
+    daily = held * returns - changes * fee_rate
+    equity = np.concatenate(
+        [np.ones((len(combos), 1, closes.shape[1])), np.cumprod(1 + daily, axis=1)],
+        axis=1,
+    )
+    trades = np.abs(np.diff(positions, axis=1)).sum(axis=1)
+    exposure = held.mean(axis=1) if held.shape[1] else np.zeros_like(trades)
+    return equity, trades, exposure
+
+
+def _run_parallel(
+    strategy: str,
+    closes: np.ndarray,
+    combos: List[Dict[str, Any]],
+    fee_rate: float,
+    workers: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """パラメータの組み合わせを分割してプロセスプールで実行"""
+    chunks = [
+        [combos[i] for i in indices]
+        for indices in np.array_split(np.arange(len(combos)), workers)
+        if len(indices)
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(
+            executor.map(
+                run_strategy,
+                [strategy] * len(chunks),
+                [closes] * len(chunks),
+                chunks,
+                [fee_rate] * len(chunks),
+            )
+        )
+    equity, trades, exposure = (
+        np.concatenate([result[i] for result in results]) for i in range(3)
+    )
+    return equity, trades, exposure
+
+
+def summarize(equity: np.ndarray) -> Dict[str, np.ndarray]:
+    """評価額から成績指標 (組み合わせ, 銘柄) を算出"""
+    bars = equity.shape[1] - 1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        daily = equity[:, 1:] / equity[:, :-1] - 1
+        volatility = daily.std(axis=1)
+        sharpe = np.where(
+            volatility > 0,
+            daily.mean(axis=1) / volatility * np.sqrt(TRADING_DAYS),
+            np.nan,
+        )
+        drawdown = equity / np.maximum.accumulate(equity, axis=1) - 1
+
+        return {
+            "total_return": equity[:, -1] - 1,
+            "cagr": equity[:, -1] ** (TRADING_DAYS / max(bars, 1)) - 1,
+            "sharpe": sharpe,
+            "max_drawdown": drawdown.min(axis=1),
+        }
+
+
+def _value(value: Any) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 6)
+
+
+def _day_to_iso(day: int) -> str:
+    return datetime.fromtimestamp(day * SECONDS_PER_DAY, UTC).date().isoformat()
+
+
+class BacktestService:
+    """保存済みの日足による戦略のバックテストサービス
+
+    銘柄とパラメータの組み合わせを配列の軸として持ち、日ごとのループを使わずに
+    全ケースをまとめて評価する。組み合わせ数が多い場合は ``BACKTEST_WORKERS``
+    個のプロセスに分割して実行する。
+    """
+
+    def run(
+        self,
+        symbols: List[str],
+        strategy: str,
+        params: Dict[str, Any],
+        lookback: Optional[int] = None,
+        fee_bps: float = 0.0,
+        include_equity: bool = False,
+        workers: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """バックテストを実行し、組み合わせ×銘柄ごとの成績を返す"""
+        combos = expand_grid(strategy, params)
+        symbols = list(dict.fromkeys(symbols))
+
+        histories = DatabaseService().get_histories(symbols)
+        available = [
+            symbol
+            for symbol in symbols
+            if (histories.get(symbol) or {}).get("timestamps")
+        ]
+        if not available:
+            raise ValueError("履歴データのある銘柄がありません")
+
+        closes, days = align_closes(
+            histories, available, lookback or np.iinfo(np.int32).max
+        )
+        if len(days) < 2:
+            raise ValueError("バックテストに必要な期間が不足しています")
+
+        if workers is None:
+            workers = int(current_app.config.get("BACKTEST_WORKERS", 0))
+        min_runs = int(current_app.config.get("BACKTEST_PARALLEL_MIN_RUNS", 200))
+        fee_rate = fee_bps / 10000
+        if workers > 1 and len(combos) * len(available) >= min_runs:
+            equity, trades, exposure = _run_parallel(
+                strategy, closes, combos, fee_rate, workers
+            )
+        else:
+            equity, trades, exposure = run_strategy(strategy, closes, combos, fee_rate)
+
+        stats = summarize(equity)
+        result_symbols = [PORTFOLIO_SYMBOL] if strategy == "rebalance" else available
+        runs = []
+        for i, combo in enumerate(combos):
+            for j, symbol in enumerate(result_symbols):
+                run: Dict[str, Any] = {
+                    "params": combo,
+                    "symbol": symbol,
+                    **{name: _value(values[i, j]) for name, values in stats.items()},
+                    "trades": int(trades[i, j]),
+                    "exposure": _value(exposure[i, j]),
+                }
+                if include_equity:
+                    run["equity"] = np.round(equity[i, :, j], 6).tolist()
+                runs.append(run)
+
+        result: Dict[str, Any] = {
+            "strategy": strategy,
+            "symbols": available,
+            "missing": [symbol for symbol in symbols if symbol not in available],
+            "start": _day_to_iso(int(days[0])),
+            "end": _day_to_iso(int(days[-1])),
+            "bars": int(len(days)),
+            "runs": runs,
+        }
+        if include_equity:
+            result["dates"] = [_day_to_iso(int(day)) for day in days]
+        return result
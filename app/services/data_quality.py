@@ -0,0 +1,145 @@
+from datetime import UTC, datetime
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.services.price_bars import INTERVAL_SECONDS
+
+PRICE_FIELDS = ("open", "high", "low", "close")
+# 外れ値判定のしきい値（リターンの中央値からの乖離がMAD換算の標準偏差の何倍か）
+OUTLIER_THRESHOLD = 8.0
+# 日足で欠損とみなす間隔（連休を除くため5日以上）
+DAILY_GAP_SECONDS = 5 * 24 * 60 * 60
+# 日中足でこの間隔以上の空きは昼休み・取引時間外として欠損に数えない
+SESSION_BREAK_SECONDS = 60 * 60
+# レポートに記録する外れ値の時刻の最大件数
+MAX_REPORTED_OUTLIERS = 20
+
+
+def _column(values: Any, length: int) -> np.ndarray:
+    """リスト（Noneを含む）を長さを揃えたfloat配列に変換"""
+    result = np.full(length, np.nan)
+    values = (values or [])[:length]
+    result[: len(values)] = np.array(values, dtype=float)
+    return result
+
+
+def _count_gaps(timestamps: np.ndarray, interval: str) -> Tuple[int, int]:
+    """欠損区間の数と最大間隔（秒）を返す"""
+    if len(timestamps) < 2:
+        return 0, 0
+
+    spacing = np.diff(timestamps)
+    if interval == "1d":
+        gaps = spacing >= DAILY_GAP_SECONDS
+    else:
+        # 1本以上抜けていて、取引時間外の空きではないもの
+        gaps = (spacing >= 2 * INTERVAL_SECONDS[interval]) & (
+            spacing < SESSION_BREAK_SECONDS
+        )
+    return int(np.count_nonzero(gaps)), int(spacing.max())
+
+
+def _find_spikes(closes: np.ndarray) -> np.ndarray:
+    """1本だけ跳ねて直後に戻る足（異常値）のインデックスを返す
+
+    対数リターンの中央値からの乖離を中央絶対偏差（MAD）で正規化し、
+    前後のリターンがともにしきい値を超えて符号が反転している足を異常値とする。
+    """
+    if len(closes) < 3 or np.any(closes <= 0):
+        return np.empty(0, dtype=np.int64)
+
+    returns = np.diff(np.log(closes))
+    deviation = returns - np.median(returns)
+    scale = np.median(np.abs(deviation)) * 1.4826
+    if scale == 0:
+        return np.empty(0, dtype=np.int64)
+
+    extreme = np.abs(deviation) > OUTLIER_THRESHOLD * scale
+    reverting = np.sign(returns[:-1]) != np.sign(returns[1:])
+    # returns[i] は足 i → i+1 の変化。足 i+1 の前後がともに極端で反転していれば異常値
+    return np.flatnonzero(extreme[:-1] & extreme[1:] & reverting) + 1
+
+
+def clean_history(
+    historical_data: Optional[Dict], interval: str = "1d"
+) -> Tuple[Optional[Dict], Dict[str, Any]]:
+    """取得した履歴データを検証・整形し、整形後の履歴と品質レポートを返す
+
+    - 時刻または終値のない足は除外
+    - 時刻順に並べ替え、同じ時刻の足は後に受け取った方を残す
+    - 始値・高値・安値の欠損は終値、出来高の欠損は0で補完（出来高の欠損は別に件数を記録）
+    - 高値・安値を4本値の最大・最小に揃える
+    - 欠損区間・出来高ゼロの足・異常値（一時的な跳ね）は件数を記録する（足は残す）
+    """
+    history = historical_data or {}
+    raw_timestamps = history.get("timestamps") or []
+    length = len(raw_timestamps)
+
+    timestamps = _column(raw_timestamps, length)
+    columns = {name: _column(history.get(name), length) for name in PRICE_FIELDS}
+    volume = _column(history.get("volume"), length)
+
+    report: Dict[str, Any] = {
+        "checked_at": datetime.now(UTC).isoformat(),
+        "interval": interval,
+        "input_bars": length,
+    }
+
+    valid = ~np.isnan(timestamps)
+    report["out_of_order"] = int(np.count_nonzero(np.diff(timestamps[valid]) < 0))
+
+    keep = valid & ~np.isnan(columns["close"])
+    report["null_bars"] = int(length - np.count_nonzero(keep))
+
+    # 安定ソート後、逆順でuniqueを取ることで同時刻の最後の足を残す
+    order = np.flatnonzero(keep)[np.argsort(timestamps[keep], kind="stable")]
+    reversed_times = timestamps[order][::-1]
+    _, first_in_reversed = np.unique(reversed_times, return_index=True)
+    order = order[len(order) - 1 - first_in_reversed]
+    report["duplicates"] = int(np.count_nonzero(keep) - len(order))
+
+    timestamps = timestamps[order]
+    columns = {name: values[order] for name, values in columns.items()}
+    volume = volume[order]
+    closes = columns["close"]
+
+    filled = 0
+    for name in ("open", "high", "low"):
+        missing = np.isnan(columns[name])
+        filled += int(np.count_nonzero(missing))
+        columns[name] = np.where(missing, closes, columns[name])
+    report["filled_values"] = filled
+
+    # 出来高ゼロは補完前に数え、出来高の欠損（0で補完）とは区別して記録する
+    missing_volume = np.isnan(volume)
+    report["missing_volume"] = int(np.count_nonzero(missing_volume))
+    report["zero_volume"] = int(np.count_nonzero(volume == 0))
+    volume = np.where(missing_volume, 0, volume)
+
+    prices = np.vstack([columns[name] for name in PRICE_FIELDS])
+    highs = prices.max(axis=0)
+    lows = prices.min(axis=0)
+    report["ohlc_fixed"] = int(
+        np.count_nonzero((columns["high"] != highs) | (columns["low"] != lows))
+    )
+    columns["high"], columns["low"] = highs, lows
+
+    report["gaps"], report["max_gap_seconds"] = _count_gaps(timestamps, interval)
+
+    spikes = _find_spikes(closes)
+    report["outliers"] = int(len(spikes))
+    report["outlier_timestamps"] = (
+        timestamps[spikes[:MAX_REPORTED_OUTLIERS]].astype(np.int64).tolist()
+    )
+    report["output_bars"] = int(len(timestamps))
+
+    if not historical_data:
+        return historical_data, report
+
+    cleaned = dict(historical_data)
+    cleaned["timestamps"] = timestamps.astype(np.int64).tolist()
+    for name in PRICE_FIELDS:
+        cleaned[name] = columns[name].tolist()
+    cleaned["volume"] = volume.astype(np.int64).tolist()
+    return cleaned, report
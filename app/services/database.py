@@ -1,17 +1,128 @@
+import itertools
+import time
+from bisect import bisect_right
 from datetime import UTC, datetime
-from typing import Dict, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar, Union, cast
 
-from sqlalchemy import desc
+from flask import current_app
+from flask_sqlalchemy.query import Query
+from sqlalchemy import and_, desc, or_, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, scoped_session
 
 from app import db
 from app.models.stock_data import StockData
+from app.services.adjustments import compute_factors, merge_actions
+from app.services.stock_cache import StockCache
+
+T = TypeVar("T")
+# 読み取り処理に渡すセッション（レプリカ用Session または db.session）
+ReadSession = Union[Session, "scoped_session[Any]"]
+
+# 最後に書き込みを行った時刻（read-your-writes 判定用、プロセス単位）
+_last_write_at: Optional[float] = None
+# レプリカのラウンドロビン用カウンタ
+_replica_cycle = itertools.count()
+# 株価データ保存後に呼び出すリスナー
+_save_listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+
+def add_save_listener(listener: Callable[[Dict[str, Any]], None]) -> None:
+    """株価データ保存（コミット）後に保存内容を受け取るリスナーを登録"""
+    if listener not in _save_listeners:
+        _save_listeners.append(listener)
+
+
+def remove_save_listener(listener: Callable[[Dict[str, Any]], None]) -> None:
+    """登録済みのリスナーを解除"""
+    if listener in _save_listeners:
+        _save_listeners.remove(listener)
+
+
+def slice_history(historical_data: Optional[Dict], since: datetime) -> Optional[Dict]:
+    """履歴データから指定時刻以降の足のみを切り出す
+
+    最新の足は取引時間中に値が更新されるため、基準時刻以前の直近1本も含める。
+    """
+    if not historical_data or not historical_data.get("timestamps"):
+        return historical_data
+
+    timestamps = historical_data["timestamps"]
+    since_epoch = since.replace(tzinfo=UTC).timestamp()
+    start = max(bisect_right(timestamps, since_epoch) - 1, 0)
+
+    return {
+        name: values[start:] if isinstance(values, list) else values
+        for name, values in historical_data.items()
+    }
 
 
 class DatabaseService:
     """データベース操作サービス"""
 
+    def _replica_keys(self) -> List[str]:
+        """登録済みリードレプリカのバインドキー一覧を取得"""
+        return [
+            key
+            for key in db.engines
+            if isinstance(key, str) and key.startswith("replica_")
+        ]
+
+    def _mark_write(self) -> None:
+        """書き込み時刻を記録（直後の読み取りをプライマリへ向ける）"""
+        global _last_write_at
+        _last_write_at = time.monotonic()
+
+    def _read_from_primary(self) -> bool:
+        """read-your-writes の猶予期間中かどうかを判定"""
+        if _last_write_at is None:
+            return False
+        window = current_app.config.get("REPLICA_READ_YOUR_WRITES_SECONDS", 0)
+        return bool(time.monotonic() - _last_write_at < window)
+
+    def _run_read(self, reader: Callable[[ReadSession], T]) -> T:
+        """読み取り処理をレプリカで実行（接続失敗時はプライマリにフォールバック）"""
+        replicas = [] if self._read_from_primary() else self._replica_keys()
+
+        if replicas:
+            start = next(_replica_cycle)
+            for offset in range(len(replicas)):
+                key = replicas[(start + offset) % len(replicas)]
+                session = Session(bind=db.engines[key], query_cls=db.Query)
+                try:
+                    return reader(session)
+                except OperationalError as e:
+                    print(f"レプリカ読み取りエラー ({key}): {e}")
+                finally:
+                    session.close()
+
+        return reader(db.session)
+
+    def _cache(self) -> Optional[StockCache]:
+        """アプリに登録された銘柄データキャッシュ（無効時はNone）"""
+        cache: Optional[StockCache] = current_app.extensions.get("stock_cache")
+        return cache
+
+    def _invalidate_cache(self, symbol: str) -> None:
+        """更新・削除した銘柄のキャッシュを全ワーカーで無効化"""
+        cache = self._cache()
+        if cache is not None:
+            cache.invalidate(symbol)
+
+    def _notify_saved(self, stock_data: Dict) -> None:
+        """保存リスナーへ通知（リスナーの失敗は保存結果に影響させない）"""
+        for listener in list(_save_listeners):
+            try:
+                listener(stock_data)
+            except Exception as e:
+                print(f"保存リスナーエラー: {e}")
+
     def save_stock_data(self, stock_data: Dict) -> bool:
         """株価データをデータベースに保存"""
+        return self.upsert_stock_data(stock_data) is not None
+
+    def upsert_stock_data(self, stock_data: Dict) -> Optional[int]:
+        """株価データを保存し、保存したレコードのIDを返す（失敗時はNone）"""
         try:
             # 既存データの確認
             existing = StockData.query.filter_by(symbol=stock_data["symbol"]).first()
@@ -24,8 +135,12 @@ class DatabaseService:
                 existing.market_state = stock_data["market_state"]
                 existing.timezone = stock_data["timezone"]
                 existing.exchange = stock_data["exchange"]
-                existing.historical_data = stock_data["historical_data"]
+                if "historical_data" in stock_data:
+                    existing.historical_data = stock_data["historical_data"]
+                if "quality_report" in stock_data:
+                    existing.quality_report = stock_data["quality_report"]
                 existing.updated_at = datetime.now(UTC)
+                stock = existing
             else:
                 # 新規データを作成
                 new_stock = StockData(
@@ -36,22 +151,44 @@ class DatabaseService:
                     market_state=stock_data["market_state"],
                     timezone=stock_data["timezone"],
                     exchange=stock_data["exchange"],
-                    historical_data=stock_data["historical_data"],
+                    historical_data=stock_data.get("historical_data"),
+                    quality_report=stock_data.get("quality_report"),
                 )
                 db.session.add(new_stock)
+                stock = new_stock
 
+            # 新しい配当・分割イベントがあった場合のみ累積調整係数を再計算する
+            if "corporate_actions" in stock_data:
+                actions, changed = merge_actions(
+                    stock.corporate_actions,
+                    stock_data["corporate_actions"],
+                    stock_data.get("historical_data"),
+                )
+                if changed:
+                    stock.corporate_actions = actions
+                    stock.adjustment_factors = compute_factors(actions)
+
+            # コミット後の再読み込みを避けるため、フラッシュ時点でIDを確定させる
+            db.session.flush()
+            stock_id: int = stock.id
             db.session.commit()
-            return True
+            self._mark_write()
+            self._invalidate_cache(stock_data["symbol"])
+            self._notify_saved(stock_data)
+            return stock_id
 
         except Exception as e:
             db.session.rollback()
             print(f"データベース保存エラー: {e}")
-            return False
+            return None
 
     def get_stocks_paginated(self, page: int = 1, per_page: int = 12) -> Dict:
         """ページネーション付きで株価データを取得"""
-        try:
-            pagination = StockData.query.order_by(desc(StockData.updated_at)).paginate(
+
+        def reader(session: ReadSession) -> Dict:
+            # query_cls=db.Query のため、クエリはFlask-SQLAlchemyのQuery
+            query = cast(Query, session.query(StockData))
+            pagination = query.order_by(desc(StockData.updated_at)).paginate(
                 page=page, per_page=per_page, error_out=False
             )
 
@@ -80,6 +217,9 @@ class DatabaseService:
                 "pages": pagination.pages,
             }
 
+        try:
+            return self._run_read(reader)
+
         except Exception as e:
             print(f"データベース取得エラー: {e}")
             return {
@@ -92,8 +232,9 @@ class DatabaseService:
 
     def get_stock_by_symbol(self, symbol: str) -> Optional[Dict]:
         """シンボルで株価データを取得"""
-        try:
-            stock = StockData.query.filter_by(symbol=symbol).first()
+
+        def reader(session: ReadSession) -> Optional[Dict]:
+            stock = session.query(StockData).filter_by(symbol=symbol).first()
 
             if not stock:
                 return None
@@ -108,6 +249,8 @@ class DatabaseService:
                 "timezone": stock.timezone,
                 "exchange": stock.exchange,
                 "historical_data": stock.historical_data,
+                "corporate_actions": stock.corporate_actions,
+                "quality_report": stock.quality_report,
                 "created_at": (
                     stock.created_at.isoformat() if stock.created_at else None
                 ),
@@ -116,6 +259,12 @@ class DatabaseService:
                 ),
             }
 
+        try:
+            cache = self._cache()
+            if cache is not None:
+                return cache.get_or_load(symbol, lambda: self._run_read(reader))
+            return self._run_read(reader)
+
         except Exception as e:
             print(f"データベース取得エラー: {e}")
             return None
@@ -128,6 +277,8 @@ class DatabaseService:
             if stock:
                 db.session.delete(stock)
                 db.session.commit()
+                self._mark_write()
+                self._invalidate_cache(symbol)
                 return True
 
             return False
@@ -140,8 +291,176 @@ class DatabaseService:
     def get_stock_count(self) -> int:
         """保存されている株価データの総数を取得"""
         try:
-            count: int = StockData.query.count()
+            count: int = self._run_read(
+                lambda session: session.query(StockData).count()
+            )
             return count
         except Exception as e:
             print(f"データベースカウントエラー: {e}")
             return 0
+
+    def get_stock_changes(self, symbol: str, since: datetime) -> Optional[Dict]:
+        """基準時刻以降の変更分のみを取得（変更がなければ changed=False）"""
+        stock = self.get_stock_by_symbol(symbol)
+        if stock is None:
+            return None
+
+        updated_at = stock["updated_at"]
+        if (
+            updated_at
+            and datetime.fromisoformat(updated_at).replace(tzinfo=None) <= since
+        ):
+            return {
+                "symbol": stock["symbol"],
+                "changed": False,
+                "updated_at": stock["updated_at"],
+            }
+
+        stock["changed"] = True
+        stock["historical_data"] = slice_history(stock["historical_data"], since)
+        return stock
+
+    def get_changes(self, since: datetime, after_id: int = 0, limit: int = 100) -> Dict:
+        """基準時刻以降に更新された株価データの変更フィードを取得
+
+        ``updated_at`` と ``id`` の組をウォーターマークとして昇順に返すため、
+        同時刻に更新された行がページ境界をまたいでも取りこぼさない。
+        """
+
+        def reader(session: ReadSession) -> Dict:
+            stocks = (
+                session.query(StockData)
+                .filter(
+                    or_(
+                        StockData.updated_at > since,
+                        and_(StockData.updated_at == since, StockData.id > after_id),
+                    )
+                )
+                .order_by(StockData.updated_at, StockData.id)
+                .limit(limit + 1)
+                .all()
+            )
+
+            items = []
+            for stock in stocks[:limit]:
+                item = stock.to_dict()
+                item["historical_data"] = slice_history(stock.historical_data, since)
+                items.append(item)
+
+            last = stocks[:limit][-1] if stocks else None
+            return {
+                "items": items,
+                "has_more": len(stocks) > limit,
+                "next_since": (last.updated_at if last else since).isoformat(),
+                "next_after_id": last.id if last else after_id,
+            }
+
+        try:
+            return self._run_read(reader)
+
+        except Exception as e:
+            print(f"データベース取得エラー: {e}")
+            return {
+                "items": [],
+                "has_more": False,
+                "next_since": since.isoformat(),
+                "next_after_id": after_id,
+            }
+
+    def get_symbol_list(self) -> List[Dict[str, Any]]:
+        """保存済みの全シンボル（会社名・取引所付き）を取得"""
+        try:
+            return self._run_read(
+                lambda session: [
+                    {"symbol": symbol, "name": name, "exchange": exchange}
+                    for symbol, name, exchange in session.query(
+                        StockData.symbol, StockData.company_name, StockData.exchange
+                    )
+                ]
+            )
+        except Exception as e:
+            print(f"データベース取得エラー: {e}")
+            return []
+
+    def get_adjustment_factors(self, symbol: str) -> Optional[Dict]:
+        """累積調整係数を取得"""
+        try:
+            factors: Optional[Dict] = self._run_read(
+                lambda session: session.query(StockData.adjustment_factors)
+                .filter_by(symbol=symbol)
+                .scalar()
+            )
+            return factors
+        except Exception as e:
+            print(f"データベース取得エラー: {e}")
+            return None
+
+    def get_versions(self, symbols: List[str]) -> Dict[str, Optional[str]]:
+        """指定シンボルの更新時刻（データのバージョン）を取得"""
+        try:
+            return self._run_read(
+                lambda session: {
+                    symbol: updated_at.isoformat() if updated_at else None
+                    for symbol, updated_at in session.query(
+                        StockData.symbol, StockData.updated_at
+                    ).filter(StockData.symbol.in_(symbols))
+                }
+            )
+        except Exception as e:
+            print(f"データベース取得エラー: {e}")
+            return {}
+
+    def get_histories(self, symbols: List[str]) -> Dict[str, Optional[Dict]]:
+        """指定シンボルの履歴データをまとめて取得"""
+        try:
+            return self._run_read(
+                lambda session: {
+                    symbol: historical_data
+                    for symbol, historical_data in session.query(
+                        StockData.symbol, StockData.historical_data
+                    ).filter(StockData.symbol.in_(symbols))
+                }
+            )
+        except Exception as e:
+            print(f"データベース取得エラー: {e}")
+            return {}
+
+    def iter_stocks(
+        self,
+        exchange: Optional[str] = None,
+        currency: Optional[str] = None,
+        updated_since: Optional[datetime] = None,
+        batch_size: int = 500,
+    ) -> Iterator[Dict[str, Any]]:
+        """株価データを1件ずつ返す（エクスポート用）
+
+        サーバーサイドカーソル（yield_per）で ``batch_size`` 件ずつ取得し、
+        ORMの識別マップを経由しないためテーブルサイズに関わらずメモリ使用量は一定。
+        レプリカがあればレプリカから読む（ストリーム途中のフォールバックは行わない）。
+        """
+        table = StockData.__table__
+        query = select(table).order_by(table.c.id)
+        if exchange:
+            query = query.where(table.c.exchange == exchange)
+        if currency:
+            query = query.where(table.c.currency == currency)
+        if updated_since:
+            query = query.where(table.c.updated_at > updated_since)
+
+        replicas = [] if self._read_from_primary() else self._replica_keys()
+        session: Any = db.session
+        if replicas:
+            key = replicas[next(_replica_cycle) % len(replicas)]
+            session = Session(bind=db.engines[key])
+
+        try:
+            result = session.execute(query.execution_options(yield_per=batch_size))
+            for row in result:
+                item = dict(row._mapping)
+                for name in ("created_at", "updated_at"):
+                    if item[name] is not None:
+                        item[name] = item[name].isoformat()
+                yield item
+        finally:
+            if session is not db.session:
+                session.close()
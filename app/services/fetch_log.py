@@ -0,0 +1,92 @@
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from flask import current_app
+from sqlalchemy import insert
+
+from app import db
+from app.models.stock_data import FetchLog
+
+
+class FetchLogWriter:
+    """取得ログ（FetchLog）のバッファ付き書き込み
+
+    記録はメモリ上に溜め、件数（``max_batch_size``）または経過時間
+    （``flush_interval`` 秒）のしきい値を超えた時点で一括INSERTする。
+    取得ループ側のコストは1件あたりリストへの追加のみとなる。
+    """
+
+    def __init__(
+        self,
+        max_batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+    ) -> None:
+        self.max_batch_size = max_batch_size or current_app.config.get(
+            "FETCH_LOG_BATCH_SIZE", 100
+        )
+        self.flush_interval = flush_interval or current_app.config.get(
+            "FETCH_LOG_FLUSH_INTERVAL", 5.0
+        )
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def record(
+        self,
+        task_id: str,
+        symbol: str,
+        status: str,
+        started_at: datetime,
+        completed_at: Optional[datetime] = None,
+        duration_ms: Optional[float] = None,
+        message: Optional[str] = None,
+        error_detail: Optional[str] = None,
+        stock_data_id: Optional[int] = None,
+    ) -> None:
+        """取得結果を1件記録（しきい値を超えたら一括書き込み）"""
+        with self._lock:
+            self._buffer.append(
+                {
+                    "task_id": task_id,
+                    "symbol": symbol,
+                    "status": status,
+                    "message": message,
+                    "error_detail": error_detail,
+                    "started_at": started_at,
+                    "completed_at": completed_at,
+                    "duration_ms": duration_ms,
+                    "stock_data_id": stock_data_id,
+                }
+            )
+            should_flush = (
+                len(self._buffer) >= self.max_batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+
+        if should_flush:
+            self.flush()
+
+    def flush(self) -> int:
+        """バッファの内容を一括INSERTし、書き込んだ件数を返す"""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+
+        if not rows:
+            return 0
+
+        try:
+            db.session.execute(insert(FetchLog), rows)
+            db.session.commit()
+            return len(rows)
+        except Exception as e:
+            db.session.rollback()
+            print(f"取得ログ書き込みエラー: {e}")
+            return 0
+
+    @property
+    def pending(self) -> int:
+        """未書き込みの件数"""
+        return len(self._buffer)
@@ -0,0 +1,155 @@
+import math
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import case, func, select
+
+from app import db
+from app.models.stock_data import FetchLog, StockData
+
+# 集計単位ごとのSQLite用書式（PostgreSQLではdate_truncを使用）
+SQLITE_BUCKET_FORMATS = {
+    "minute": "%Y-%m-%dT%H:%M:00",
+    "hour": "%Y-%m-%dT%H:00:00",
+    "day": "%Y-%m-%dT00:00:00",
+}
+BUCKET_MINUTES = {"minute": 1, "hour": 60, "day": 24 * 60}
+GROUP_BY_CHOICES = ("symbol", "exchange", "time")
+PERCENTILES = {"p50_ms": 0.5, "p95_ms": 0.95, "p99_ms": 0.99}
+
+
+def _percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """線形補間によるパーセンタイル（PostgreSQLのpercentile_contと同じ定義）"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    if lower == upper:
+        return sorted_values[lower]
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (
+        position - lower
+    )
+
+
+class FetchStatsService:
+    """取得ログ（FetchLog）の性能集計サービス"""
+
+    def _is_postgresql(self) -> bool:
+        return bool(db.session.get_bind().dialect.name == "postgresql")
+
+    def _group_column(self, group_by: str, bucket: str) -> Any:
+        """集計キーとなるSQL式を取得"""
+        if group_by == "exchange":
+            return func.coalesce(StockData.exchange, "UNKNOWN")
+        if group_by == "time":
+            if self._is_postgresql():
+                return func.date_trunc(bucket, FetchLog.started_at)
+            return func.strftime(SQLITE_BUCKET_FORMATS[bucket], FetchLog.started_at)
+        return FetchLog.symbol
+
+    def _base_query(self, query: Any, group_by: str) -> Any:
+        """取引所で集計する場合のみStockDataを結合"""
+        if group_by == "exchange":
+            return query.select_from(FetchLog).outerjoin(
+                StockData, FetchLog.stock_data_id == StockData.id
+            )
+        return query.select_from(FetchLog)
+
+    def _percentiles(
+        self, group_col: Any, group_by: str, since: datetime, until: datetime
+    ) -> Dict[Any, Dict[str, Optional[float]]]:
+        """グループごとの所要時間パーセンタイルを取得"""
+        window = FetchLog.started_at.between(since, until)
+
+        if self._is_postgresql():
+            columns = [
+                func.percentile_cont(q).within_group(FetchLog.duration_ms).label(name)
+                for name, q in PERCENTILES.items()
+            ]
+            query = self._base_query(select(group_col.label("key"), *columns), group_by)
+            rows = db.session.execute(query.where(window).group_by(group_col))
+            return {
+                row.key: {name: getattr(row, name) for name in PERCENTILES}
+                for row in rows
+            }
+
+        # SQLiteにはパーセンタイル関数がないため、ソート済みの値から算出する
+        query = self._base_query(
+            select(group_col.label("key"), FetchLog.duration_ms), group_by
+        )
+        rows = db.session.execute(
+            query.where(window, FetchLog.duration_ms.isnot(None)).order_by(
+                group_col, FetchLog.duration_ms
+            )
+        )
+        durations: Dict[Any, List[float]] = {}
+        for row in rows:
+            durations.setdefault(row.key, []).append(row.duration_ms)
+        return {
+            key: {name: _percentile(values, q) for name, q in PERCENTILES.items()}
+            for key, values in durations.items()
+        }
+
+    def get_stats(
+        self,
+        since: datetime,
+        until: datetime,
+        group_by: str = "symbol",
+        bucket: str = "hour",
+        limit: int = 100,
+    ) -> Dict[str, Any]:
+        """レイテンシ・エラー率・スループットをグループ別に集計"""
+        group_col = self._group_column(group_by, bucket)
+        query = self._base_query(
+            select(
+                group_col.label("key"),
+                func.count().label("attempts"),
+                func.sum(case((FetchLog.status == "success", 1), else_=0)).label(
+                    "success"
+                ),
+                func.avg(FetchLog.duration_ms).label("avg_ms"),
+            ),
+            group_by,
+        )
+        rows = db.session.execute(
+            query.where(FetchLog.started_at.between(since, until))
+            .group_by(group_col)
+            .order_by(func.count().desc())
+            .limit(limit)
+        ).all()
+        percentiles = self._percentiles(group_col, group_by, since, until)
+
+        # スループットの分母：時間帯別は1バケット、それ以外は集計期間全体
+        window_minutes = max((until - since).total_seconds() / 60, 1 / 60)
+        if group_by == "time":
+            window_minutes = BUCKET_MINUTES[bucket]
+
+        groups = []
+        for row in rows:
+            key = row.key.isoformat() if isinstance(row.key, datetime) else row.key
+            errors = row.attempts - (row.success or 0)
+            groups.append(
+                {
+                    "key": key,
+                    "count": row.attempts,
+                    "errors": errors,
+                    "error_rate": errors / row.attempts if row.attempts else 0.0,
+                    "avg_ms": row.avg_ms,
+                    **percentiles.get(row.key, dict.fromkeys(PERCENTILES)),
+                    "throughput_per_min": row.attempts / window_minutes,
+                }
+            )
+
+        if group_by == "time":
+            groups.sort(key=lambda group: group["key"])
+        else:
+            groups.sort(key=lambda group: group["p95_ms"] or 0, reverse=True)
+
+        return {
+            "group_by": group_by,
+            "bucket": bucket if group_by == "time" else None,
+            "since": since.isoformat(),
+            "until": until.isoformat(),
+            "groups": groups,
+        }
@@ -0,0 +1,238 @@
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from flask import Flask, current_app
+
+from app.config import Config
+
+# 優先度レーン（interactive: 画面からの更新、scheduled: 定期取得、bulk: 一括取得）
+LANES = ("interactive", "scheduled", "bulk")
+DEFAULT_LANE_WEIGHTS = {"interactive": 8, "scheduled": 3, "bulk": 1}
+
+
+class _Lane:
+    """レーンごとの待ち行列と実行状況"""
+
+    def __init__(self, weight: int, cap: Optional[int]) -> None:
+        self.weight = max(1, weight)
+        self.cap = cap
+        self.jobs: Deque[Iterator[Any]] = deque()
+        self.running = 0
+        # ストライドスケジューリングの仮想時刻（小さいレーンから実行）
+        self.pass_value = 0.0
+
+    def runnable(self) -> bool:
+        return bool(self.jobs) and (self.cap is None or self.running < self.cap)
+
+
+class JobRunner:
+    """優先度レーン付きのバックグラウンドジョブ実行
+
+    ジョブは1ステップずつ進むイテレータとして登録する。ワーカーは1ステップ
+    （1銘柄の取得など）を実行するたびにジョブを自レーンの末尾へ戻すため、
+    同じレーンのジョブは交互に進み、大量の一括取得の後ろで数銘柄の更新が待たされない。
+
+    レーン間は重み付きのストライドスケジューリングで選び、レーンごとの同時実行数の
+    上限（``caps``）により低優先度のレーンが全ワーカーを占有しないようにする。
+    ``FETCH_WORKERS`` が0の場合は登録時にその場で最後まで実行する（テスト用）。
+
+    ``key`` を付けて登録したジョブは待機中・実行中の間 ``active_keys`` に含まれ、
+    ``heartbeat`` を指定すると ``heartbeat_seconds`` ごとにそのキーの一覧で呼び出す
+    （待ち行列で待っているジョブも生存していることを他のプロセスに示すため）。
+    """
+
+    def __init__(
+        self,
+        weights: Optional[Dict[str, int]] = None,
+        caps: Optional[Dict[str, int]] = None,
+        heartbeat: Optional[Callable[[List[str]], None]] = None,
+        heartbeat_seconds: float = 30.0,
+    ) -> None:
+        weights = {**DEFAULT_LANE_WEIGHTS, **(weights or {})}
+        caps = caps or {}
+        self.lanes: Dict[str, _Lane] = {
+            name: _Lane(weights[name], caps.get(name)) for name in LANES
+        }
+        self._condition = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._app: Optional[Flask] = None
+        self._virtual_time = 0.0
+        self._stopping = False
+        self._keys: Counter[str] = Counter()
+        self.heartbeat = heartbeat
+        self.heartbeat_seconds = heartbeat_seconds
+
+    def submit(self, lane: str, job: Iterator[Any], key: Optional[str] = None) -> None:
+        """ジョブをレーンに登録（``key`` は生存通知に使うジョブの識別子）"""
+        if lane not in self.lanes:
+            raise ValueError(f"laneは{'/'.join(LANES)}のいずれかです")
+
+        workers = int(current_app.config.get("FETCH_WORKERS", 0))
+        if workers <= 0:
+            for _ in job:
+                pass
+            return
+
+        with self._condition:
+            app = current_app._get_current_object()  # type: ignore[attr-defined]
+            self._start(app, workers)
+            state = self.lanes[lane]
+            if not state.jobs and state.running == 0:
+                # 休止していたレーンが溜まった分をまとめて取り返さないよう時刻を揃える
+                state.pass_value = max(state.pass_value, self._virtual_time)
+            if key is not None:
+                self._keys[key] += 1
+                job = self._tracked(job, key)
+            state.jobs.append(job)
+            self._condition.notify()
+
+    def _tracked(self, job: Iterator[Any], key: str) -> Iterator[Any]:
+        """終了（エラーを含む）時に生存中のキーから外すラッパー"""
+        try:
+            yield from job
+        finally:
+            with self._condition:
+                self._keys[key] -= 1
+                if self._keys[key] <= 0:
+                    del self._keys[key]
+
+    def active_keys(self) -> List[str]:
+        """待機中・実行中のジョブのキー"""
+        with self._condition:
+            return sorted(self._keys)
+
+    def _start(self, app: Flask, workers: int) -> None:
+        """初回登録時にワーカースレッドを起動"""
+        if self._threads:
+            return
+        self._app = app
+        self._stopping = False
+        for i in range(workers):
+            thread = threading.Thread(
+                target=self._worker, name=f"job-runner-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        if self.heartbeat is not None:
+            thread = threading.Thread(
+                target=self._heartbeat_loop, name="job-runner-heartbeat", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _heartbeat_loop(self) -> None:
+        """一定間隔で生存中のジョブのキーを通知（停止時は全ジョブの終了まで続ける）"""
+        assert self._app is not None and self.heartbeat is not None
+        last = time.monotonic()
+        while True:
+            with self._condition:
+                self._condition.wait(
+                    timeout=max(0.0, last + self.heartbeat_seconds - time.monotonic())
+                )
+                if self._stopping and not self._keys:
+                    return
+                if time.monotonic() - last < self.heartbeat_seconds:
+                    continue
+                keys = sorted(self._keys)
+            last = time.monotonic()
+            if not keys:
+                continue
+            try:
+                with self._app.app_context():
+                    self.heartbeat(keys)
+            except Exception as e:
+                print(f"ジョブ生存通知エラー: {e}")
+
+    def _next_lane(self) -> Optional[str]:
+        """実行可能なレーンのうち仮想時刻が最も小さいものを選ぶ"""
+        candidates = [name for name, lane in self.lanes.items() if lane.runnable()]
+        if not candidates:
+            return None
+        return min(
+            candidates,
+            key=lambda name: (self.lanes[name].pass_value, LANES.index(name)),
+        )
+
+    def _take(self) -> Optional[Tuple[_Lane, Iterator[Any]]]:
+        """次に実行するジョブを取り出す（ロック取得済みで呼ぶ）"""
+        lane_name = self._next_lane()
+        if lane_name is None:
+            return None
+
+        lane = self.lanes[lane_name]
+        lane.running += 1
+        self._virtual_time = lane.pass_value
+        lane.pass_value += 1.0 / lane.weight
+        return lane, lane.jobs.popleft()
+
+    def _worker(self) -> None:
+        while True:
+            with self._condition:
+                taken = self._take()
+                while taken is None:
+                    if self._stopping:
+                        return
+                    self._condition.wait()
+                    taken = self._take()
+            lane, job = taken
+
+            finished = self._step(job)
+
+            with self._condition:
+                lane.running -= 1
+                if not finished:
+                    lane.jobs.append(job)
+                self._condition.notify_all()
+
+    def _step(self, job: Iterator[Any]) -> bool:
+        """ジョブを1ステップ進める（終了またはエラーでTrue）"""
+        assert self._app is not None
+        with self._app.app_context():
+            try:
+                next(job)
+                return False
+            except StopIteration:
+                return True
+            except Exception as e:
+                print(f"ジョブ実行エラー: {e}")
+                return True
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """レーンごとの待ち件数・実行中件数"""
+        with self._condition:
+            return {
+                name: {
+                    "queued": len(lane.jobs),
+                    "running": lane.running,
+                    "weight": lane.weight,
+                    "cap": lane.cap,
+                }
+                for name, lane in self.lanes.items()
+            }
+
+    def shutdown(self) -> None:
+        """待ち行列が空になった後にワーカーを停止"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+
+def _heartbeat_fetch_tasks(task_ids: List[str]) -> None:
+    """このプロセスで待機中・実行中の取得タスクの生存時刻を更新"""
+    from app.services.progress import ProgressService
+
+    ProgressService().heartbeat(task_ids)
+
+
+# 株価データ取得ジョブの実行（ワーカー数はアプリ設定のFETCH_WORKERS）
+job_runner = JobRunner(
+    Config.FETCH_LANE_WEIGHTS,
+    Config.FETCH_LANE_CAPS,
+    heartbeat=_heartbeat_fetch_tasks,
+    heartbeat_seconds=Config.FETCH_TASK_HEARTBEAT_SECONDS,
+)
@@ -0,0 +1,240 @@
+from datetime import UTC, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from flask import current_app
+from sqlalchemy import text
+
+from app import db
+
+# 親テーブル名（PriceBar.__tablename__）
+PARENT_TABLE = "price_bars"
+# パーティションを作成する足の種類
+PARTITIONED_INTERVALS = ("1m", "5m", "15m", "1h", "1d")
+
+
+class PartitionError(RuntimeError):
+    """パーティションを作成できない（price_barsが未移行など）"""
+
+
+def _month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def _next_month(value: datetime) -> datetime:
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def months_between(start: datetime, end: datetime) -> List[datetime]:
+    """開始〜終了を含む各月の月初を列挙"""
+    months = []
+    current = _month_start(start)
+    while current <= end:
+        months.append(current)
+        current = _next_month(current)
+    return months
+
+
+def interval_table(interval: str) -> str:
+    """足の種類ごとの中間パーティション名"""
+    return f"{PARENT_TABLE}_{interval}"
+
+
+def month_partition_name(interval: str, month: datetime) -> str:
+    """月別パーティション名（例: price_bars_1m_2026_10）"""
+    return f"{interval_table(interval)}_{month:%Y_%m}"
+
+
+def interval_partition_ddl(interval: str) -> List[str]:
+    """足の種類ごとのパーティション（月単位でさらに分割）と既定パーティションのDDL"""
+    table = interval_table(interval)
+    return [
+        f"CREATE TABLE IF NOT EXISTS {table} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES IN ('{interval}') PARTITION BY RANGE (bar_time)",
+        f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT",
+    ]
+
+
+def month_partition_ddl(interval: str, month: datetime) -> str:
+    """月別パーティションのDDL"""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {month_partition_name(interval, month)} "
+        f"PARTITION OF {interval_table(interval)} "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_next_month(month):%Y-%m-%d}')"
+    )
+
+
+def create_interval_partitions(connection: Any) -> None:
+    """親テーブル作成直後に足の種類ごとのパーティションを作成（PostgreSQLのみ）"""
+    if connection.dialect.name != "postgresql":
+        return
+    for interval in PARTITIONED_INTERVALS:
+        for ddl in interval_partition_ddl(interval):
+            connection.execute(text(ddl))
+
+
+class PricePartitionManager:
+    """価格バーの月別パーティション管理（PostgreSQLのみ、SQLiteでは何もしない）
+
+    price_bars は足の種類でLIST分割し、さらに bar_time の月単位でRANGE分割する。
+    保持期間を過ぎた月はパーティションごとDROPするため、行数に関わらず定数時間で削除できる。
+    パーティションの有無は他プロセスの削除にも追従できるよう毎回カタログで確認する。
+    """
+
+    def is_supported(self) -> bool:
+        return bool(db.session.get_bind().dialect.name == "postgresql")
+
+    def is_partitioned(self) -> bool:
+        """price_barsがパーティション化された親テーブルかどうか"""
+        row = db.session.execute(
+            text(
+                "SELECT 1 FROM pg_partitioned_table pt "
+                "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :table"
+            ),
+            {"table": PARENT_TABLE},
+        ).first()
+        return row is not None
+
+    def ensure_range(self, interval: str, start: datetime, end: datetime) -> List[str]:
+        """期間をカバーする月別パーティションを作成し、新たに作成した名前を返す
+
+        作成できない場合は ``PartitionError`` を送出する。
+        """
+        if not self.is_supported():
+            return []
+
+        names = {
+            month_partition_name(interval, month): month
+            for month in months_between(start, end)
+        }
+        existing = {
+            row[0]
+            for row in db.session.execute(
+                text("SELECT relname FROM pg_class WHERE relname = ANY(:names)"),
+                {"names": list(names)},
+            )
+        }
+        missing = [name for name in names if name not in existing]
+        if not missing:
+            return []
+
+        try:
+            for name in missing:
+                db.session.execute(text(month_partition_ddl(interval, names[name])))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if not self.is_partitioned():
+                raise PartitionError(
+                    f"{PARENT_TABLE} がパーティション化されていません。flask partition-bars で移行してください"
+                ) from e
+            raise PartitionError(f"パーティション作成エラー ({interval}): {e}") from e
+        return missing
+
+    def convert_table(self) -> Dict[str, Any]:
+        """既存の非パーティションの price_bars をパーティション化したテーブルへ移行
+
+        既存テーブルを退避して親テーブルと足の種類ごとのパーティションを作成し、
+        データの期間をカバーする月別パーティションへ全行を移してから退避分を削除する。
+        移行済みの場合は不足している足の種類のパーティションのみ作成する。
+        """
+        from app.models.stock_data import PriceBar
+
+        if not self.is_supported():
+            return {"converted": False, "rows": 0}
+
+        connection = db.session.connection()
+        if self.is_partitioned():
+            create_interval_partitions(connection)
+            db.session.commit()
+            return {"converted": False, "rows": 0}
+
+        legacy = f"{PARENT_TABLE}_legacy"
+        connection.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {legacy}"))
+        connection.execute(
+            text(
+                f"ALTER TABLE {legacy} "
+                f"RENAME CONSTRAINT {PARENT_TABLE}_pkey TO {legacy}_pkey"
+            )
+        )
+        # after_create で足の種類ごとのパーティションも作成される
+        PriceBar.__table__.create(bind=connection)
+
+        ranges: Sequence[Any] = connection.execute(
+            text(
+                f"SELECT interval, MIN(bar_time), MAX(bar_time) FROM {legacy} "
+                "GROUP BY interval"
+            )
+        ).all()
+        for interval, start, end in ranges:
+            for month in months_between(start, end):
+                connection.execute(text(month_partition_ddl(interval, month)))
+
+        rows = connection.execute(
+            text(
+                f"INSERT INTO {PARENT_TABLE} "
+                "(symbol, interval, bar_time, open, high, low, close, volume) "
+                "SELECT symbol, interval, bar_time, open, high, low, close, volume "
+                f"FROM {legacy}"
+            )
+        ).rowcount
+        connection.execute(text(f"DROP TABLE {legacy}"))
+        db.session.commit()
+        return {"converted": True, "rows": rows}
+
+    def ensure_partitions(
+        self, now: Optional[datetime] = None, months_ahead: Optional[int] = None
+    ) -> List[str]:
+        """保持期間の開始月から数か月先までのパーティションを事前作成"""
+        if not self.is_supported():
+            return []
+
+        now = now or datetime.now(UTC).replace(tzinfo=None)
+        if months_ahead is None:
+            months_ahead = current_app.config.get("PRICE_BAR_PARTITION_MONTHS_AHEAD", 3)
+        retention = current_app.config.get("PRICE_BAR_RETENTION_DAYS", {})
+
+        end = now
+        for _ in range(months_ahead):
+            end = _next_month(end)
+
+        created = []
+        for interval in PARTITIONED_INTERVALS:
+            days = retention.get(interval) or 365
+            created += self.ensure_range(interval, now - timedelta(days=days), end)
+        return created
+
+    def list_partitions(self, interval: str) -> List[str]:
+        """足の種類ごとの月別パーティション名を取得"""
+        if not self.is_supported():
+            return []
+
+        rows = db.session.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = :parent ORDER BY c.relname"
+            ),
+            {"parent": interval_table(interval)},
+        )
+        return [row[0] for row in rows if not row[0].endswith("_default")]
+
+    def drop_expired(self, interval: str, cutoff: datetime) -> List[str]:
+        """全期間が基準時刻より前の月別パーティションを削除"""
+        dropped = []
+        prefix = f"{interval_table(interval)}_"
+        for name in self.list_partitions(interval):
+            try:
+                month = datetime.strptime(name[len(prefix) :], "%Y_%m")
+            except ValueError:
+                continue
+            if _next_month(month) <= cutoff:
+                db.session.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                dropped.append(name)
+
+        if dropped:
+            db.session.commit()
+        return dropped
+
+
+partition_manager = PricePartitionManager()
@@ -0,0 +1,344 @@
+from datetime import UTC, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, cast
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import CursorResult, delete, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models.stock_data import PriceBar
+from app.services.partitioning import PartitionError, partition_manager
+
+# 足の種類と1本あたりの秒数
+INTERVAL_SECONDS = {
+    "1m": 60,
+    "5m": 5 * 60,
+    "15m": 15 * 60,
+    "1h": 60 * 60,
+    "1d": 24 * 60 * 60,
+}
+
+# 保持期間を過ぎた足の集約先（日足はYahoo Financeから直接取得するため集約しない）
+ROLLUP_TARGETS = {"1m": "5m", "5m": "15m", "15m": "1h"}
+
+# 一括INSERTの1文あたりの行数（SQLiteのバインド変数上限を考慮）
+INSERT_CHUNK_SIZE = 500
+
+# 集約時に1回で読み込む足の本数（銘柄ごとに時刻順で分割して読み込む）
+ROLLUP_BATCH_SIZE = 5000
+
+# ON CONFLICTに対応した方言ごとのINSERT
+UPSERT_INSERTS: Dict[str, Callable[..., Any]] = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def _to_naive_utc(epoch: float) -> datetime:
+    return datetime.fromtimestamp(epoch, UTC).replace(tzinfo=None)
+
+
+def _to_epoch(value: datetime) -> int:
+    return int(value.replace(tzinfo=UTC).timestamp())
+
+
+class PriceBarService:
+    """足の種類ごとの価格バーの保存・取得・集約サービス"""
+
+    def _retention_days(self, interval: str) -> Optional[int]:
+        retention: Dict[str, Optional[int]] = current_app.config.get(
+            "PRICE_BAR_RETENTION_DAYS", {}
+        )
+        return retention.get(interval)
+
+    def _upsert_statement(self, rows: List[Dict[str, Any]], overwrite: bool) -> Any:
+        """方言ごとのUPSERT文を生成（既存の足は上書き、または保持）"""
+        dialect_insert = UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+        if dialect_insert is None:
+            return None
+
+        stmt = dialect_insert(PriceBar).values(rows)
+        keys = ["symbol", "interval", "bar_time"]
+        if not overwrite:
+            return stmt.on_conflict_do_nothing(index_elements=keys)
+        return stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={
+                name: stmt.excluded[name]
+                for name in ("open", "high", "low", "close", "volume")
+            },
+        )
+
+    def _write_rows(self, rows: List[Dict[str, Any]], overwrite: bool = True) -> None:
+        """足をまとめて書き込み"""
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            chunk = rows[start : start + INSERT_CHUNK_SIZE]
+            stmt = self._upsert_statement(chunk, overwrite)
+            if stmt is None:
+                # UPSERT非対応の方言：既存の足を消してから挿入
+                for row in chunk:
+                    db.session.execute(
+                        delete(PriceBar).where(
+                            PriceBar.symbol == row["symbol"],
+                            PriceBar.interval == row["interval"],
+                            PriceBar.bar_time == row["bar_time"],
+                        )
+                    )
+                stmt = insert(PriceBar).values(chunk)
+            db.session.execute(stmt)
+
+    def store_bars(self, symbol: str, interval: str, historical_data: Dict) -> int:
+        """取得した足を保存し、保存件数を返す
+
+        パーティションを作成できない場合は全ての書き込みが失敗するため、
+        ``PartitionError`` をそのまま送出する。
+        """
+        try:
+            timestamps = historical_data.get("timestamps") or []
+            columns = {
+                name: historical_data.get(name) or [None] * len(timestamps)
+                for name in ("open", "high", "low", "close", "volume")
+            }
+
+            rows = [
+                {
+                    "symbol": symbol,
+                    "interval": interval,
+                    "bar_time": _to_naive_utc(ts),
+                    "open": columns["open"][i],
+                    "high": columns["high"][i],
+                    "low": columns["low"][i],
+                    "close": columns["close"][i],
+                    "volume": columns["volume"][i],
+                }
+                for i, ts in enumerate(timestamps)
+                if ts is not None and columns["close"][i] is not None
+            ]
+            if not rows:
+                return 0
+
+            # 対象月のパーティションがなければ作成（PostgreSQLのみ）
+            partition_manager.ensure_range(
+                interval,
+                min(row["bar_time"] for row in rows),
+                max(row["bar_time"] for row in rows),
+            )
+            self._write_rows(rows)
+            db.session.commit()
+            return len(rows)
+
+        except PartitionError:
+            db.session.rollback()
+            raise
+        except Exception as e:
+            db.session.rollback()
+            print(f"価格バー保存エラー ({symbol} {interval}): {e}")
+            return 0
+
+    def get_bars(
+        self,
+        symbol: str,
+        interval: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        """期間内の足を列形式（historical_dataと同じ形）で取得
+
+        開始時刻の指定がない場合は保持期間（日足は1年）の範囲に限定し、
+        検索範囲が無制限に広がらないようにする。
+        """
+        end = end or datetime.now(UTC).replace(tzinfo=None)
+        if start is None:
+            days = self._retention_days(interval) or 365
+            start = end - timedelta(days=days)
+
+        rows = db.session.execute(
+            select(
+                PriceBar.bar_time,
+                PriceBar.open,
+                PriceBar.high,
+                PriceBar.low,
+                PriceBar.close,
+                PriceBar.volume,
+            )
+            .where(
+                PriceBar.symbol == symbol,
+                PriceBar.interval == interval,
+                PriceBar.bar_time >= start,
+                PriceBar.bar_time <= end,
+            )
+            .order_by(PriceBar.bar_time)
+        ).all()
+
+        return {
+            "symbol": symbol,
+            "interval": interval,
+            "timestamps": [_to_epoch(row.bar_time) for row in rows],
+            "open": [row.open for row in rows],
+            "high": [row.high for row in rows],
+            "low": [row.low for row in rows],
+            "close": [row.close for row in rows],
+            "volume": [row.volume for row in rows],
+        }
+
+    def rollup(self, interval: str, before: datetime) -> int:
+        """指定時刻より前の足を上位の足に集約し、作成件数を返す
+
+        既に存在する上位の足（Yahoo Financeから取得済みのもの）は上書きしない。
+        初回実行時に大量の足があってもメモリを使い切らないよう、銘柄ごとに
+        ``ROLLUP_BATCH_SIZE`` 本ずつ読み込んで集約する。
+        """
+        target = ROLLUP_TARGETS.get(interval)
+        if target is None:
+            return 0
+
+        width = INTERVAL_SECONDS[target]
+        symbols: Sequence[str] = (
+            db.session.execute(
+                select(PriceBar.symbol)
+                .where(PriceBar.interval == interval, PriceBar.bar_time < before)
+                .distinct()
+            )
+            .scalars()
+            .all()
+        )
+
+        created = 0
+        for symbol in symbols:
+            start: Optional[datetime] = None
+            while True:
+                query = (
+                    select(
+                        PriceBar.symbol,
+                        PriceBar.bar_time,
+                        PriceBar.open,
+                        PriceBar.high,
+                        PriceBar.low,
+                        PriceBar.close,
+                        PriceBar.volume,
+                    )
+                    .where(
+                        PriceBar.symbol == symbol,
+                        PriceBar.interval == interval,
+                        PriceBar.bar_time < before,
+                    )
+                    .order_by(PriceBar.bar_time)
+                    .limit(ROLLUP_BATCH_SIZE)
+                )
+                if start is not None:
+                    query = query.where(PriceBar.bar_time >= start)
+                rows = db.session.execute(query).all()
+                if not rows:
+                    break
+
+                if len(rows) < ROLLUP_BATCH_SIZE:
+                    created += self._rollup_rows(rows, target)
+                    break
+
+                # 最後の区間は続きの足がある可能性があるため、次のバッチで集計する
+                last_bucket = _to_epoch(rows[-1].bar_time) // width * width
+                complete = [
+                    row for row in rows if _to_epoch(row.bar_time) < last_bucket
+                ]
+                if not complete:
+                    # 1区間の足がバッチより多い場合（通常は起こらない）はそのまま集計
+                    created += self._rollup_rows(rows, target)
+                    break
+                created += self._rollup_rows(complete, target)
+                start = _to_naive_utc(last_bucket)
+
+        return created
+
+    def _rollup_rows(self, rows: Sequence[Any], target: str) -> int:
+        """時刻順に並んだ足を上位の足に集約して書き込み、作成件数を返す"""
+        symbols = np.array([row.symbol for row in rows])
+        times = np.array([_to_epoch(row.bar_time) for row in rows], dtype=np.int64)
+        values = np.array(
+            [[row.open, row.high, row.low, row.close, row.volume] for row in rows],
+            dtype=float,
+        )
+
+        # シンボルまたは上位足の区間が変わる位置で区切り、区間ごとに一括集計する
+        width = INTERVAL_SECONDS[target]
+        buckets = times // width * width
+        boundary = np.ones(len(rows), dtype=bool)
+        boundary[1:] = (buckets[1:] != buckets[:-1]) | (symbols[1:] != symbols[:-1])
+        starts = np.flatnonzero(boundary)
+        ends = np.append(starts[1:], len(rows)) - 1
+
+        opens = values[starts, 0]
+        highs = np.fmax.reduceat(values[:, 1], starts)
+        lows = np.fmin.reduceat(values[:, 2], starts)
+        closes = values[ends, 3]
+        volumes = np.add.reduceat(np.nan_to_num(values[:, 4]), starts)
+
+        def _value(x: float) -> Optional[float]:
+            return None if np.isnan(x) else float(x)
+
+        new_rows = [
+            {
+                "symbol": str(symbols[s]),
+                "interval": target,
+                "bar_time": _to_naive_utc(int(buckets[s])),
+                "open": _value(opens[i]),
+                "high": _value(highs[i]),
+                "low": _value(lows[i]),
+                "close": _value(closes[i]),
+                "volume": int(volumes[i]),
+            }
+            for i, s in enumerate(starts)
+        ]
+
+        self._write_rows(new_rows, overwrite=False)
+        return len(new_rows)
+
+    def apply_retention(
+        self, now: Optional[datetime] = None
+    ) -> Dict[str, Dict[str, int]]:
+        """保持期間を過ぎた足を上位の足へ集約してから削除
+
+        細かい足から順に処理するため、1分足→5分足→15分足→1時間足と段階的に集約される。
+        """
+        now = now or datetime.now(UTC).replace(tzinfo=None)
+        results: Dict[str, Dict[str, int]] = {}
+
+        try:
+            for interval in INTERVAL_SECONDS:
+                days = self._retention_days(interval)
+                if days is None:
+                    continue
+
+                # 集約先の区間境界に揃え、区間の途中で削除しないようにする
+                cutoff_epoch = _to_epoch(now - timedelta(days=days))
+                target = ROLLUP_TARGETS.get(interval)
+                if target:
+                    width = INTERVAL_SECONDS[target]
+                    cutoff_epoch = cutoff_epoch // width * width
+                cutoff = _to_naive_utc(cutoff_epoch)
+
+                rolled_up = self.rollup(interval, cutoff)
+                # 全期間が期限切れの月はパーティションごと削除し、残りを行単位で削除する
+                dropped = partition_manager.drop_expired(interval, cutoff)
+                result = cast(
+                    CursorResult,
+                    db.session.execute(
+                        delete(PriceBar).where(
+                            PriceBar.interval == interval, PriceBar.bar_time < cutoff
+                        )
+                    ),
+                )
+                purged = result.rowcount
+                db.session.commit()
+
+                results[interval] = {
+                    "rolled_up": rolled_up,
+                    "purged": purged,
+                    "dropped_partitions": len(dropped),
+                }
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"価格バー保持期間処理エラー: {e}")
+
+        return results
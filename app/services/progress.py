@@ -1,16 +1,89 @@
 import json
 import os
+import socket
+import tempfile
+import threading
+from abc import ABC, abstractmethod
 from datetime import UTC, datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
+from app.config import Config
 
-class ProgressService:
-    """プログレス管理サービス（MVP版：メモリ＆ファイルベース）"""
+# 詳細履歴の保持件数
+MAX_DETAILS = 20
+# タスクIDを直接引けるよう索引を持つ項目（冪等キー・取得内容のフィンガープリント）
+INDEXED_FIELDS = ("idempotency_key", "fingerprint")
+
+
+def process_owner() -> str:
+    """タスクを実行するプロセスの識別子（ホスト名:PID）"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class ProgressBackend(ABC):
+    """プログレスデータの保存先インターフェース"""
+
+    @abstractmethod
+    def load(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """タスクを取得"""
+
+    @abstractmethod
+    def save(self, task_id: str, task: Dict[str, Any]) -> None:
+        """タスク全体を保存（既存データは置き換え）"""
+
+    @abstractmethod
+    def update(
+        self,
+        task_id: str,
+        fields: Dict[str, Any],
+        detail: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """指定フィールドの更新と詳細履歴の追加をまとめて行う"""
+
+    @abstractmethod
+    def compare_and_update(
+        self, task_id: str, expected: Dict[str, Any], fields: Dict[str, Any]
+    ) -> bool:
+        """現在の値が ``expected`` と一致する場合のみ原子的に更新する"""
+
+    @abstractmethod
+    def find_task_id(self, field: str, value: str) -> Optional[str]:
+        """索引付きの項目の値からタスクIDを取得（同じ値が複数ある場合は最新）"""
+
+    @abstractmethod
+    def delete(self, task_id: str) -> None:
+        """タスクを削除"""
+
+    @abstractmethod
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        """全タスクを取得"""
 
-    def __init__(self) -> None:
-        self.progress_file = "progress_data.json"
-        self.tasks: Dict[Any, Any] = {}
-        self._load_tasks()
+
+class FileProgressBackend(ProgressBackend):
+    """ローカルファイルによる保存（開発用）
+
+    ジョブのワーカースレッドとリクエスト処理が同じファイルを読み書きするため、
+    読み込みから保存までをプロセス内で共有するロックで直列化する。
+    保存は一時ファイルへの書き込み後に置き換えるため、他プロセスが書き込み途中の
+    ファイルを読むことはない。
+    """
+
+    _file_lock = threading.RLock()
+
+    def __init__(self, progress_file: str = "progress_data.json") -> None:
+        self.progress_file = progress_file
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        self._file_stamp: Optional[Tuple[int, int, int]] = None
+        with self._file_lock:
+            self._load_tasks()
+
+    def _current_stamp(self) -> Optional[Tuple[int, int, int]]:
+        """ファイルの更新状態（inode, mtime, サイズ）を取得"""
+        try:
+            stat = os.stat(self.progress_file)
+            return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
 
     def _load_tasks(self) -> None:
         """タスクデータをファイルから読み込み"""
@@ -18,121 +91,485 @@ class ProgressService:
             if os.path.exists(self.progress_file):
                 with open(self.progress_file, "r", encoding="utf-8") as f:
                     self.tasks = json.load(f)
+            self._file_stamp = self._current_stamp()
         except Exception as e:
             print(f"プログレスファイル読み込みエラー: {e}")
             self.tasks = {}
 
+    def _reload_if_changed(self) -> None:
+        """他プロセスによる更新があればファイルを再読み込み"""
+        if self._current_stamp() != self._file_stamp:
+            self._load_tasks()
+
     def _save_tasks(self) -> None:
-        """タスクデータをファイルに保存"""
+        """タスクデータを一時ファイルに書き込み、保存先と置き換える"""
+        directory = os.path.dirname(os.path.abspath(self.progress_file))
+        temp_path = None
         try:
-            with open(self.progress_file, "w", encoding="utf-8") as f:
+            fd, temp_path = tempfile.mkstemp(
+                dir=directory, prefix=".progress-", suffix=".tmp"
+            )
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
                 json.dump(self.tasks, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.progress_file)
+            self._file_stamp = self._current_stamp()
         except Exception as e:
             print(f"プログレスファイル保存エラー: {e}")
+            if temp_path is not None and os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    def load(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._file_lock:
+            self._reload_if_changed()
+            task = self.tasks.get(task_id)
+            return dict(task) if task is not None else None
+
+    def save(self, task_id: str, task: Dict[str, Any]) -> None:
+        with self._file_lock:
+            self._reload_if_changed()
+            self.tasks[task_id] = dict(task)
+            self._save_tasks()
+
+    def update(
+        self,
+        task_id: str,
+        fields: Dict[str, Any],
+        detail: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        with self._file_lock:
+            self._reload_if_changed()
+            if task_id not in self.tasks:
+                return False
+
+            task = self.tasks[task_id]
+            task.update(fields)
+            if detail is not None:
+                task["details"] = (task.get("details", []) + [detail])[-MAX_DETAILS:]
+
+            self._save_tasks()
+            return True
+
+    def compare_and_update(
+        self, task_id: str, expected: Dict[str, Any], fields: Dict[str, Any]
+    ) -> bool:
+        with self._file_lock:
+            self._reload_if_changed()
+            task = self.tasks.get(task_id)
+            if task is None or any(
+                task.get(name) != value for name, value in expected.items()
+            ):
+                return False
+
+            task.update(fields)
+            self._save_tasks()
+            return True
+
+    def find_task_id(self, field: str, value: str) -> Optional[str]:
+        # 全タスクをメモリに保持しているため、登録の新しい順に走査する
+        with self._file_lock:
+            self._reload_if_changed()
+            for task_id, task in reversed(self.tasks.items()):
+                if task.get(field) == value:
+                    return task_id
+            return None
+
+    def delete(self, task_id: str) -> None:
+        with self._file_lock:
+            self._reload_if_changed()
+            if self.tasks.pop(task_id, None) is not None:
+                self._save_tasks()
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        with self._file_lock:
+            self._reload_if_changed()
+            return {task_id: dict(task) for task_id, task in self.tasks.items()}
+
+
+class RedisProgressBackend(ProgressBackend):
+    """Redisによる保存（複数ワーカー間で共有）
+
+    タスクはハッシュ（各フィールドはJSONエンコード）、詳細履歴はリストとして保持し、
+    更新はトランザクション付きパイプラインで原子的に行う。既存タスクの更新は
+    WATCHで存在確認から書き込みまでを1つのトランザクションにする。更新のたびに
+    ``channel`` へ変更通知をpublishする。冪等キーとフィンガープリントは
+    タスクIDを値とする個別のキーに保存し、全タスクを読まずに引けるようにする。
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        ttl_seconds: int = 7 * 24 * 3600,
+        key_prefix: str = "progress",
+    ) -> None:
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+        self.channel = f"{key_prefix}:updates"
+
+    def _task_key(self, task_id: str) -> str:
+        return f"{self.key_prefix}:task:{task_id}"
+
+    def _details_key(self, task_id: str) -> str:
+        return f"{self.key_prefix}:details:{task_id}"
+
+    def _index_key(self, field: str, value: str) -> str:
+        return f"{self.key_prefix}:index:{field}:{value}"
+
+    def _notify(self, pipe: Any, task_id: str, fields: Dict[str, Any]) -> None:
+        """変更通知をパイプラインに追加"""
+        message: Dict[str, Any] = {"task_id": task_id}
+        for name in ("status", "progress", "message"):
+            if name in fields:
+                message[name] = fields[name]
+        pipe.publish(self.channel, json.dumps(message, ensure_ascii=False))
+
+    def load(self, task_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.hgetall(self._task_key(task_id))
+        if not raw:
+            return None
+
+        task = {name: json.loads(value) for name, value in raw.items()}
+        task["details"] = [
+            json.loads(item)
+            for item in self.client.lrange(self._details_key(task_id), 0, -1)
+        ]
+        return task
+
+    def save(self, task_id: str, task: Dict[str, Any]) -> None:
+        fields = {name: value for name, value in task.items() if name != "details"}
+        details = task.get("details", [])[-MAX_DETAILS:]
+        task_key = self._task_key(task_id)
+        details_key = self._details_key(task_id)
+
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(task_key, details_key)
+        pipe.hset(
+            task_key,
+            mapping={name: json.dumps(value) for name, value in fields.items()},
+        )
+        if details:
+            pipe.rpush(details_key, *[json.dumps(item) for item in details])
+        pipe.expire(task_key, self.ttl_seconds)
+        pipe.expire(details_key, self.ttl_seconds)
+        for name in INDEXED_FIELDS:
+            if fields.get(name):
+                # 冪等キーは最初のタスクを保持し、フィンガープリントは最新のタスクを指す
+                pipe.set(
+                    self._index_key(name, fields[name]),
+                    task_id,
+                    ex=self.ttl_seconds,
+                    nx=name == "idempotency_key",
+                )
+        self._notify(pipe, task_id, fields)
+        pipe.execute()
+
+    def update(
+        self,
+        task_id: str,
+        fields: Dict[str, Any],
+        detail: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        task_key = self._task_key(task_id)
+        details_key = self._details_key(task_id)
+
+        def apply(pipe: Any) -> bool:
+            # WATCH中の存在確認（確認後に削除・期限切れになった場合は再試行される）
+            if not pipe.exists(task_key):
+                return False
+            pipe.multi()
+            if fields:
+                pipe.hset(
+                    task_key,
+                    mapping={name: json.dumps(value) for name, value in fields.items()},
+                )
+            if detail is not None:
+                pipe.rpush(details_key, json.dumps(detail))
+                pipe.ltrim(details_key, -MAX_DETAILS, -1)
+            pipe.expire(task_key, self.ttl_seconds)
+            pipe.expire(details_key, self.ttl_seconds)
+            self._notify(pipe, task_id, fields)
+            return True
+
+        return bool(self.client.transaction(apply, task_key, value_from_callable=True))
+
+    def compare_and_update(
+        self, task_id: str, expected: Dict[str, Any], fields: Dict[str, Any]
+    ) -> bool:
+        task_key = self._task_key(task_id)
+        names = list(expected)
+
+        def apply(pipe: Any) -> bool:
+            # WATCH中に比較し、比較後に他のプロセスが更新した場合は再試行される
+            current = pipe.hmget(task_key, names) if names else []
+            if not pipe.exists(task_key) or any(
+                (json.loads(raw) if raw is not None else None) != expected[name]
+                for name, raw in zip(names, current)
+            ):
+                return False
+            pipe.multi()
+            pipe.hset(
+                task_key,
+                mapping={name: json.dumps(value) for name, value in fields.items()},
+            )
+            pipe.expire(task_key, self.ttl_seconds)
+            pipe.expire(self._details_key(task_id), self.ttl_seconds)
+            self._notify(pipe, task_id, fields)
+            return True
+
+        return bool(self.client.transaction(apply, task_key, value_from_callable=True))
+
+    def find_task_id(self, field: str, value: str) -> Optional[str]:
+        task_id: Optional[str] = self.client.get(self._index_key(field, value))
+        return task_id
+
+    def delete(self, task_id: str) -> None:
+        self.client.delete(self._task_key(task_id), self._details_key(task_id))
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        prefix = self._task_key("")
+        tasks = {}
+        for key in self.client.scan_iter(match=f"{prefix}*"):
+            task_id = key[len(prefix) :]
+            task = self.load(task_id)
+            if task is not None:
+                tasks[task_id] = task
+        return tasks
+
+    def subscribe(self) -> Any:
+        """変更通知チャンネルを購読したPubSubオブジェクトを返す"""
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        return pubsub
+
+
+def create_progress_backend() -> ProgressBackend:
+    """設定に応じたプログレスバックエンドを生成"""
+    if Config.PROGRESS_BACKEND == "redis":
+        from app.services.redis_client import create_redis_client
+
+        return RedisProgressBackend(
+            create_redis_client(Config.REDIS_URL),
+            ttl_seconds=Config.PROGRESS_TTL_SECONDS,
+        )
 
-    def initialize_task(self, task_id: str, total_items: int) -> None:
-        """タスクを初期化"""
-        self.tasks[task_id] = {
-            "status": "running",
-            "progress": 0,
-            "total": total_items,
-            "current_item": 0,
-            "message": "タスクを開始しました",
-            "created_at": datetime.now(UTC).isoformat(),
-            "updated_at": datetime.now(UTC).isoformat(),
-            "completed_at": None,
-            "error": None,
-            "details": [],
-        }
-        self._save_tasks()
+    return FileProgressBackend(Config.PROGRESS_FILE)
+
+
+class ProgressService:
+    """プログレス管理サービス（保存先はバックエンドで切り替え）"""
+
+    def __init__(self, backend: Optional[ProgressBackend] = None) -> None:
+        self.backend = backend or create_progress_backend()
+
+    @property
+    def progress_file(self) -> Optional[str]:
+        """ファイルバックエンド使用時の保存先パス"""
+        if isinstance(self.backend, FileProgressBackend):
+            return self.backend.progress_file
+        return None
+
+    @progress_file.setter
+    def progress_file(self, path: str) -> None:
+        if isinstance(self.backend, FileProgressBackend):
+            self.backend.progress_file = path
+
+    def initialize_task(
+        self, task_id: str, total_items: int, extra: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """タスクを初期化（``extra`` はタスクに追加で保存する項目）"""
+        now = datetime.now(UTC).isoformat()
+        self.backend.save(
+            task_id,
+            {
+                **(extra or {}),
+                "status": "running",
+                "progress": 0,
+                "total": total_items,
+                "current_item": 0,
+                "message": "タスクを開始しました",
+                "owner": process_owner(),
+                "heartbeat_at": now,
+                "created_at": now,
+                "updated_at": now,
+                "completed_at": None,
+                "error": None,
+                "details": [],
+            },
+        )
 
     def update_progress(
         self, task_id: str, current_item: int, message: str = ""
     ) -> bool:
         """プログレスを更新"""
-        if task_id not in self.tasks:
+        task = self.backend.load(task_id)
+        if task is None:
             return False
 
-        task = self.tasks[task_id]
-        task["current_item"] = current_item
-        task["progress"] = int((current_item / task["total"]) * 100)
-        task["message"] = message or f"{current_item}/{task['total']} 完了"
-        task["updated_at"] = datetime.now(UTC).isoformat()
+        now = datetime.now(UTC).isoformat()
+        total = task["total"]
+        return self.backend.update(
+            task_id,
+            {
+                "current_item": current_item,
+                "progress": int((current_item / total) * 100) if total else 100,
+                "message": message or f"{current_item}/{total} 完了",
+                "updated_at": now,
+            },
+            detail={"timestamp": now, "message": message, "item": current_item},
+        )
+
+    def complete_task(self, task_id: str) -> bool:
+        """タスクを完了状態にする"""
+        now = datetime.now(UTC).isoformat()
+        return self.backend.update(
+            task_id,
+            {
+                "status": "completed",
+                "progress": 100,
+                "message": "タスクが完了しました",
+                "completed_at": now,
+                "updated_at": now,
+            },
+        )
+
+    def error_task(self, task_id: str, error_message: str) -> bool:
+        """タスクをエラー状態にする"""
+        return self.backend.update(
+            task_id,
+            {
+                "status": "error",
+                "message": "エラーが発生しました",
+                "error": error_message,
+                "updated_at": datetime.now(UTC).isoformat(),
+            },
+        )
 
-        # 詳細履歴を追加
-        task["details"].append(
+    def cancel_task(self, task_id: str) -> bool:
+        """タスクを取り消し状態にする（実行中の銘柄の取得後に停止する）"""
+        now = datetime.now(UTC).isoformat()
+        return self.backend.update(
+            task_id,
             {
-                "timestamp": datetime.now(UTC).isoformat(),
-                "message": message,
-                "item": current_item,
-            }
+                "status": "cancelled",
+                "message": "タスクが取り消されました",
+                "completed_at": now,
+                "updated_at": now,
+            },
         )
 
-        # 最新20件のみ保持
-        if len(task["details"]) > 20:
-            task["details"] = task["details"][-20:]
+    def claim_task(
+        self, task_id: str, task: Dict[str, Any], fields: Dict[str, Any]
+    ) -> bool:
+        """読み込んだ時点から更新されていない実行中タスクのみを更新して引き受ける
 
-        self._save_tasks()
-        return True
+        停止したタスクの再開を複数のプロセスが同時に試みても、状態・更新時刻・
+        生存時刻の比較付き更新に成功した1プロセスだけが引き受ける（``owner`` に記録）。
+        """
+        return self.backend.compare_and_update(
+            task_id,
+            {
+                "status": "running",
+                "updated_at": task.get("updated_at"),
+                "heartbeat_at": task.get("heartbeat_at"),
+            },
+            {
+                **fields,
+                "owner": process_owner(),
+                "heartbeat_at": datetime.now(UTC).isoformat(),
+            },
+        )
 
-    def complete_task(self, task_id: str) -> bool:
-        """タスクを完了状態にする"""
-        if task_id not in self.tasks:
-            return False
+    def heartbeat(self, task_ids: List[str]) -> int:
+        """このプロセスが引き受けているタスクの生存時刻を更新し、更新件数を返す
 
-        task = self.tasks[task_id]
-        task["status"] = "completed"
-        task["progress"] = 100
-        task["message"] = "タスクが完了しました"
-        task["completed_at"] = datetime.now(UTC).isoformat()
-        task["updated_at"] = datetime.now(UTC).isoformat()
+        ジョブが待ち行列で待っている間や、応答の遅い銘柄の取得中は進捗が更新されないため、
+        停止の判定には進捗ではなくこの生存時刻を使う。
+        """
+        now = datetime.now(UTC).isoformat()
+        owner = process_owner()
+        return sum(
+            self.backend.compare_and_update(
+                task_id, {"owner": owner}, {"heartbeat_at": now}
+            )
+            for task_id in task_ids
+        )
 
-        self._save_tasks()
-        return True
+    def interrupt_task(self, task_id: str, task: Dict[str, Any]) -> bool:
+        """再開できないタスクを中断状態にする（他のプロセスが引き受けていない場合のみ）"""
+        return self.claim_task(
+            task_id,
+            task,
+            {
+                "status": "interrupted",
+                "message": "プロセス停止により中断されました",
+                "updated_at": datetime.now(UTC).isoformat(),
+            },
+        )
 
-    def error_task(self, task_id: str, error_message: str) -> bool:
-        """タスクをエラー状態にする"""
-        if task_id not in self.tasks:
-            return False
+    def is_cancelled(self, task_id: str) -> bool:
+        task = self.backend.load(task_id)
+        return task is not None and task.get("status") == "cancelled"
 
-        task = self.tasks[task_id]
-        task["status"] = "error"
-        task["message"] = "エラーが発生しました"
-        task["error"] = error_message
-        task["updated_at"] = datetime.now(UTC).isoformat()
+    def find_duplicate(
+        self, fingerprint: str, idempotency_key: Optional[str] = None
+    ) -> Optional[str]:
+        """同じ冪等キーのタスク、または同じ内容で実行中のタスクのIDを返す
 
-        self._save_tasks()
-        return True
+        全タスクは読まず、冪等キー・フィンガープリントの索引から直接引く。
+        """
+        if idempotency_key:
+            task_id = self.backend.find_task_id("idempotency_key", idempotency_key)
+            if task_id is not None and self.backend.load(task_id) is not None:
+                return task_id
+
+        task_id = self.backend.find_task_id("fingerprint", fingerprint)
+        if task_id is not None:
+            task = self.backend.load(task_id)
+            if task is not None and task.get("status") == "running":
+                return task_id
+        return None
+
+    def find_stale_tasks(self, stale_seconds: int) -> Dict[str, Dict[str, Any]]:
+        """生存時刻が一定時間更新されていない実行中タスク（停止したプロセスのタスク）を取得"""
+        cutoff = datetime.now(UTC).timestamp() - stale_seconds
+        stale = {}
+        for task_id, task in self.backend.load_all().items():
+            if task.get("status") != "running":
+                continue
+            updated_at = datetime.fromisoformat(
+                (task.get("heartbeat_at") or task["updated_at"]).replace("Z", "+00:00")
+            )
+            if updated_at.tzinfo is None:
+                updated_at = updated_at.replace(tzinfo=UTC)
+            if updated_at.timestamp() <= cutoff:
+                stale[task_id] = task
+        return stale
 
     def get_status(self, task_id: str) -> Optional[Dict[Any, Any]]:
         """タスクの状態を取得"""
-        if task_id not in self.tasks:
-            return None
-
-        return dict(self.tasks[task_id].copy())
+        return self.backend.load(task_id)
 
     def get_all_tasks(self) -> Dict[Any, Any]:
         """全タスクの状態を取得"""
-        return dict(self.tasks.copy())
+        return self.backend.load_all()
 
     def cleanup_old_tasks(self, days: int = 7) -> int:
         """古いタスクデータをクリーンアップ"""
         try:
-            cutoff_date = datetime.utcnow().timestamp() - (days * 24 * 60 * 60)
+            cutoff_date = datetime.now(UTC).timestamp() - (days * 24 * 60 * 60)
 
             tasks_to_remove = []
-            for task_id, task in self.tasks.items():
+            for task_id, task in self.backend.load_all().items():
                 created_at = datetime.fromisoformat(
                     task["created_at"].replace("Z", "+00:00")
                 )
+                if created_at.tzinfo is None:
+                    created_at = created_at.replace(tzinfo=UTC)
                 if created_at.timestamp() < cutoff_date:
                     tasks_to_remove.append(task_id)
 
             for task_id in tasks_to_remove:
-                del self.tasks[task_id]
-
-            if tasks_to_remove:
-                self._save_tasks()
+                self.backend.delete(task_id)
 
             return len(tasks_to_remove)
 
@@ -0,0 +1,127 @@
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set
+
+QuoteFetcher = Callable[[str], Optional[Dict[str, Any]]]
+
+
+class QuoteSubscription:
+    """クライアント1件分の購読
+
+    未送信の更新は銘柄ごとに最新の1件だけを保持する。送信が追いつかない
+    クライアントには古い更新を捨てて最新値のみを届けるため、遅いクライアントが
+    いてもメモリ使用量は購読銘柄数で頭打ちになり、配信元を待たせることもない。
+    """
+
+    def __init__(self, symbols: List[str]) -> None:
+        self.symbols = symbols
+        self.dropped = 0
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._condition = threading.Condition()
+
+    def push(self, quote: Dict[str, Any]) -> None:
+        """更新を追加（未送信の同じ銘柄の更新は置き換える）"""
+        with self._condition:
+            if quote["symbol"] in self._pending:
+                self.dropped += 1
+            self._pending[quote["symbol"]] = quote
+            self._condition.notify()
+
+    def get(self, timeout: float) -> List[Dict[str, Any]]:
+        """未送信の更新をまとめて取り出す（timeout秒待っても更新がなければ空）"""
+        with self._condition:
+            if not self._pending:
+                self._condition.wait(timeout)
+            updates = list(self._pending.values())
+            self._pending.clear()
+            return updates
+
+
+class QuoteHub:
+    """株価の購読と配信
+
+    購読者のいる銘柄ごとに上流をポーリングするスレッドを1本だけ起動し、
+    取得した株価を全購読者へ配信する。購読者数に関わらず上流への要求は
+    銘柄あたり ``poll_interval`` 秒に1回で、価格・時刻が変わらない場合は配信しない。
+    最後の購読者が解除した銘柄のポーリングは停止する。
+    """
+
+    def __init__(self, fetcher: QuoteFetcher, poll_interval: float = 5.0) -> None:
+        self.fetcher = fetcher
+        self.poll_interval = poll_interval
+        self._subscribers: Dict[str, Set[QuoteSubscription]] = {}
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        self._stop_events: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, symbols: List[str]) -> QuoteSubscription:
+        """銘柄を購読（取得済みの最新値があれば直ちに配信）"""
+        subscription = QuoteSubscription(symbols)
+        with self._lock:
+            for symbol in symbols:
+                self._subscribers.setdefault(symbol, set()).add(subscription)
+                if symbol in self._latest:
+                    subscription.push(self._latest[symbol])
+                if symbol not in self._stop_events:
+                    self._start_poller(symbol)
+        return subscription
+
+    def unsubscribe(self, subscription: QuoteSubscription) -> None:
+        """購読を解除（購読者がいなくなった銘柄はポーリングを停止）"""
+        with self._lock:
+            for symbol in subscription.symbols:
+                subscribers = self._subscribers.get(symbol)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[symbol]
+                    self._latest.pop(symbol, None)
+                    self._stop_events.pop(symbol).set()
+
+    def _start_poller(self, symbol: str) -> None:
+        stop = threading.Event()
+        self._stop_events[symbol] = stop
+        threading.Thread(
+            target=self._poll,
+            args=(symbol, stop),
+            name=f"quote-poller-{symbol}",
+            daemon=True,
+        ).start()
+
+    def _poll(self, symbol: str, stop: threading.Event) -> None:
+        while not stop.is_set():
+            try:
+                quote = self.fetcher(symbol)
+            except Exception as e:
+                print(f"株価ポーリングエラー ({symbol}): {e}")
+                quote = None
+
+            if quote is not None and not stop.is_set():
+                self._publish(symbol, quote)
+            stop.wait(self.poll_interval)
+
+    def _publish(self, symbol: str, quote: Dict[str, Any]) -> None:
+        """変化があった場合のみ購読者へ配信"""
+        with self._lock:
+            latest = self._latest.get(symbol)
+            if latest is not None and (latest["price"], latest["market_time"]) == (
+                quote["price"],
+                quote["market_time"],
+            ):
+                return
+            self._latest[symbol] = quote
+            subscribers = list(self._subscribers.get(symbol, ()))
+
+        for subscription in subscribers:
+            subscription.push(quote)
+
+    def stats(self) -> Dict[str, Any]:
+        """ポーリング中の銘柄と購読者数"""
+        with self._lock:
+            return {
+                "symbols": {
+                    symbol: len(subscribers)
+                    for symbol, subscribers in self._subscribers.items()
+                },
+                "pollers": len(self._stop_events),
+            }
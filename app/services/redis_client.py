@@ -0,0 +1,8 @@
+from typing import Any
+
+
+def create_redis_client(url: str) -> Any:
+    """Redisクライアントを生成（redisパッケージは利用時のみ読み込む）"""
+    import redis
+
+    return redis.Redis.from_url(url, decode_responses=True)
@@ -0,0 +1,299 @@
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from flask import current_app
+
+from app.services.database import DatabaseService
+
+# 日足行列の系列（bars[:, 系列, 日]）
+CLOSE, HIGH, LOW, VOLUME = range(4)
+
+# 出来高比率の基準とする平均日数
+VOLUME_AVERAGE_DAYS = 20
+# 52週高値・安値の算出に使う本数
+YEAR_BARS = 252
+
+# 数値フィールドの比較演算子
+COMPARISON_OPS: Dict[str, Callable[[Any, Any], Any]] = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+CATEGORY_FIELDS = ("exchange", "currency")
+# N日リターン（例: return_20d）
+RETURN_FIELD = re.compile(r"^return_(\d+)d$")
+
+
+def _to_json_value(value: Any) -> Any:
+    if isinstance(value, np.floating):
+        return None if np.isnan(value) else float(value)
+    return value
+
+
+class ScreenerService:
+    """全銘柄の日足を保持するメモリ上の行列に対して条件絞り込みを行うサービス
+
+    銘柄×系列（終値・高値・安値・出来高）×日の3次元配列を右詰めで保持し、
+    派生指標（騰落率・N日リターン・出来高比率・52週高値/安値からの乖離）を
+    NumPyで全銘柄まとめて計算する。株価データの保存時に通知を受けて
+    該当銘柄の行だけを差し替えるため、検索のたびにDBを読む必要はない。
+    """
+
+    def __init__(self, window: Optional[int] = None) -> None:
+        self._window = window
+        self.symbols: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._meta: Dict[str, np.ndarray] = {}
+        self._prices = np.empty(0)
+        self._bars = np.empty((0, 4, 0))
+        self._fields: Dict[str, np.ndarray] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def window(self) -> int:
+        if self._window is None:
+            self._window = int(current_app.config.get("SCREENER_WINDOW", 260))
+        return self._window
+
+    def _series(self, historical_data: Optional[Dict]) -> np.ndarray:
+        """履歴データを欠損を除いて右詰めした (系列, 日) の配列に変換"""
+        history = historical_data or {}
+        closes = np.array(history.get("close") or [], dtype=float)
+
+        columns = [closes]
+        for name in ("high", "low", "volume"):
+            values = np.full(len(closes), np.nan)
+            raw = (history.get(name) or [])[: len(closes)]
+            values[: len(raw)] = np.array(raw, dtype=float)
+            columns.append(values)
+
+        data = np.vstack(columns)[:, ~np.isnan(closes)][:, -self.window :]
+        block = np.full((4, self.window), np.nan)
+        block[:, self.window - data.shape[1] :] = data
+        return block
+
+    def _row_meta(self, stock: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "company_name": stock.get("company_name"),
+            "exchange": stock.get("exchange"),
+            "currency": stock.get("currency"),
+        }
+
+    def load(self) -> int:
+        """保存済みの全銘柄から行列を再構築し、銘柄数を返す"""
+        symbols: List[str] = []
+        meta: List[Dict[str, Any]] = []
+        prices: List[Optional[float]] = []
+        bars: List[np.ndarray] = []
+
+        for stock in DatabaseService().iter_stocks():
+            symbols.append(stock["symbol"])
+            meta.append(self._row_meta(stock))
+            prices.append(stock.get("current_price"))
+            bars.append(self._series(stock.get("historical_data")))
+
+        with self._lock:
+            self._replace(symbols, meta, prices, bars)
+            self._loaded_at = time.monotonic()
+
+        return len(symbols)
+
+    def _replace(
+        self,
+        symbols: List[str],
+        meta: List[Dict[str, Any]],
+        prices: List[Optional[float]],
+        bars: List[np.ndarray],
+    ) -> None:
+        self.symbols = symbols
+        self._rows = {symbol: i for i, symbol in enumerate(symbols)}
+        self._meta = {
+            name: np.array([row[name] for row in meta], dtype=object)
+            for name in ("company_name", *CATEGORY_FIELDS)
+        }
+        self._prices = np.array(prices, dtype=float)
+        self._bars = np.stack(bars) if bars else np.empty((0, 4, self.window))
+        self._fields = {}
+
+    def refresh_if_stale(self) -> None:
+        """再構築間隔を過ぎていれば行列を再構築（他プロセスでの保存を取り込む）"""
+        interval = float(current_app.config.get("SCREENER_REFRESH_SECONDS", 300))
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= interval:
+            self.load()
+
+    def on_stock_saved(self, stock_data: Dict[str, Any]) -> None:
+        """株価データ保存の通知を受け取る（反映は次の検索時にまとめて行う）"""
+        if self._loaded_at is None:
+            # 未構築の場合は初回の再構築でDBから読み込まれる
+            return
+        with self._lock:
+            previous = self._pending.get(stock_data["symbol"], {})
+            self._pending[stock_data["symbol"]] = {**previous, **stock_data}
+
+    def _apply_pending(self) -> None:
+        """保存通知を行列に反映（既存銘柄は行を差し替え、新規銘柄はまとめて追加）"""
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        new_symbols = [symbol for symbol in pending if symbol not in self._rows]
+        if new_symbols:
+            count = len(new_symbols)
+            self.symbols = self.symbols + new_symbols
+            self._rows.update(
+                {symbol: len(self._rows) + i for i, symbol in enumerate(new_symbols)}
+            )
+            self._meta = {
+                name: np.concatenate([values, np.full(count, None, dtype=object)])
+                for name, values in self._meta.items()
+            }
+            self._prices = np.concatenate([self._prices, np.full(count, np.nan)])
+            self._bars = np.concatenate(
+                [self._bars, np.full((count, 4, self.window), np.nan)]
+            )
+
+        for symbol, stock in pending.items():
+            row = self._rows[symbol]
+            for name, value in self._row_meta(stock).items():
+                self._meta[name][row] = value
+            price = stock.get("current_price")
+            self._prices[row] = np.nan if price is None else price
+            if "historical_data" in stock:
+                self._bars[row] = self._series(stock["historical_data"])
+
+        self._fields = {}
+
+    def _compute_field(self, name: str) -> np.ndarray:
+        """派生指標を全銘柄分まとめて計算（計算できない銘柄はNaN）"""
+        closes = self._bars[:, CLOSE]
+        prices = np.where(np.isnan(self._prices), closes[:, -1], self._prices)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if name == "price":
+                return prices
+            if name == "change_pct":
+                return np.asarray((prices / closes[:, -2] - 1) * 100)
+            if name == "volume_ratio":
+                recent = self._bars[:, VOLUME, -VOLUME_AVERAGE_DAYS - 1 : -1]
+                counts = np.count_nonzero(~np.isnan(recent), axis=1)
+                average = np.nansum(recent, axis=1) / counts
+                return np.asarray(self._bars[:, VOLUME, -1] / average)
+            if name == "high_52w_pct":
+                high = np.fmax.reduce(self._bars[:, HIGH, -YEAR_BARS:], axis=1)
+                return np.asarray((prices / high - 1) * 100)
+            if name == "low_52w_pct":
+                low = np.fmin.reduce(self._bars[:, LOW, -YEAR_BARS:], axis=1)
+                return np.asarray((prices / low - 1) * 100)
+
+            match = RETURN_FIELD.match(name)
+            if match:
+                days = int(match.group(1))
+                if not 0 < days < self.window:
+                    raise ValueError(f"{name}の日数は1〜{self.window - 1}の範囲です")
+                return np.asarray((prices / closes[:, -1 - days] - 1) * 100)
+
+        raise ValueError(f"未対応のフィールドです: {name}")
+
+    def _field(self, name: str) -> np.ndarray:
+        if name in CATEGORY_FIELDS:
+            return self._meta[name]
+        if name not in self._fields:
+            self._fields[name] = self._compute_field(name)
+        return self._fields[name]
+
+    def _category_mask(
+        self, name: str, values: np.ndarray, op: Any, value: Any
+    ) -> np.ndarray:
+        """取引所・通貨の一致条件を評価"""
+        if op == "==":
+            return np.asarray(values == value)
+        if op == "!=":
+            return np.asarray(values != value)
+        raise ValueError(f"{name}に使用できる演算子は==/!=/inです")
+
+    def _filter_mask(self, condition: Dict[str, Any]) -> np.ndarray:
+        """1つの条件式を評価し、該当する銘柄の真偽配列を返す"""
+        name = condition.get("field")
+        op = condition.get("op")
+        value = condition.get("value")
+        if not isinstance(name, str):
+            raise ValueError("fieldが指定されていません")
+
+        values = self._field(name)
+        if op == "in":
+            if not isinstance(value, list):
+                raise ValueError("inの値は配列で指定してください")
+            return np.isin(values, value)
+        if name in CATEGORY_FIELDS:
+            return self._category_mask(name, values, op, value)
+
+        if op == "between":
+            if not isinstance(value, list) or len(value) != 2:
+                raise ValueError("betweenの値は[下限, 上限]で指定してください")
+            low, high = (float(v) for v in value)
+            return np.asarray((values >= low) & (values <= high))
+        if op not in COMPARISON_OPS:
+            raise ValueError(f"未対応の演算子です: {op}")
+        if not isinstance(value, (int, float)):
+            raise ValueError(f"{name}の値は数値で指定してください")
+        return np.asarray(COMPARISON_OPS[op](values, value))
+
+    def screen(
+        self,
+        filters: List[Dict[str, Any]],
+        sort: Optional[str] = None,
+        order: str = "desc",
+        limit: int = 50,
+    ) -> Dict[str, Any]:
+        """条件に一致する銘柄を指定フィールドの順に返す"""
+        started = time.perf_counter()
+
+        with self._lock:
+            self._apply_pending()
+
+            mask = np.ones(len(self.symbols), dtype=bool)
+            for condition in filters:
+                mask &= self._filter_mask(condition)
+            matched = np.flatnonzero(mask)
+
+            if sort:
+                if sort in CATEGORY_FIELDS:
+                    raise ValueError("sortには数値フィールドを指定してください")
+                keys = self._field(sort)[matched]
+                # NaNは昇順・降順とも末尾に並べる
+                order_keys = keys if order == "asc" else -keys
+                matched = matched[np.argsort(order_keys, kind="stable")]
+
+            names = ["price"] + [
+                name
+                for name in dict.fromkeys(
+                    [condition["field"] for condition in filters] + [sort or "price"]
+                )
+                if name not in CATEGORY_FIELDS and name != "price"
+            ]
+            results = [
+                {
+                    "symbol": self.symbols[row],
+                    "company_name": self._meta["company_name"][row],
+                    "exchange": self._meta["exchange"][row],
+                    "currency": self._meta["currency"][row],
+                    **{name: _to_json_value(self._field(name)[row]) for name in names},
+                }
+                for row in matched[:limit]
+            ]
+            total = len(self.symbols)
+
+        return {
+            "total": total,
+            "count": int(len(matched)),
+            "results": results,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
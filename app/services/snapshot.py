@@ -0,0 +1,193 @@
+import json
+import os
+import shutil
+from datetime import UTC, datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from app import db
+from app.models.stock_data import PriceBar
+from app.services.price_bars import INTERVAL_SECONDS
+from app.services.snapshot_reader import (
+    LATEST_FILE,
+    MANIFEST_FILE,
+    pa,
+    pq,
+    require_pyarrow,
+    snapshot_schema,
+)
+
+SNAPSHOT_FORMATS = ("arrow", "parquet")
+PARTITION_CHOICES = ("symbol", "month")
+# 1ファイルあたりの最大行数（超えた分は次のファイルに分割）
+ROWS_PER_FILE = 1_000_000
+# 一度に取得する行数
+FETCH_BATCH_SIZE = 10_000
+
+COLUMNS = ("symbol", "bar_time", "open", "high", "low", "close", "volume")
+
+
+def _partition_key(partition_by: str, row: Any) -> str:
+    if partition_by == "month":
+        return f"month={row.bar_time:%Y-%m}"
+    return f"symbol={row.symbol}"
+
+
+class SnapshotWriter:
+    """価格バーをパーティション分割した列指向ファイルに書き出す
+
+    スナップショットは ``<root>/<snapshot_id>/interval=<足>/<パーティション>/part-N``
+    に一時ディレクトリ経由で書き込み、完了後に名前を変更して ``LATEST`` を
+    差し替える。書き込み途中のスナップショットが読まれることはない。
+    """
+
+    def __init__(
+        self,
+        root: str,
+        file_format: str = "arrow",
+        partition_by: str = "symbol",
+    ) -> None:
+        require_pyarrow()
+        if file_format not in SNAPSHOT_FORMATS:
+            raise ValueError(f"未対応の形式です: {file_format}")
+        if partition_by not in PARTITION_CHOICES:
+            raise ValueError(f"未対応のパーティション単位です: {partition_by}")
+
+        self.root = root
+        self.file_format = file_format
+        self.partition_by = partition_by
+        self.schema = snapshot_schema()
+
+    def _iter_rows(self, interval: str) -> Iterator[Any]:
+        """パーティション単位に連続するよう並べて価格バーを取得"""
+        order = (
+            (PriceBar.bar_time, PriceBar.symbol)
+            if self.partition_by == "month"
+            else (PriceBar.symbol, PriceBar.bar_time)
+        )
+        query = (
+            select(*[getattr(PriceBar, name) for name in COLUMNS])
+            .where(PriceBar.interval == interval)
+            .order_by(*order)
+            .execution_options(yield_per=FETCH_BATCH_SIZE)
+        )
+        yield from db.session.execute(query)
+
+    def _write_file(self, path: str, rows: List[Any]) -> None:
+        columns = list(zip(*rows))
+        table = pa.Table.from_arrays(
+            [
+                pa.array(values, type=field.type)
+                for values, field in zip(columns, self.schema)
+            ],
+            schema=self.schema,
+        )
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.file_format == "parquet":
+            pq.write_table(table, path)
+        else:
+            # 非圧縮のArrow IPCはメモリマップでそのまま参照できる
+            with pa.OSFile(path, "wb") as sink:
+                with pa.ipc.new_file(sink, self.schema) as writer:
+                    writer.write_table(table)
+
+    def _write_interval(
+        self, work_dir: str, interval: str
+    ) -> Tuple[int, Dict[str, List[str]]]:
+        """足の種類ごとにパーティションへ書き出し、行数とファイル一覧を返す"""
+        extension = "parquet" if self.file_format == "parquet" else "arrow"
+        partitions: Dict[str, List[str]] = {}
+        total = 0
+        buffer: List[Any] = []
+        current: Optional[str] = None
+
+        def flush() -> None:
+            if not buffer or current is None:
+                return
+            files = partitions.setdefault(current, [])
+            relative = os.path.join(
+                f"interval={interval}", current, f"part-{len(files)}.{extension}"
+            )
+            self._write_file(os.path.join(work_dir, relative), buffer)
+            files.append(relative)
+            buffer.clear()
+
+        for row in self._iter_rows(interval):
+            key = _partition_key(self.partition_by, row)
+            if key != current or len(buffer) >= ROWS_PER_FILE:
+                flush()
+                current = key
+            buffer.append(
+                (
+                    row.symbol,
+                    row.bar_time.replace(tzinfo=UTC),
+                    row.open,
+                    row.high,
+                    row.low,
+                    row.close,
+                    row.volume,
+                )
+            )
+            total += 1
+        flush()
+
+        return total, partitions
+
+    def write(
+        self, intervals: Optional[List[str]] = None, keep: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """スナップショットを作成してマニフェストを返す"""
+        intervals = intervals or list(INTERVAL_SECONDS)
+        created_at = datetime.now(UTC)
+        snapshot_id = created_at.strftime("%Y%m%dT%H%M%S%fZ")
+        work_dir = os.path.join(self.root, f".tmp-{snapshot_id}")
+        shutil.rmtree(work_dir, ignore_errors=True)
+        os.makedirs(work_dir)
+
+        try:
+            manifest: Dict[str, Any] = {
+                "snapshot_id": snapshot_id,
+                "created_at": created_at.isoformat(),
+                "format": self.file_format,
+                "partition_by": self.partition_by,
+                "schema": [(field.name, str(field.type)) for field in self.schema],
+                "intervals": {},
+            }
+            for interval in intervals:
+                rows, partitions = self._write_interval(work_dir, interval)
+                manifest["intervals"][interval] = {
+                    "rows": rows,
+                    "partitions": partitions,
+                }
+
+            with open(
+                os.path.join(work_dir, MANIFEST_FILE), "w", encoding="utf-8"
+            ) as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+            os.replace(work_dir, os.path.join(self.root, snapshot_id))
+        except Exception:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+
+        latest_tmp = os.path.join(self.root, f"{LATEST_FILE}.tmp")
+        with open(latest_tmp, "w", encoding="utf-8") as f:
+            f.write(snapshot_id)
+        os.replace(latest_tmp, os.path.join(self.root, LATEST_FILE))
+
+        if keep:
+            self.prune(keep)
+        return manifest
+
+    def prune(self, keep: int) -> List[str]:
+        """新しい順に ``keep`` 件を残して古いスナップショットを削除"""
+        snapshots = sorted(
+            name
+            for name in os.listdir(self.root)
+            if os.path.isfile(os.path.join(self.root, name, MANIFEST_FILE))
+        )
+        removed = snapshots[:-keep] if keep > 0 else []
+        for name in removed:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+        return removed
@@ -0,0 +1,117 @@
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow未インストール環境ではスナップショット機能は無効
+    pa = None
+    pq = None
+
+# 最新スナップショットを指すポインタファイル名
+LATEST_FILE = "LATEST"
+MANIFEST_FILE = "manifest.json"
+
+
+def snapshot_schema() -> Any:
+    """スナップショットのスキーマ（bar_timeはUTCの秒精度）"""
+    return pa.schema(
+        [
+            ("symbol", pa.string()),
+            ("bar_time", pa.timestamp("s", tz="UTC")),
+            ("open", pa.float64()),
+            ("high", pa.float64()),
+            ("low", pa.float64()),
+            ("close", pa.float64()),
+            ("volume", pa.int64()),
+        ]
+    )
+
+
+def require_pyarrow() -> None:
+    """pyarrowが利用できない場合はエラーにする"""
+    if pa is None:
+        raise RuntimeError("スナップショット機能にはpyarrowが必要です（pip install pyarrow）")
+
+
+class SnapshotReader:
+    """価格バーのスナップショット（Arrow IPC / Parquet）の読み込み
+
+    Flaskアプリやデータベースに依存せず、分析ジョブから直接利用できる。
+    Arrow IPC形式はファイルをメモリマップし、コピーせずにArrowテーブルとして参照する。
+    NumPy配列への変換も欠損のない数値列であればコピーは発生しない。
+
+        reader = SnapshotReader("data/snapshots")
+        arrays = reader.to_numpy("1d", partitions=["symbol=7203.T"])
+    """
+
+    def __init__(self, root: str, snapshot_id: Optional[str] = None) -> None:
+        require_pyarrow()
+        if snapshot_id is None:
+            with open(os.path.join(root, LATEST_FILE), "r", encoding="utf-8") as f:
+                snapshot_id = f.read().strip()
+
+        self.path = os.path.join(root, snapshot_id)
+        with open(os.path.join(self.path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            self.manifest: Dict[str, Any] = json.load(f)
+
+    @property
+    def snapshot_id(self) -> str:
+        return str(self.manifest["snapshot_id"])
+
+    def intervals(self) -> List[str]:
+        """スナップショットに含まれる足の種類"""
+        return list(self.manifest["intervals"])
+
+    def partitions(self, interval: str) -> List[str]:
+        """パーティション名（例: symbol=7203.T, month=2026-10）の一覧"""
+        return list(self.manifest["intervals"].get(interval, {}).get("partitions", {}))
+
+    def _read_file(self, path: str, columns: Optional[List[str]]) -> Any:
+        if self.manifest["format"] == "parquet":
+            return pq.read_table(path, columns=columns, memory_map=True)
+
+        # Arrow IPCはメモリマップしたバッファをそのまま参照する（ゼロコピー）
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        return table.select(columns) if columns else table
+
+    def read_table(
+        self,
+        interval: str,
+        partitions: Optional[List[str]] = None,
+        columns: Optional[List[str]] = None,
+    ) -> Any:
+        """指定パーティションを1つのArrowテーブルとして読み込み（チャンクは連結しない）"""
+        entries = self.manifest["intervals"].get(interval, {}).get("partitions", {})
+        names = partitions if partitions is not None else list(entries)
+
+        tables = [
+            self._read_file(os.path.join(self.path, file_name), columns)
+            for name in names
+            for file_name in entries.get(name, [])
+        ]
+        if not tables:
+            empty = snapshot_schema().empty_table()
+            return empty.select(columns) if columns else empty
+        return pa.concat_tables(tables)
+
+    def to_numpy(
+        self,
+        interval: str,
+        partitions: Optional[List[str]] = None,
+        columns: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """列ごとのNumPy配列として読み込み"""
+        table = self.read_table(interval, partitions, columns)
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+
+    def to_pandas(
+        self,
+        interval: str,
+        partitions: Optional[List[str]] = None,
+        columns: Optional[List[str]] = None,
+    ) -> Any:
+        """pandasのDataFrameとして読み込み"""
+        return self.read_table(interval, partitions, columns).to_pandas()
@@ -0,0 +1,319 @@
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson未インストール環境では標準jsonを使用
+    orjson = None
+
+
+def _dumps(value: Any) -> bytes:
+    if orjson is None:
+        return json.dumps(value, separators=(",", ":")).encode("utf-8")
+    data: bytes = orjson.dumps(value)
+    return data
+
+
+def _loads(data: Any) -> Any:
+    if orjson is None:
+        return json.loads(data)
+    return orjson.loads(data)
+
+
+class LocalCache:
+    """プロセス内のLRU+TTLキャッシュ
+
+    値はシリアライズしたbytesで保持し、件数（``max_entries``）と合計サイズ
+    （``max_bytes``）の両方の上限を超えた分を古い順に追い出す。
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.size = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, data)
+            self.size += len(data)
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+
+class StockCache:
+    """銘柄データの読み取りキャッシュ（プロセス内 + Redis共有の2階層）
+
+    読み取りはプロセス内 → Redis → 読み込み関数の順に参照し、見つかった値を
+    上位の階層にも保存する。更新・削除時は両階層から削除した上で無効化メッセージを
+    publishし、他のワーカーも購読スレッドでプロセス内のエントリを破棄する。
+    無効化のたびに銘柄ごとのバージョンを進め、読み込み中に無効化された値は
+    共有階層に書き戻さない。
+    Redisを使わない場合はプロセス内のみで、他ワーカーの更新はTTLで反映される。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: float = 60.0,
+        redis_client: Optional[Any] = None,
+        key_prefix: str = "stock-cache",
+        background_listener: bool = True,
+    ) -> None:
+        self.local = LocalCache(max_entries, max_bytes, ttl_seconds)
+        self.redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+        self.channel = f"{key_prefix}:invalidate"
+        self.metrics: Dict[str, int] = {
+            "local_hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+            "remote_invalidations": 0,
+            "errors": 0,
+        }
+        # 読み込み中に無効化された値を書き戻さないための世代番号
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._origin = uuid.uuid4().hex
+        self._pubsub: Optional[Any] = None
+        self._listener_started = False
+        # Falseの場合は購読のみ行い、process_invalidations()の呼び出しで処理する
+        self.background_listener = background_listener
+        self._listener_lock = threading.Lock()
+
+    def _key(self, symbol: str) -> str:
+        return f"{self.key_prefix}:{symbol}"
+
+    def _version_key(self, symbol: str) -> str:
+        return f"{self.key_prefix}:version:{symbol}"
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.metrics[name] += 1
+
+    def get_or_load(
+        self, symbol: str, loader: Callable[[], Optional[Dict]]
+    ) -> Optional[Dict]:
+        """キャッシュから取得し、なければ読み込み関数の結果を保存して返す
+
+        返す値は毎回デシリアライズした新しい辞書のため、呼び出し側で変更してよい。
+        """
+        self._start_listener()
+        key = self._key(symbol)
+
+        data = self.local.get(key)
+        if data is not None:
+            self._count("local_hits")
+            return dict(_loads(data))
+
+        with self._lock:
+            generation = self._generations.get(symbol, 0)
+
+        data, version = self._shared_get(symbol, key)
+        if data is not None:
+            self._count("shared_hits")
+            self._store_local(symbol, key, data, generation)
+            return dict(_loads(data))
+
+        self._count("misses")
+        value = loader()
+        if value is None:
+            return None
+
+        data = _dumps(value)
+        if self._store_local(symbol, key, data, generation):
+            self._shared_set(symbol, key, data, version)
+        return dict(_loads(data))
+
+    def _store_local(self, symbol: str, key: str, data: bytes, generation: int) -> bool:
+        with self._lock:
+            if self._generations.get(symbol, 0) != generation:
+                return False
+            self.local.set(key, data)
+            return True
+
+    def _shared_get(
+        self, symbol: str, key: str
+    ) -> Tuple[Optional[bytes], Optional[str]]:
+        """共有階層の値と、その時点の銘柄のバージョンを返す"""
+        if self.redis is None:
+            return None, None
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.get(self._version_key(symbol))
+            value, version = pipe.execute()
+        except Exception as e:
+            self._count("errors")
+            print(f"共有キャッシュ読み取りエラー: {e}")
+            return None, None
+        if value is None:
+            return None, version
+        data = value.encode("utf-8") if isinstance(value, str) else bytes(value)
+        return data, version
+
+    def _shared_set(
+        self, symbol: str, key: str, data: bytes, version: Optional[str]
+    ) -> None:
+        """読み込み前から銘柄のバージョンが変わっていない場合のみ共有階層に保存
+
+        読み込み中に他のワーカーが無効化した古い値を書き戻さないよう、
+        バージョンキーをWATCHして比較とSETを1つのトランザクションで行う。
+        """
+        if self.redis is None:
+            return
+        version_key = self._version_key(symbol)
+
+        def store(pipe: Any) -> None:
+            if pipe.get(version_key) != version:
+                return
+            pipe.multi()
+            pipe.set(key, data.decode("utf-8"), ex=max(1, int(self.ttl_seconds)))
+
+        try:
+            self.redis.transaction(store, version_key)
+        except Exception as e:
+            self._count("errors")
+            print(f"共有キャッシュ書き込みエラー: {e}")
+
+    def _drop_local(self, symbol: str) -> None:
+        with self._lock:
+            self._generations[symbol] = self._generations.get(symbol, 0) + 1
+            self.local.delete(self._key(symbol))
+
+    def invalidate(self, symbol: str) -> None:
+        """銘柄のキャッシュを全階層・全ワーカーで無効化"""
+        self._drop_local(symbol)
+        self._count("invalidations")
+        if self.redis is None:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.incr(self._version_key(symbol))
+            pipe.delete(self._key(symbol))
+            pipe.publish(
+                self.channel,
+                json.dumps({"symbol": symbol, "origin": self._origin}),
+            )
+            pipe.execute()
+        except Exception as e:
+            self._count("errors")
+            print(f"キャッシュ無効化エラー: {e}")
+
+    def _start_listener(self) -> None:
+        """無効化メッセージの購読スレッドを起動（Redis使用時のみ、初回のみ）"""
+        if self.redis is None:
+            return
+        with self._listener_lock:
+            if self._listener_started:
+                return
+            self._listener_started = True
+            try:
+                self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                self._pubsub.subscribe(self.channel)
+            except Exception as e:
+                self._count("errors")
+                print(f"キャッシュ無効化の購読エラー: {e}")
+                return
+            if not self.background_listener:
+                return
+            threading.Thread(
+                target=self._listen, name="stock-cache-invalidation", daemon=True
+            ).start()
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                self.process_invalidations(timeout=1.0)
+            except Exception as e:
+                print(f"キャッシュ無効化の受信エラー: {e}")
+                time.sleep(1.0)
+
+    def process_invalidations(self, timeout: float = 0.0) -> int:
+        """受信済みの無効化メッセージを処理し、処理した件数を返す"""
+        if self._pubsub is None:
+            return 0
+        processed = 0
+        message = self._pubsub.get_message(timeout=timeout)
+        while message is not None:
+            if message.get("type") == "message":
+                payload = json.loads(message["data"])
+                if payload.get("origin") != self._origin:
+                    self._drop_local(payload["symbol"])
+                    self._count("remote_invalidations")
+                processed += 1
+            message = self._pubsub.get_message(timeout=0.0)
+        return processed
+
+    def stats(self) -> Dict[str, Any]:
+        """ヒット率・エントリ数・使用メモリ"""
+        with self._lock:
+            metrics = dict(self.metrics)
+        lookups = metrics["local_hits"] + metrics["shared_hits"] + metrics["misses"]
+        hits = metrics["local_hits"] + metrics["shared_hits"]
+        return {
+            **metrics,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+            "entries": len(self.local),
+            "bytes": self.local.size,
+            "max_entries": self.local.max_entries,
+            "max_bytes": self.local.max_bytes,
+            "evictions": self.local.evictions,
+            "shared": self.redis is not None,
+        }
+
+
+def create_stock_cache(config: Dict[str, Any]) -> Optional[StockCache]:
+    """設定に応じた銘柄データキャッシュを生成（無効時はNone）"""
+    if not config.get("STOCK_CACHE_ENABLED", False):
+        return None
+
+    redis_client = None
+    if config.get("STOCK_CACHE_BACKEND") == "redis":
+        from app.services.redis_client import create_redis_client
+
+        redis_client = create_redis_client(config["REDIS_URL"])
+
+    return StockCache(
+        max_entries=config["STOCK_CACHE_MAX_ENTRIES"],
+        max_bytes=config["STOCK_CACHE_MAX_BYTES"],
+        ttl_seconds=config["STOCK_CACHE_TTL_SECONDS"],
+        redis_client=redis_client,
+    )
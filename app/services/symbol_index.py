@@ -0,0 +1,203 @@
+import csv
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from flask import Flask, current_app
+
+from app.services.database import DatabaseService
+
+
+class SymbolIndexService:
+    """ローカルのシンボルマスタによる検証・補完サービス
+
+    マスタはCSVファイル（symbol,name,exchange）と保存済みの株価データから読み込み、
+    検証用のハッシュ（O(1)）と前方一致検索用のソート済みキー（二分探索）を
+    メモリ上に保持する。初回は同期的に読み込み、以後は一定間隔でバックグラウンドの
+    スレッドが再読み込みする。未知のシンボルは件数上限付きの否定キャッシュに記録して
+    同じ問い合わせを繰り返さない（上流の障害で確認できなかった場合は記録しない）。
+    """
+
+    def __init__(self, master_path: Optional[str] = None) -> None:
+        self.master_path = master_path
+        self.entries: Dict[str, Dict[str, Optional[str]]] = {}
+        self.master_loaded = False
+        self._symbol_keys: List[Tuple[str, str]] = []
+        self._name_keys: List[Tuple[str, str]] = []
+        self._negative: "OrderedDict[str, float]" = OrderedDict()
+        self._loaded_at: Optional[float] = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._initial_load_lock = threading.Lock()
+
+    def _config(self, name: str, default: Any) -> Any:
+        return current_app.config.get(name, default)
+
+    def _read_master_file(self, path: str) -> List[Dict[str, Optional[str]]]:
+        """マスタCSVを読み込み"""
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            return [
+                {
+                    "symbol": row["symbol"].strip(),
+                    "name": (row.get("name") or "").strip() or None,
+                    "exchange": (row.get("exchange") or "").strip() or None,
+                }
+                for row in csv.DictReader(f)
+                if (row.get("symbol") or "").strip()
+            ]
+
+    def load(self) -> int:
+        """マスタを再構築し、登録件数を返す"""
+        path = self.master_path or self._config("SYMBOL_MASTER_PATH", "")
+        rows: List[Dict[str, Optional[str]]] = []
+        master_loaded = False
+
+        try:
+            if path and os.path.exists(path):
+                rows = self._read_master_file(path)
+                master_loaded = True
+        except Exception as e:
+            print(f"シンボルマスタ読み込みエラー: {e}")
+
+        # 取得実績のあるシンボルも有効として扱う
+        rows.extend(DatabaseService().get_symbol_list())
+
+        entries: Dict[str, Dict[str, Optional[str]]] = {}
+        for row in rows:
+            entries.setdefault(str(row["symbol"]).upper(), row)
+
+        symbol_keys = sorted((key, key) for key in entries)
+        name_keys = sorted(
+            {
+                (word, key)
+                for key, entry in entries.items()
+                for word in (entry["name"] or "").upper().split()
+            }
+        )
+
+        # 構築済みの構造を一括で差し替える（検索中のリクエストに影響しない）
+        with self._lock:
+            self.entries = entries
+            self._symbol_keys = symbol_keys
+            self._name_keys = name_keys
+            self.master_loaded = master_loaded
+            self._negative = OrderedDict()
+            self._loaded_at = time.monotonic()
+
+        return len(entries)
+
+    def refresh_if_stale(self) -> None:
+        """未読み込みなら同期的に読み込み、再読み込み間隔を過ぎていればバックグラウンドで再構築
+
+        空のマスタで検証しないよう初回は読み込みを待ち、以後はリクエストを待たせないよう
+        再構築が終わるまでは構築済みの内容で応答する。
+        """
+        if self._loaded_at is None:
+            with self._initial_load_lock:
+                if self._loaded_at is None:
+                    self.load()
+            return
+
+        interval = float(self._config("SYMBOL_MASTER_REFRESH_SECONDS", 3600))
+        if (
+            self._loaded_at is not None
+            and time.monotonic() - self._loaded_at < interval
+        ):
+            return
+
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        app = current_app._get_current_object()  # type: ignore[attr-defined]
+        threading.Thread(
+            target=self._refresh, args=(app,), name="symbol-index-refresh", daemon=True
+        ).start()
+
+    def _refresh(self, app: Flask) -> None:
+        try:
+            with app.app_context():
+                self.load()
+        except Exception as e:
+            print(f"シンボルマスタ再構築エラー: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def contains(self, symbol: str) -> bool:
+        """マスタに登録済みかどうか"""
+        return symbol.upper() in self.entries
+
+    def validate(
+        self,
+        symbol: str,
+        remote_validator: Optional[Callable[[str], Optional[bool]]] = None,
+    ) -> bool:
+        """シンボルの有効性をチェック（未知のシンボルは否定キャッシュに記録）
+
+        ``remote_validator`` は見つからなければFalse、確認できなければNoneを返す。
+        確認できなかったシンボルは拒否せず、否定キャッシュにも記録しない。
+        """
+        key = symbol.upper()
+        if key in self.entries:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._negative.get(key)
+        if expires_at is not None and expires_at > now:
+            return False
+
+        found = remote_validator(symbol) if remote_validator is not None else False
+        if found is None:
+            return True
+        if found:
+            with self._lock:
+                self.entries[key] = {"symbol": symbol, "name": None, "exchange": None}
+            return True
+
+        ttl = float(self._config("SYMBOL_NEGATIVE_CACHE_SECONDS", 3600))
+        max_entries = int(self._config("SYMBOL_NEGATIVE_CACHE_MAX_ENTRIES", 10000))
+        with self._lock:
+            self._negative.pop(key, None)
+            self._negative[key] = now + ttl
+            # 期限切れと上限超過分を古い順に削除
+            while self._negative and (
+                len(self._negative) > max_entries
+                or next(iter(self._negative.values())) <= now
+            ):
+                self._negative.popitem(last=False)
+        return False
+
+    def _prefix_matches(
+        self, keys: List[Tuple[str, str]], prefix: str, limit: int
+    ) -> List[str]:
+        """ソート済みキーから前方一致するシンボルを取得"""
+        matches: List[str] = []
+        position = bisect_left(keys, (prefix, ""))
+        while position < len(keys) and len(matches) < limit:
+            key, symbol = keys[position]
+            if not key.startswith(prefix):
+                break
+            matches.append(symbol)
+            position += 1
+        return matches
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Optional[str]]]:
+        """シンボルまたは会社名の前方一致で候補を検索"""
+        prefix = query.strip().upper()
+        if not prefix:
+            return []
+
+        # シンボル一致を優先し、残りを会社名の単語一致で埋める
+        results: List[str] = self._prefix_matches(self._symbol_keys, prefix, limit)
+        for key in self._prefix_matches(self._name_keys, prefix, limit * 2):
+            if len(results) >= limit:
+                break
+            if key not in results:
+                results.append(key)
+
+        return [self.entries[key] for key in results]
@@ -0,0 +1,228 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Deque, Dict, List, Optional
+
+import requests
+
+# サーキットブレーカーの状態
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# ヘッジの待ち時間を算出するのに必要な最小サンプル数
+MIN_LATENCY_SAMPLES = 20
+
+
+class UpstreamUnavailableError(requests.RequestException):
+    """全ての上流ホストのサーキットが開いている"""
+
+
+class CircuitBreaker:
+    """ホスト単位のサーキットブレーカー
+
+    連続失敗回数がしきい値に達すると開き、``reset_timeout`` 秒の間は要求を送らない。
+    経過後は半開状態として1件だけ試行し、成功すれば閉じ、失敗すれば再び開く。
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """要求を送ってよいか判定（半開状態では試行中の1件のみ許可）"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = HALF_OPEN
+                self._probing = False
+
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class LatencyTracker:
+    """直近の応答時間を保持し、パーセンタイルを算出する"""
+
+    def __init__(self, size: int = 200) -> None:
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """q（0〜1）パーセンタイルの応答時間（サンプル不足の場合はNone）"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+
+def _is_host_failure(error: requests.RequestException) -> bool:
+    """ホスト側の障害とみなすエラーか（404などの要求内容によるエラーは除く）"""
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return bool(status >= 500 or status == 429)
+    return True
+
+
+class UpstreamClient:
+    """複数の上流ホストへのHTTPクライアント（サーキットブレーカー・ヘッジ付き）
+
+    ホストは指定順に優先し、サーキットが開いているホストは飛ばす。ヘッジを有効にすると、
+    最初の要求が直近の応答時間のパーセンタイルを超えても返らない場合に別ホストへ
+    同じ要求を送り、先に成功した応答を使う。
+    """
+
+    def __init__(
+        self,
+        hosts: List[str],
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        hedge_enabled: bool = False,
+        hedge_percentile: float = 0.95,
+        hedge_min_delay: float = 0.05,
+        max_workers: int = 8,
+    ) -> None:
+        self.hosts = hosts
+        self.breakers: Dict[str, CircuitBreaker] = {
+            host: CircuitBreaker(failure_threshold, reset_timeout) for host in hosts
+        }
+        self.latency = LatencyTracker()
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers, thread_name_prefix="upstream"
+            )
+        return self._executor
+
+    def _send(
+        self, host: str, path: str, params: Dict[str, Any], timeout: float
+    ) -> requests.Response:
+        """1ホストへ要求を送り、結果をサーキットブレーカーと応答時間に反映"""
+        breaker = self.breakers[host]
+        started = time.perf_counter()
+        try:
+            response = requests.get(f"{host}{path}", params=params, timeout=timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            if _is_host_failure(e):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+
+        breaker.record_success()
+        self.latency.record(time.perf_counter() - started)
+        return response
+
+    def _next_host(self, tried: List[str]) -> Optional[str]:
+        for host in self.hosts:
+            if host not in tried and self.breakers[host].allow_request():
+                return host
+        return None
+
+    def hedge_delay(self) -> Optional[float]:
+        """ヘッジ要求を送るまでの待ち時間（サンプル不足時はヘッジしない）"""
+        threshold = self.latency.percentile(self.hedge_percentile)
+        if threshold is None:
+            return None
+        return max(threshold, self.hedge_min_delay)
+
+    def get(
+        self, path: str, params: Dict[str, Any], timeout: float = 30
+    ) -> requests.Response:
+        """GET要求を送信（ホスト障害時は次のホストへフェイルオーバー）"""
+        tried: List[str] = []
+        last_error: Optional[requests.RequestException] = None
+
+        while True:
+            host = self._next_host(tried)
+            if host is None:
+                if last_error is not None:
+                    raise last_error
+                raise UpstreamUnavailableError("全ての上流ホストのサーキットが開いています")
+            tried.append(host)
+
+            try:
+                delay = self.hedge_delay() if self.hedge_enabled else None
+                if delay is None or len(self.hosts) < 2:
+                    return self._send(host, path, params, timeout)
+                return self._hedged(host, tried, path, params, timeout, delay)
+            except requests.RequestException as e:
+                if not _is_host_failure(e):
+                    raise
+                last_error = e
+
+    def _hedged(
+        self,
+        host: str,
+        tried: List[str],
+        path: str,
+        params: Dict[str, Any],
+        timeout: float,
+        delay: float,
+    ) -> requests.Response:
+        """一定時間内に応答がなければ別ホストへも要求し、先に成功した方を返す"""
+        executor = self._get_executor()
+        pending = {executor.submit(self._send, host, path, params, timeout)}
+        done, pending = wait(pending, timeout=delay)
+
+        if not done:
+            alternate = self._next_host(tried)
+            if alternate is not None:
+                tried.append(alternate)
+                pending.add(
+                    executor.submit(self._send, alternate, path, params, timeout)
+                )
+
+        errors: List[BaseException] = []
+        futures: List[Future] = list(done)
+        while True:
+            for future in futures:
+                error = future.exception()
+                if error is None:
+                    # 遅れている側の要求は結果を待たずに捨てる
+                    response: requests.Response = future.result()
+                    return response
+                errors.append(error)
+            if not pending:
+                raise errors[-1]
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            futures = list(done)
@@ -1,112 +1,355 @@
+import hashlib
+import json
+import time
 import uuid
 from datetime import UTC, datetime
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
 
 import requests
 
+from app.config import Config
+from app.services.adjustments import parse_events
+from app.services.data_quality import clean_history
+from app.services.upstream import UpstreamClient
+
+if TYPE_CHECKING:
+    from app.services.database import DatabaseService
+    from app.services.fetch_log import FetchLogWriter
+
+# 足の種類ごとのYahoo Finance上の指定と取得期間（APIの取得可能期間に合わせる）
+YAHOO_INTERVALS = {"1m": "1m", "5m": "5m", "15m": "15m", "1h": "60m", "1d": "1d"}
+FETCH_RANGES = {"1m": "7d", "5m": "60d", "15m": "60d", "1h": "730d", "1d": "1y"}
+
+
+def fetch_fingerprint(symbols: List[str], interval: str) -> str:
+    """取得内容（足の種類と銘柄の並び）から重複判定用のハッシュを作成"""
+    payload = json.dumps([interval, symbols], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
 
 class YahooFinanceService:
     """Yahoo Finance API連携サービス"""
 
     def __init__(self) -> None:
-        self.base_url = "https://query1.finance.yahoo.com"
+        self.upstream = UpstreamClient(
+            Config.YAHOO_HOSTS,
+            failure_threshold=Config.UPSTREAM_FAILURE_THRESHOLD,
+            reset_timeout=Config.UPSTREAM_RESET_SECONDS,
+            hedge_enabled=Config.UPSTREAM_HEDGE_ENABLED,
+            hedge_percentile=Config.UPSTREAM_HEDGE_PERCENTILE,
+        )
+        self.base_url = Config.YAHOO_HOSTS[0]
         self.timeout = 30
 
-    def fetch_stock_data(self, symbol: str) -> Optional[Dict]:
+    def fetch_stock_data(self, symbol: str, interval: str = "1d") -> Optional[Dict]:
         """単一の株価データを取得"""
-        try:
-            # Yahoo Finance APIからリアルタイムデータを取得
-            quote_url = f"{self.base_url}/v8/finance/chart/{symbol}"
+        stock_data, _ = self.fetch_stock_data_with_attempt(symbol, interval)
+        return stock_data
 
-            params = {"interval": "1d", "range": "1y"}
+    def fetch_stock_data_with_attempt(
+        self, symbol: str, interval: str = "1d"
+    ) -> Tuple[Optional[Dict], Dict[str, Any]]:
+        """株価データを取得し、取得ログ用の実行記録（時刻・所要時間・エラー）と共に返す"""
+        attempt: Dict[str, Any] = {
+            "symbol": symbol,
+            "started_at": datetime.now(UTC),
+            "error_detail": None,
+        }
+        started = time.perf_counter()
 
-            response = requests.get(quote_url, params=params, timeout=self.timeout)
-            response.raise_for_status()
+        stock_data = None
+        try:
+            stock_data = self._request_stock_data(symbol, interval)
+            if stock_data is None:
+                attempt["error_detail"] = "チャートデータが含まれていません"
+        except requests.RequestException as e:
+            print(f"Yahoo Finance APIエラー ({symbol}): {e}")
+            attempt["error_detail"] = f"{type(e).__name__}: {e}"
+        except Exception as e:
+            print(f"データ取得エラー ({symbol}): {e}")
+            attempt["error_detail"] = f"{type(e).__name__}: {e}"
 
-            data = response.json()
+        attempt["completed_at"] = datetime.now(UTC)
+        attempt["duration_ms"] = (time.perf_counter() - started) * 1000
+        return stock_data, attempt
 
-            if "chart" not in data or "result" not in data["chart"]:
-                return None
-
-            result = data["chart"]["result"][0]
-            meta = result["meta"]
-            quotes = result["indicators"]["quote"][0]
-
-            # データの整形
-            stock_data = {
-                "symbol": symbol,
-                "company_name": meta.get("longName", symbol),
-                "current_price": meta.get("regularMarketPrice", 0),
-                "currency": meta.get("currency", "JPY"),
-                "market_state": meta.get("marketState", "UNKNOWN"),
-                "timezone": meta.get("timezone", "JST"),
-                "exchange": meta.get("exchangeName", "Unknown"),
-                "fetched_at": datetime.now(UTC).isoformat(),
-                "historical_data": {
-                    "timestamps": result.get("timestamp", []),
-                    "open": quotes.get("open", []),
-                    "high": quotes.get("high", []),
-                    "low": quotes.get("low", []),
-                    "close": quotes.get("close", []),
-                    "volume": quotes.get("volume", []),
-                },
-            }
+    def _request_stock_data(self, symbol: str, interval: str = "1d") -> Optional[Dict]:
+        """Yahoo Finance APIから株価データを取得（例外はそのまま送出）"""
+        # Yahoo Finance APIからリアルタイムデータを取得（障害時は別ホストへ切り替え）
+        params = {
+            "interval": YAHOO_INTERVALS[interval],
+            "range": FETCH_RANGES[interval],
+        }
+        if interval == "1d":
+            # 日足は配当・株式分割イベントも取得する（調整係数の算出に日足終値を使うため）
+            params["events"] = "div,splits"
 
-            return stock_data
+        response = self.upstream.get(
+            f"/v8/finance/chart/{symbol}", params=params, timeout=self.timeout
+        )
 
-        except requests.RequestException as e:
-            print(f"Yahoo Finance APIエラー ({symbol}): {e}")
+        data = response.json()
+
+        if "chart" not in data or "result" not in data["chart"]:
             return None
-        except Exception as e:
-            print(f"データ取得エラー ({symbol}): {e}")
+
+        result = data["chart"]["result"][0]
+        meta = result["meta"]
+        quotes = result["indicators"]["quote"][0]
+
+        # データの整形
+        stock_data = {
+            "symbol": symbol,
+            "company_name": meta.get("longName", symbol),
+            "current_price": meta.get("regularMarketPrice", 0),
+            "currency": meta.get("currency", "JPY"),
+            "market_state": meta.get("marketState", "UNKNOWN"),
+            "timezone": meta.get("timezone", "JST"),
+            "exchange": meta.get("exchangeName", "Unknown"),
+            "fetched_at": datetime.now(UTC).isoformat(),
+            "interval": interval,
+            "historical_data": {
+                "timestamps": result.get("timestamp", []),
+                "open": quotes.get("open", []),
+                "high": quotes.get("high", []),
+                "low": quotes.get("low", []),
+                "close": quotes.get("close", []),
+                "volume": quotes.get("volume", []),
+            },
+        }
+        # 欠損・重複・順序の乱れを取り込み時に整形し、品質レポートを記録する
+        stock_data["historical_data"], stock_data["quality_report"] = clean_history(
+            stock_data["historical_data"], interval
+        )
+        if interval == "1d":
+            stock_data["corporate_actions"] = parse_events(result.get("events"))
+
+        return stock_data
+
+    def fetch_quote(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """最新の株価のみを取得（リアルタイム配信用、例外はそのまま送出）"""
+        response = self.upstream.get(
+            f"/v8/finance/chart/{symbol}",
+            params={"interval": "1d", "range": "1d"},
+            timeout=self.timeout,
+        )
+
+        data = response.json()
+        if "chart" not in data or not data["chart"].get("result"):
             return None
 
-    def fetch_multiple_symbols(self, symbols: List[str]) -> str:
-        """複数の株価データを非同期で取得（タスクIDを返す）"""
+        meta = data["chart"]["result"][0]["meta"]
+        price = meta.get("regularMarketPrice")
+        previous_close = meta.get("chartPreviousClose") or meta.get("previousClose")
+        change = (
+            price - previous_close
+            if price is not None and previous_close is not None
+            else None
+        )
+        return {
+            "symbol": symbol,
+            "price": price,
+            "previous_close": previous_close,
+            "change": change,
+            "change_pct": (
+                change / previous_close * 100
+                if change is not None and previous_close
+                else None
+            ),
+            "currency": meta.get("currency", "JPY"),
+            "market_state": meta.get("marketState", "UNKNOWN"),
+            "market_time": meta.get("regularMarketTime"),
+        }
+
+    def store_fetch_result(
+        self,
+        task_id: str,
+        stock_data: Optional[Dict],
+        attempt: Dict[str, Any],
+        db_service: "DatabaseService",
+        log_writer: "FetchLogWriter",
+    ) -> bool:
+        """取得結果を保存し、取得ログを記録"""
+        from app.services.partitioning import PartitionError
+        from app.services.price_bars import PriceBarService
+
+        symbol = attempt["symbol"]
+        stock_data_id = None
+        error_detail = attempt["error_detail"]
+        if stock_data:
+            interval = stock_data.get("interval", "1d")
+            if interval == "1d":
+                stock_data_id = db_service.upsert_stock_data(stock_data)
+            else:
+                # 日中足は価格バーにのみ保存し、銘柄情報の日足履歴・品質レポートは上書きしない
+                quote = {
+                    k: v
+                    for k, v in stock_data.items()
+                    if k not in ("historical_data", "quality_report")
+                }
+                stock_data_id = db_service.upsert_stock_data(quote)
+            try:
+                PriceBarService().store_bars(
+                    symbol, interval, stock_data["historical_data"]
+                )
+            except PartitionError as e:
+                print(f"価格バー保存エラー ({symbol} {interval}): {e}")
+                error_detail = str(e)
+                stock_data_id = None
+        success = stock_data_id is not None
+
+        if stock_data and not success and not error_detail:
+            error_detail = "データベース保存に失敗しました"
+
+        log_writer.record(
+            task_id=task_id,
+            symbol=symbol,
+            status="success" if success else "error",
+            started_at=attempt["started_at"],
+            completed_at=attempt["completed_at"],
+            duration_ms=attempt["duration_ms"],
+            message=f"{symbol} データ取得{'完了' if success else '失敗'}",
+            error_detail=error_detail,
+            stock_data_id=stock_data_id,
+        )
+        return success
+
+    def fetch_multiple_symbols(
+        self,
+        symbols: List[str],
+        interval: str = "1d",
+        lane: str = "interactive",
+        idempotency_key: Optional[str] = None,
+    ) -> str:
+        """複数の株価データを非同期で取得（タスクIDを返す）
+
+        取得はジョブ実行の優先度レーン（interactive/scheduled/bulk）に登録し、
+        1銘柄ずつ他のジョブと交互に進める。再開できるよう対象銘柄と条件を
+        タスクに保存し、完了件数（``current_item``）をチェックポイントとする。
+        """
+        from app.services.job_runner import job_runner
+        from app.services.progress import ProgressService
+
         task_id = str(uuid.uuid4())
 
-        # 実際の実装では、Celeryやバックグラウンドタスクを使用
-        # MVP版では同期処理として実装
+        # プログレス初期化（ジョブ開始前に状態を確認できるよう登録前に作成）
+        ProgressService().initialize_task(
+            task_id,
+            len(symbols),
+            {
+                "lane": lane,
+                "interval": interval,
+                "symbols": symbols,
+                "fingerprint": fetch_fingerprint(symbols, interval),
+                "idempotency_key": idempotency_key,
+            },
+        )
+        job_runner.submit(
+            lane, self._fetch_steps(task_id, symbols, interval), key=task_id
+        )
+
+        return task_id
+
+    def resume_interrupted_tasks(self, stale_seconds: int) -> Dict[str, List[str]]:
+        """停止したプロセスの実行中タスクを残りの銘柄から再開
+
+        実行中のプロセスはジョブ実行の生存通知でタスクの生存時刻を更新し続けるため、
+        生存時刻が ``stale_seconds`` 以上古いタスクのみを対象とする。各タスクは
+        比較付き更新で引き受けてから登録するため、複数のプロセスで実行しても
+        二重に再開しない。対象銘柄が保存されていない古いタスクは中断状態にする。
+        """
+        from app.services.job_runner import job_runner
+        from app.services.progress import ProgressService
+
+        progress_service = ProgressService()
+        result: Dict[str, List[str]] = {"resumed": [], "interrupted": []}
+
+        for task_id, task in progress_service.find_stale_tasks(stale_seconds).items():
+            symbols = task.get("symbols")
+            if not symbols:
+                if progress_service.interrupt_task(task_id, task):
+                    result["interrupted"].append(task_id)
+                continue
+
+            start = int(task.get("current_item") or 0)
+            now = datetime.now(UTC).isoformat()
+            claimed = progress_service.claim_task(
+                task_id,
+                task,
+                {
+                    "message": f"{start}/{len(symbols)} 件目から再開しました",
+                    "updated_at": now,
+                    "resumed_at": now,
+                },
+            )
+            if not claimed:
+                # 他のプロセスが先に再開した
+                continue
+
+            job_runner.submit(
+                task.get("lane") or "interactive",
+                self._fetch_steps(
+                    task_id, symbols, task.get("interval") or "1d", start
+                ),
+                key=task_id,
+            )
+            result["resumed"].append(task_id)
+
+        return result
+
+    def _fetch_steps(
+        self, task_id: str, symbols: List[str], interval: str, start: int = 0
+    ) -> Iterator[None]:
+        """1銘柄ずつ取得・保存するジョブ（1銘柄ごとにyield、取り消されたら停止）"""
         from app.services.database import DatabaseService
+        from app.services.fetch_log import FetchLogWriter
         from app.services.progress import ProgressService
 
         progress_service = ProgressService()
         db_service = DatabaseService()
-
-        # プログレス初期化
-        progress_service.initialize_task(task_id, len(symbols))
+        log_writer = FetchLogWriter()
 
         try:
-            for i, symbol in enumerate(symbols):
-                # データ取得
-                stock_data = self.fetch_stock_data(symbol)
-
-                if stock_data:
-                    # データベース保存
-                    db_service.save_stock_data(stock_data)
-                    progress_service.update_progress(
-                        task_id, i + 1, f"{symbol} データ取得完了"
-                    )
-                else:
-                    progress_service.update_progress(
-                        task_id, i + 1, f"{symbol} データ取得失敗"
-                    )
-
-            progress_service.complete_task(task_id)
+            for i in range(start, len(symbols)):
+                if progress_service.is_cancelled(task_id):
+                    return
+
+                # データ取得・保存・取得ログ記録
+                symbol = symbols[i]
+                stock_data, attempt = self.fetch_stock_data_with_attempt(
+                    symbol, interval
+                )
+                success = self.store_fetch_result(
+                    task_id, stock_data, attempt, db_service, log_writer
+                )
+
+                progress_service.update_progress(
+                    task_id, i + 1, f"{symbol} データ取得{'完了' if success else '失敗'}"
+                )
+                if i + 1 < len(symbols):
+                    yield
+
+            if not progress_service.is_cancelled(task_id):
+                progress_service.complete_task(task_id)
 
         except Exception as e:
             progress_service.error_task(task_id, str(e))
 
-        return task_id
+        finally:
+            log_writer.flush()
 
     def validate_symbol(self, symbol: str) -> bool:
         """シンボルの有効性をチェック"""
+        return bool(self.lookup_symbol(symbol))
+
+    def lookup_symbol(self, symbol: str) -> Optional[bool]:
+        """検索APIでシンボルを確認（見つからなければFalse、上流の障害時はNone）"""
         try:
-            search_url = f"{self.base_url}/v1/finance/search"
             params = {"q": symbol}
 
-            response = requests.get(search_url, params=params, timeout=10)
-            response.raise_for_status()
+            response = self.upstream.get(
+                "/v1/finance/search", params=params, timeout=10
+            )
 
             data = response.json()
             quotes = data.get("quotes", [])
@@ -119,4 +362,4 @@ class YahooFinanceService:
             return False
 
         except Exception:
-            return False
+            return None
@@ -0,0 +1,105 @@
+"""
+ベンチマーク: JSONエンコードとレスポンス圧縮
+1年分のOHLCVを持つ詳細レスポンスについて、標準json/orjsonのエンコード時間と
+gzip/brotli圧縮による転送量削減を計測する
+
+実行方法:
+    python benchmarks/bench_json_encoding.py [--symbols 50] [--repeat 20]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import UTC, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+
+
+def build_payload(symbols: int, bars: int = 252) -> list:
+    """詳細レスポンス相当のデータを生成"""
+    base = 1700000000
+    return [
+        {
+            "symbol": f"{1000 + i}.T",
+            "company_name": f"サンプル株式会社 {i}",
+            "current_price": 1500.0 + i,
+            "currency": "JPY",
+            "exchange": "Tokyo Stock Exchange",
+            "updated_at": datetime.now(UTC).isoformat(),
+            "historical_data": {
+                "timestamps": [base + d * 86400 for d in range(bars)],
+                "open": [1450.0 + d * 0.37 for d in range(bars)],
+                "high": [1520.0 + d * 0.41 for d in range(bars)],
+                "low": [1440.0 + d * 0.33 for d in range(bars)],
+                "close": [1500.0 + d * 0.39 for d in range(bars)],
+                "volume": [100000 + d * 17 for d in range(bars)],
+            },
+        }
+        for i in range(symbols)
+    ]
+
+
+def measure(label: str, func, repeat: int) -> float:
+    """平均実行時間（ミリ秒）を計測して表示"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = (time.perf_counter() - started) / repeat * 1000
+    print(f"{label:<28} {elapsed:8.2f} ms")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app("testing")
+    payload = build_payload(args.symbols)
+
+    print(f"== エンコード時間（{args.symbols}銘柄 x 252本, {args.repeat}回平均）")
+    stdlib = measure(
+        "stdlib json",
+        lambda: json.dumps(payload, separators=(",", ":")).encode(),
+        args.repeat,
+    )
+    fast = measure(
+        "FastJSONProvider", lambda: app.json.dumps_bytes(payload), args.repeat
+    )
+    print(f"{'speedup':<28} {stdlib / fast:8.2f} x")
+
+    body = app.json.dumps_bytes(payload)
+    print(f"\n== 転送量（非圧縮 {len(body):,} bytes）")
+    for level in (1, 6, 9):
+        compressed = gzip.compress(body, compresslevel=level)
+        saved = 1 - len(compressed) / len(body)
+        measure(
+            f"gzip level={level} ({len(compressed):,} B, -{saved:.0%})",
+            lambda: gzip.compress(body, compresslevel=level),
+            args.repeat,
+        )
+
+    try:
+        import brotli
+    except ImportError:
+        print("brotli: 未インストールのためスキップ")
+        return
+
+    for quality in (4, 5, 11):
+        compressed = brotli.compress(body, quality=quality)
+        saved = 1 - len(compressed) / len(body)
+        measure(
+            f"brotli q={quality} ({len(compressed):,} B, -{saved:.0%})",
+            lambda: brotli.compress(body, quality=quality),
+            args.repeat,
+        )
+
+
+if __name__ == "__main__":
+    main()
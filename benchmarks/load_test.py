@@ -0,0 +1,487 @@
+"""
+負荷試験: 取得・参照APIの混合トラフィック
+ローカルに起動した疑似Yahoo Finance（遅延・エラー率・本数を指定可）とデータベースに
+対してアプリを本番と同じgunicorn（gthreadワーカー）の子プロセスで起動し、目標RPSで
+混合トラフィックを送ってスループット・レイテンシのパーセンタイル・エラー率を集計する。
+結果をJSONに保存し、変更前後で比較できる。
+
+実行方法:
+    python benchmarks/load_test.py [--rps 50] [--duration 30] [--symbols 200]
+        [--workers 4] [--threads 8] [--redis-url redis://localhost:6379/0]
+        [--upstream-latency-ms 80] [--upstream-error-rate 0.02] [--bars 252]
+        [--mix stocks=4,detail=4,fetch=1,status=1]
+        [--database-url postgresql://...] [--env STOCK_CACHE_ENABLED=true]
+        [--output after.json] [--compare before.json]
+
+データベース未指定時は一時ディレクトリのSQLiteを使用する（書き込みが多い場合は
+ロック待ちが発生するため、容量見積もりにはPostgreSQLを指定する）。
+複数ワーカーでは取得タスクの進捗をワーカー間で共有するため ``--redis-url`` を指定する
+（未指定時はファイル保存となり、ワーカー間の同時更新で進捗が失われることがある）。
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import requests
+from werkzeug.serving import make_server
+from werkzeug.wrappers import Request, Response
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+DEFAULT_MIX = "stocks=4,detail=4,fetch=1,status=1"
+
+
+class FakeYahooServer:
+    """Yahoo Financeのチャート・検索APIの疑似サーバー"""
+
+    def __init__(self, latency_ms: float, error_rate: float, bars: int) -> None:
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.bars = bars
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._server = make_server("127.0.0.1", 0, self._app, threaded=True)
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+
+    def _chart(self, symbol: str) -> Dict[str, Any]:
+        end = int(time.time()) // 86400 * 86400
+        timestamps = [end - (self.bars - d) * 86400 for d in range(self.bars)]
+        base = 1000.0 + random.random() * 100
+        closes = [base + d * 0.5 + random.random() for d in range(self.bars)]
+        return {
+            "chart": {
+                "result": [
+                    {
+                        "meta": {
+                            "longName": f"Load Test {symbol}",
+                            "regularMarketPrice": closes[-1] if closes else base,
+                            "chartPreviousClose": base,
+                            "regularMarketTime": end,
+                            "currency": "JPY",
+                            "marketState": "REGULAR",
+                            "timezone": "JST",
+                            "exchangeName": "TSE",
+                        },
+                        "timestamp": timestamps,
+                        "indicators": {
+                            "quote": [
+                                {
+                                    "open": closes,
+                                    "high": [c + 5 for c in closes],
+                                    "low": [c - 5 for c in closes],
+                                    "close": closes,
+                                    "volume": [100000 + d for d in range(self.bars)],
+                                }
+                            ]
+                        },
+                    }
+                ]
+            }
+        }
+
+    def _app(self, environ: Dict[str, Any], start_response: Callable) -> Any:
+        request = Request(environ)
+        with self._lock:
+            self.requests += 1
+            failed = random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+
+        # 指数分布で揺らぎを持たせた応答遅延
+        time.sleep(random.expovariate(1.0 / self.latency_ms) / 1000)
+
+        if failed:
+            response = Response("upstream error", status=503)
+        elif request.path.startswith("/v8/finance/chart/"):
+            symbol = request.path.rsplit("/", 1)[-1]
+            response = Response(
+                json.dumps(self._chart(symbol)), mimetype="application/json"
+            )
+        elif request.path.startswith("/v1/finance/search"):
+            body = {"quotes": [{"symbol": request.args.get("q", "")}]}
+            response = Response(json.dumps(body), mimetype="application/json")
+        else:
+            response = Response("not found", status=404)
+        return response(environ, start_response)
+
+    def start(self) -> None:
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+
+
+def configure_environment(
+    workdir: str,
+    upstream_url: str,
+    database_url: Optional[str],
+    redis_url: Optional[str],
+    overrides: List[str],
+) -> None:
+    """アプリの設定を環境変数で指定（子プロセスのアプリに引き継がれる）"""
+    os.environ.update(
+        {
+            "DATABASE_URL": database_url
+            or f"sqlite:///{os.path.join(workdir, 'load_test.db')}",
+            "YAHOO_HOSTS": upstream_url,
+            "PROGRESS_BACKEND": "redis" if redis_url else "file",
+            "PROGRESS_FILE": os.path.join(workdir, "progress.json"),
+            # 生成した銘柄は銘柄マスターにないため、銘柄の検証は行わない
+            "SYMBOL_VALIDATION_ENABLED": "false",
+            "FETCH_INTERACTIVE_MAX_SYMBOLS": "1000000",
+        }
+    )
+    if redis_url:
+        os.environ["REDIS_URL"] = redis_url
+    for override in overrides:
+        name, _, value = override.partition("=")
+        os.environ[name] = value
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port: int = sock.getsockname()[1]
+        return port
+
+
+def start_app(
+    workers: int, threads: int, startup_timeout: float = 60
+) -> Tuple[subprocess.Popen, str]:
+    """テーブルを作成し、アプリをgunicornの子プロセスで起動して (プロセス, URL) を返す"""
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        raise SystemExit("gunicornがインストールされていません（pip install -r requirements.txt）")
+
+    # テーブル作成は各ワーカーで競合しないよう起動前に別プロセスで1回だけ行う
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "from app import create_app, db\n"
+            "app = create_app('production')\n"
+            "with app.app_context():\n"
+            "    db.create_all()\n",
+        ],
+        cwd=ROOT_DIR,
+        check=True,
+    )
+
+    port = _free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "--workers",
+            str(workers),
+            "--worker-class",
+            "gthread",
+            "--threads",
+            str(threads),
+            "--bind",
+            f"127.0.0.1:{port}",
+            "--log-level",
+            "warning",
+            "app:create_app('production')",
+        ],
+        cwd=ROOT_DIR,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+
+    deadline = time.monotonic() + startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicornが終了しました（終了コード {process.returncode}）")
+        try:
+            if requests.get(f"{base_url}/api/fetch-lanes", timeout=1).ok:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+
+    stop_app(process)
+    raise RuntimeError(f"gunicornが{startup_timeout}秒以内に起動しません")
+
+
+def stop_app(process: subprocess.Popen) -> None:
+    """gunicornを停止（応答しない場合は強制終了）"""
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def seed(base_url: str, symbols: List[str], timeout: float = 300) -> None:
+    """全銘柄を取得済みの状態にする（時間内に完了しない場合は例外を送出）"""
+    session = requests.Session()
+    task_ids = []
+    for start in range(0, len(symbols), 50):
+        response = session.post(
+            f"{base_url}/api/fetch-data",
+            json={"symbols": symbols[start : start + 50], "lane": "bulk"},
+        )
+        response.raise_for_status()
+        task_ids.append(response.json()["task_id"])
+
+    deadline = time.monotonic() + timeout
+    pending = list(task_ids)
+    failed: List[str] = []
+    while pending and time.monotonic() < deadline:
+        task_id = pending[0]
+        status = session.get(f"{base_url}/api/fetch-status/{task_id}").json()
+        if status and status.get("status") != "running":
+            pending.pop(0)
+            if status.get("status") != "completed":
+                failed.append(task_id)
+            continue
+        time.sleep(0.2)
+
+    if pending or failed:
+        raise RuntimeError(
+            f"準備の取得が完了しません（{timeout:.0f}秒以内に未完了 {len(pending)} 件、"
+            f"失敗 {len(failed)} 件 / 全 {len(task_ids)} 件）"
+        )
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """ "stocks=4,detail=4" 形式のトラフィック配分を読み込み"""
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in ("stocks", "detail", "fetch", "status"):
+            raise ValueError(f"未対応のリクエスト種別です: {name}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+class TrafficDriver:
+    """目標RPSでリクエストを送出し、種別ごとの結果を記録する
+
+    送出は一定間隔のオープンループで行い、レイテンシは予定送出時刻から計測する
+    （サーバーの遅延で送出が遅れた分も待ち時間として含める）。
+    """
+
+    def __init__(self, base_url: str, symbols: List[str], mix: Dict[str, float]):
+        self.base_url = base_url
+        self.symbols = symbols
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.results: Dict[str, List[Tuple[float, bool]]] = defaultdict(list)
+        self.task_ids: List[str] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        session: requests.Session = self._local.session
+        return session
+
+    def _send(self, kind: str) -> requests.Response:
+        session = self._session()
+        if kind == "stocks":
+            page = random.randint(1, max(1, len(self.symbols) // 12))
+            return session.get(f"{self.base_url}/api/stocks?page={page}", timeout=30)
+        if kind == "detail":
+            symbol = random.choice(self.symbols)
+            return session.get(f"{self.base_url}/api/stocks/{symbol}", timeout=30)
+        if kind == "fetch":
+            symbols = random.sample(self.symbols, k=min(3, len(self.symbols)))
+            response = session.post(
+                f"{self.base_url}/api/fetch-data", json={"symbols": symbols}, timeout=30
+            )
+            if response.ok:
+                with self._lock:
+                    self.task_ids.append(response.json()["task_id"])
+            return response
+
+        with self._lock:
+            task_id = random.choice(self.task_ids) if self.task_ids else "unknown"
+        return session.get(f"{self.base_url}/api/fetch-status/{task_id}", timeout=30)
+
+    def _run_one(self, kind: str, scheduled: float) -> None:
+        try:
+            ok = self._send(kind).status_code < 500
+        except requests.RequestException:
+            ok = False
+        latency = (time.perf_counter() - scheduled) * 1000
+        with self._lock:
+            self.results[kind].append((latency, ok))
+
+    def run(self, rps: float, duration: float, concurrency: int) -> float:
+        """指定時間リクエストを送出し、実際の経過秒数を返す"""
+        interval = 1.0 / rps
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            sent = 0
+            while True:
+                scheduled = started + sent * interval
+                if scheduled - started >= duration:
+                    break
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                kind = random.choices(self.kinds, self.weights)[0]
+                executor.submit(self._run_one, kind, scheduled)
+                sent += 1
+        return time.perf_counter() - started
+
+
+def summarize(
+    results: Dict[str, List[Tuple[float, bool]]], elapsed: float
+) -> Dict[str, Dict[str, Any]]:
+    """種別ごと・全体のスループット・パーセンタイル・エラー率"""
+    groups = dict(results)
+    groups["total"] = [item for items in results.values() for item in items]
+
+    report = {}
+    for kind, items in groups.items():
+        if not items:
+            continue
+        latencies = np.array([latency for latency, _ in items])
+        errors = sum(1 for _, ok in items if not ok)
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        report[kind] = {
+            "requests": len(items),
+            "throughput_rps": round(len(items) / elapsed, 2),
+            "error_rate": round(errors / len(items), 4),
+            "p50_ms": round(float(p50), 2),
+            "p90_ms": round(float(p90), 2),
+            "p99_ms": round(float(p99), 2),
+            "max_ms": round(float(latencies.max()), 2),
+        }
+    return report
+
+
+def print_report(
+    report: Dict[str, Dict[str, Any]], baseline: Optional[Dict[str, Any]] = None
+) -> None:
+    header = f"{'kind':<8} {'req':>7} {'rps':>8} {'err%':>6} "
+    header += f"{'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}"
+    print(header)
+    for kind, row in report.items():
+        print(
+            f"{kind:<8} {row['requests']:>7} {row['throughput_rps']:>8.1f} "
+            f"{row['error_rate'] * 100:>5.1f}% {row['p50_ms']:>9.1f} "
+            f"{row['p90_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['max_ms']:>9.1f}"
+        )
+        before = (baseline or {}).get(kind)
+        if before:
+            deltas = [
+                f"{name}{(row[name] - before[name]) / before[name]:+.0%}"
+                for name in ("throughput_rps", "p50_ms", "p99_ms")
+                if before[name]
+            ]
+            print(f"{'':<8} 比較: {' '.join(deltas)}")
+
+
+def run_benchmark(
+    args: argparse.Namespace,
+    mix: Dict[str, float],
+    base_url: str,
+    upstream: FakeYahooServer,
+) -> None:
+    """準備・ウォームアップ・計測を行い、結果を表示・保存"""
+    symbols = [f"{1000 + i}.T" for i in range(args.symbols)]
+
+    print(
+        f"== 準備: {len(symbols)}銘柄を取得（疑似上流 {upstream.url}、"
+        f"gunicorn {args.workers}ワーカー x {args.threads}スレッド）"
+    )
+    # 準備の取得が注入したエラーで失敗しないよう、準備中はエラーを注入しない
+    error_rate, upstream.error_rate = upstream.error_rate, 0.0
+    try:
+        seed(base_url, symbols)
+    finally:
+        upstream.error_rate = error_rate
+
+    if args.warmup > 0:
+        TrafficDriver(base_url, symbols, mix).run(
+            args.rps, args.warmup, args.concurrency
+        )
+
+    print(f"== 計測: {args.rps} rps x {args.duration}秒 ({args.mix})")
+    driver = TrafficDriver(base_url, symbols, mix)
+    elapsed = driver.run(args.rps, args.duration, args.concurrency)
+    report = summarize(driver.results, elapsed)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["report"]
+    print_report(report, baseline)
+    print(f"\n疑似上流: {upstream.requests} リクエスト / エラー注入 {upstream.errors} 件")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {"settings": vars(args), "report": report},
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rps", type=float, default=50)
+    parser.add_argument("--duration", type=float, default=30, help="計測秒数")
+    parser.add_argument("--warmup", type=float, default=5, help="計測前の送出秒数")
+    parser.add_argument("--concurrency", type=int, default=64, help="送信スレッド数")
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--bars", type=int, default=252, help="疑似上流の応答本数")
+    parser.add_argument("--upstream-latency-ms", type=float, default=80)
+    parser.add_argument("--upstream-error-rate", type=float, default=0.02)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="リクエスト種別の配分")
+    parser.add_argument("--workers", type=int, default=4, help="gunicornのワーカー数")
+    parser.add_argument("--threads", type=int, default=8, help="ワーカーあたりのスレッド数")
+    parser.add_argument("--database-url", help="未指定時は一時SQLite")
+    parser.add_argument("--redis-url", help="取得タスクの進捗をワーカー間で共有するRedis")
+    parser.add_argument("--env", action="append", default=[], help="設定の上書き（KEY=VALUE）")
+    parser.add_argument("--output", help="結果を保存するJSONファイル")
+    parser.add_argument("--compare", help="比較対象の結果JSONファイル")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    # 疑似上流のリクエストごとのアクセスログは計測の妨げになるため抑止
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    if args.workers > 1 and not args.redis_url:
+        print("警告: --redis-url 未指定のため取得タスクの進捗はファイルに保存されます")
+    upstream = FakeYahooServer(
+        args.upstream_latency_ms, args.upstream_error_rate, args.bars
+    )
+    upstream.start()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(
+            workdir, upstream.url, args.database_url, args.redis_url, args.env
+        )
+        process, base_url = start_app(args.workers, args.threads)
+        try:
+            run_benchmark(args, mix, base_url, upstream)
+        finally:
+            stop_app(process)
+    upstream.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+テスト用ヘルパー
+外部サービス（Redis等）のインメモリ代替とクエリ数の検証を提供
+"""
+
+import fnmatch
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+class FakePubSub:
+    """FakeRedis用のPubSub"""
+
+    def __init__(self, redis, ignore_subscribe_messages=False):
+        self.redis = redis
+        self.channels = set()
+        self.messages = []
+
+    def subscribe(self, *channels):
+        for channel in channels:
+            self.channels.add(channel)
+            self.redis.subscribers.setdefault(channel, []).append(self)
+
+    def unsubscribe(self, *channels):
+        for channel in channels or list(self.channels):
+            self.channels.discard(channel)
+            if self in self.redis.subscribers.get(channel, []):
+                self.redis.subscribers[channel].remove(self)
+
+    def get_message(self, timeout=0.0):
+        if self.messages:
+            return self.messages.pop(0)
+        return None
+
+    def close(self):
+        self.unsubscribe()
+
+
+class FakePipeline:
+    """FakeRedis用のパイプライン（execute時にまとめて実行）
+
+    watch() から multi() までは redis-py と同様にコマンドを即時実行する。
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+        self.immediate = False
+
+    def watch(self, *keys):
+        self.immediate = True
+
+    def multi(self):
+        self.immediate = False
+
+    def __getattr__(self, name):
+        if self.immediate:
+            return getattr(self.redis, name)
+
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    def execute(self):
+        results = [
+            getattr(self.redis, name)(*args, **kwargs)
+            for name, args, kwargs in self.commands
+        ]
+        self.commands = []
+        return results
+
+
+class FakeRedis:
+    """redis.Redis(decode_responses=True) のインメモリ代替"""
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+        self.subscribers = {}
+        self.published = []
+
+    def _purge(self, key):
+        if key in self.expiry and self.expiry[key] <= time.monotonic():
+            self.data.pop(key, None)
+            self.expiry.pop(key, None)
+
+    def _get(self, key, default):
+        self._purge(key)
+        return self.data.setdefault(key, default)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def transaction(self, func, *watches, value_from_callable=False):
+        pipe = self.pipeline()
+        pipe.watch(*watches)
+        value = func(pipe)
+        results = pipe.execute()
+        return value if value_from_callable else results
+
+    def exists(self, *keys):
+        count = 0
+        for key in keys:
+            self._purge(key)
+            count += key in self.data
+        return count
+
+    def delete(self, *keys):
+        count = 0
+        for key in keys:
+            count += self.data.pop(key, None) is not None
+            self.expiry.pop(key, None)
+        return count
+
+    def expire(self, key, seconds):
+        if key in self.data:
+            self.expiry[key] = time.monotonic() + seconds
+            return True
+        return False
+
+    def get(self, key):
+        self._purge(key)
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and self.exists(key):
+            return None
+        self.data[key] = value
+        self.expiry.pop(key, None)
+        if ex is not None:
+            self.expire(key, ex)
+        return True
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        hash_ = self._get(key, {})
+        if field is not None:
+            hash_[field] = value
+        hash_.update(mapping or {})
+        return len(mapping or {}) + (field is not None)
+
+    def incr(self, key):
+        self._purge(key)
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    def lpush(self, key, *values):
+        list_ = self._get(key, [])
+        list_[:0] = reversed(values)
+        return len(list_)
+
+    def llen(self, key):
+        self._purge(key)
+        return len(self.data.get(key, []))
+
+    def hmget(self, key, fields):
+        self._purge(key)
+        hash_ = self.data.get(key, {})
+        return [hash_.get(field) for field in fields]
+
+    def hgetall(self, key):
+        self._purge(key)
+        return dict(self.data.get(key, {}))
+
+    def rpush(self, key, *values):
+        list_ = self._get(key, [])
+        list_.extend(values)
+        return len(list_)
+
+    def ltrim(self, key, start, end):
+        list_ = self._get(key, [])
+        end = len(list_) if end == -1 else end + 1
+        self.data[key] = list_[start:end]
+        return True
+
+    def lrange(self, key, start, end):
+        self._purge(key)
+        list_ = self.data.get(key, [])
+        end = len(list_) if end == -1 else end + 1
+        return list(list_[start:end])
+
+    def scan_iter(self, match="*"):
+        for key in list(self.data):
+            self._purge(key)
+            if key in self.data and fnmatch.fnmatchcase(key, match):
+                yield key
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+        receivers = self.subscribers.get(channel, [])
+        for pubsub in receivers:
+            pubsub.messages.append(
+                {"type": "message", "channel": channel, "data": message}
+            )
+        return len(receivers)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self, ignore_subscribe_messages)
+
+
+@contextmanager
+def assert_max_queries(max_queries):
+    """ブロック内で実行されたSQLが指定件数以下であることを検証する
+
+    アプリケーションコンテキスト内で使用する。超過時は実行されたSQLを一覧で表示する。
+
+        with assert_max_queries(2):
+            client.get("/api/stocks")
+    """
+    from app import db
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", record)
+
+    assert (
+        len(statements) <= max_queries
+    ), f"クエリ数が上限を超えました: {len(statements)} > {max_queries}\n" + "\n".join(statements)
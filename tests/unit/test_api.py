@@ -1,9 +1,22 @@
+import gzip
 import json
+import marshal
+from datetime import UTC, datetime, timedelta
+from unittest.mock import Mock, patch
 
 import pytest
 
 from app import create_app, db
-from app.models.stock_data import StockData
+from app.config import Config
+from app.models.stock_data import FetchLog, PriceBar, StockData
+from app.profiling import ProfileStore
+from app.query_metrics import normalize_statement, query_metrics, redact_parameters
+from app.services.progress import FileProgressBackend, ProgressService
+from app.services.quote_hub import QuoteHub
+from app.services.screener import ScreenerService
+from app.services.stock_cache import StockCache
+from app.services.symbol_index import SymbolIndexService
+from tests.helpers import FakeRedis, assert_max_queries
 
 
 @pytest.fixture
@@ -82,6 +95,38 @@ class TestAPIRoutes:
         assert data["symbols"] == ["TEST.T", "SAMPLE.T"]
         assert "データ取得を開始しました" in data["message"]
 
+    def test_fetch_data_lane(self, client):
+        """取得ジョブの優先度レーン指定のテスト"""
+        with patch(
+            "app.routes.api.yahoo_service.fetch_multiple_symbols",
+            return_value="task-1",
+        ) as mock_fetch:
+            response = client.post("/api/fetch-data", json={"symbols": ["A.T"]})
+            assert response.get_json()["lane"] == "interactive"
+
+            many = [f"{i}.T" for i in range(21)]
+            response = client.post("/api/fetch-data", json={"symbols": many})
+            assert response.get_json()["lane"] == "bulk"
+
+            response = client.post(
+                "/api/fetch-data", json={"symbols": many, "lane": "scheduled"}
+            )
+            assert response.status_code == 202
+            mock_fetch.assert_called_with(many, "1d", "scheduled", None)
+
+            response = client.post(
+                "/api/fetch-data", json={"symbols": ["A.T"], "lane": "urgent"}
+            )
+            assert response.status_code == 400
+
+        response = client.get("/api/fetch-lanes")
+        assert response.status_code == 200
+        assert set(response.get_json()["lanes"]) == {
+            "interactive",
+            "scheduled",
+            "bulk",
+        }
+
     def test_fetch_data_no_symbols(self, client):
         """シンボル未指定時のエラーテスト"""
         payload = {"symbols": []}
@@ -171,3 +216,884 @@ class TestAPIRoutes:
         data = json.loads(response.data)
         assert data["pagination"]["page"] == 2
         assert data["pagination"]["per_page"] == 5
+
+
+class TestFetchTaskAPI:
+    """取得タスクの重複排除・取り消し・再開のテスト"""
+
+    @pytest.fixture
+    def progress(self, tmp_path):
+        """一時ファイルに保存するプログレス管理"""
+        progress_file = str(tmp_path / "progress.json")
+        service = ProgressService(FileProgressBackend(progress_file))
+        with patch.object(Config, "PROGRESS_FILE", progress_file), patch(
+            "app.routes.api.progress_service", service
+        ), patch("app.routes.api.yahoo_service._request_stock_data", return_value=None):
+            yield service
+
+    def test_idempotency_key(self, client, progress):
+        """同じ冪等キーの再送は既存のタスクを返すテスト"""
+        payload = {"symbols": ["A.T", "B.T"]}
+        headers = {"Idempotency-Key": "refresh-1"}
+
+        first = client.post("/api/fetch-data", json=payload, headers=headers)
+        second = client.post("/api/fetch-data", json=payload, headers=headers)
+
+        assert first.status_code == 202
+        assert second.status_code == 200
+        assert second.get_json()["deduplicated"] is True
+        assert second.get_json()["task_id"] == first.get_json()["task_id"]
+        assert len(progress.get_all_tasks()) == 1
+
+        other = client.post(
+            "/api/fetch-data", json={**payload, "idempotency_key": "refresh-2"}
+        )
+        assert other.status_code == 202
+
+    def test_duplicate_running_task(self, client, progress):
+        """同じ内容で実行中のタスクがあれば新しいタスクを作らないテスト"""
+        from app.services.yahoo_finance import fetch_fingerprint
+
+        progress.initialize_task(
+            "running-1", 2, {"fingerprint": fetch_fingerprint(["A.T", "B.T"], "1d")}
+        )
+
+        response = client.post("/api/fetch-data", json={"symbols": ["A.T", "B.T"]})
+        assert response.status_code == 200
+        assert response.get_json()["task_id"] == "running-1"
+
+        response = client.post("/api/fetch-data", json={"symbols": ["A.T"]})
+        assert response.status_code == 202
+
+    def test_cancel_task(self, client, progress):
+        """実行中のタスクを取り消し、残りの銘柄を取得しないテスト"""
+        progress.initialize_task("task-1", 3, {"symbols": ["A.T", "B.T", "C.T"]})
+
+        response = client.delete("/api/fetch-status/task-1")
+        assert response.status_code == 200
+        assert progress.get_status("task-1")["status"] == "cancelled"
+
+        assert client.delete("/api/fetch-status/task-1").status_code == 409
+        assert client.delete("/api/fetch-status/unknown").status_code == 404
+
+        from app.routes.api import yahoo_service
+
+        with patch.object(yahoo_service, "fetch_stock_data_with_attempt") as fetch:
+            list(yahoo_service._fetch_steps("task-1", ["A.T", "B.T", "C.T"], "1d"))
+        fetch.assert_not_called()
+
+    def test_resume_interrupted_tasks(self, app, progress):
+        """停止したタスクは残りの銘柄から再開し、対象不明のタスクは中断にするテスト"""
+        from app.routes.api import yahoo_service
+
+        progress.initialize_task("task-1", 3, {"symbols": ["A.T", "B.T", "C.T"]})
+        progress.update_progress("task-1", 1)
+        progress.initialize_task("legacy", 5)
+        progress.initialize_task("fresh", 1, {"symbols": ["D.T"]})
+        stale = (datetime.now(UTC) - timedelta(hours=1)).isoformat()
+        for task_id in ("task-1", "legacy"):
+            progress.backend.update(
+                task_id, {"updated_at": stale, "heartbeat_at": stale}
+            )
+
+        with patch.object(
+            yahoo_service,
+            "fetch_stock_data_with_attempt",
+            side_effect=lambda symbol, interval: (
+                None,
+                {
+                    "symbol": symbol,
+                    "started_at": datetime.now(UTC),
+                    "completed_at": datetime.now(UTC),
+                    "duration_ms": 0.0,
+                    "error_detail": None,
+                },
+            ),
+        ) as fetch:
+            result = yahoo_service.resume_interrupted_tasks(stale_seconds=600)
+
+        assert result == {"resumed": ["task-1"], "interrupted": ["legacy"]}
+        assert [c.args[0] for c in fetch.call_args_list] == ["B.T", "C.T"]
+        assert progress.get_status("task-1")["status"] == "completed"
+        assert progress.get_status("legacy")["status"] == "interrupted"
+        assert progress.get_status("fresh")["status"] == "running"
+
+
+class TestQuoteStreamAPI:
+    """株価のリアルタイム配信APIのテスト"""
+
+    def test_stream_quotes(self, client):
+        """購読した銘柄の更新がSSEで配信され、切断時に購読解除されるテスト"""
+        hub = QuoteHub(
+            lambda symbol: {"symbol": symbol, "price": 10.0, "market_time": 1},
+            poll_interval=0.01,
+        )
+        with patch("app.routes.api.quote_hub", hub):
+            response = client.get("/api/quotes/stream?symbols=A.T,A.T")
+
+            assert response.status_code == 200
+            assert response.mimetype == "text/event-stream"
+            assert hub.stats()["symbols"] == {"A.T": 1}
+
+            chunks = response.response
+            assert next(chunks).startswith(b"retry:")
+            event = next(chunks).decode("utf-8")
+            assert event.startswith("event: quote\n")
+            assert json.loads(event.split("data: ")[1])["price"] == 10.0
+
+            response.close()
+            assert hub.stats()["pollers"] == 0
+
+    def test_stream_validation(self, client):
+        """銘柄未指定・上限超過のテスト"""
+        assert client.get("/api/quotes/stream").status_code == 400
+
+        symbols = ",".join(f"{i}.T" for i in range(51))
+        assert client.get(f"/api/quotes/stream?symbols={symbols}").status_code == 400
+
+
+class TestExportAPI:
+    """一括エクスポートAPIのテスト"""
+
+    @pytest.fixture
+    def stocks(self, app):
+        """取引所の異なるテストデータ"""
+        with app.app_context():
+            for symbol, exchange in [("A.T", "TSE"), ("B.T", "TSE"), ("C", "NYSE")]:
+                db.session.add(
+                    StockData(
+                        symbol=symbol,
+                        company_name=f"{symbol} Inc.",
+                        current_price=100.0,
+                        currency="JPY" if exchange == "TSE" else "USD",
+                        exchange=exchange,
+                        historical_data={"close": [1.0, 2.0]},
+                    )
+                )
+            db.session.commit()
+
+    def test_export_ndjson(self, client, stocks):
+        """NDJSON形式のエクスポートテスト"""
+        response = client.get("/api/export")
+        assert response.status_code == 200
+        assert response.mimetype == "application/x-ndjson"
+        assert response.is_streamed
+
+        rows = [json.loads(line) for line in response.data.decode().splitlines()]
+        assert [row["symbol"] for row in rows] == ["A.T", "B.T", "C"]
+        assert rows[0]["historical_data"] == {"close": [1.0, 2.0]}
+
+    def test_export_csv_with_filter(self, client, stocks):
+        """CSV形式と絞り込み条件のテスト"""
+        response = client.get("/api/export?format=csv&exchange=TSE&currency=JPY")
+        assert response.status_code == 200
+
+        lines = response.data.decode().splitlines()
+        assert lines[0].startswith("id,symbol,company_name")
+        assert len(lines) == 3
+        assert "B.T" in lines[2]
+
+    def test_export_updated_since(self, client, stocks):
+        """updated_sinceによる差分エクスポートテスト"""
+        response = client.get("/api/export?updated_since=2999-01-01T00:00:00Z")
+        assert response.status_code == 200
+        assert response.data == b""
+
+    def test_export_invalid_format(self, client):
+        """不正な形式指定のテスト"""
+        response = client.get("/api/export?format=xml")
+        assert response.status_code == 400
+
+        response = client.get("/api/export?updated_since=yesterday")
+        assert response.status_code == 400
+
+
+class TestFetchLogStatsAPI:
+    """取得性能集計APIのテスト"""
+
+    @pytest.fixture
+    def logs(self, app):
+        """集計対象の取得ログ"""
+        with app.app_context():
+            stock = StockData(
+                symbol="FAST.T",
+                company_name="Fast",
+                current_price=1.0,
+                currency="JPY",
+                exchange="TSE",
+            )
+            db.session.add(stock)
+            db.session.flush()
+
+            now = datetime.now(UTC)
+            for i, duration in enumerate([100.0, 200.0, 300.0, 400.0]):
+                db.session.add(
+                    FetchLog(
+                        task_id="task-1",
+                        symbol="FAST.T",
+                        status="success",
+                        started_at=now - timedelta(minutes=i),
+                        duration_ms=duration,
+                        stock_data_id=stock.id,
+                    )
+                )
+            db.session.add(
+                FetchLog(
+                    task_id="task-1",
+                    symbol="SLOW.T",
+                    status="error",
+                    started_at=now,
+                    duration_ms=5000.0,
+                )
+            )
+            db.session.commit()
+
+    def test_stats_by_symbol(self, client, logs):
+        """シンボル別集計テスト"""
+        response = client.get("/api/fetch-logs/stats")
+        assert response.status_code == 200
+
+        groups = {g["key"]: g for g in json.loads(response.data)["groups"]}
+        assert list(groups) == ["SLOW.T", "FAST.T"]  # p95の降順
+        assert groups["FAST.T"]["count"] == 4
+        assert groups["FAST.T"]["error_rate"] == 0.0
+        assert groups["FAST.T"]["p50_ms"] == 250.0
+        assert groups["FAST.T"]["p95_ms"] == pytest.approx(385.0)
+        assert groups["SLOW.T"]["error_rate"] == 1.0
+
+    def test_stats_by_exchange_and_time(self, client, logs):
+        """取引所別・時間帯別集計テスト"""
+        response = client.get("/api/fetch-logs/stats?group_by=exchange")
+        groups = {g["key"]: g for g in json.loads(response.data)["groups"]}
+        assert groups["TSE"]["count"] == 4
+        assert groups["UNKNOWN"]["errors"] == 1
+
+        response = client.get("/api/fetch-logs/stats?group_by=time&bucket=day")
+        data = json.loads(response.data)
+        assert data["bucket"] == "day"
+        assert sum(g["count"] for g in data["groups"]) == 5
+
+    def test_stats_invalid_params(self, client):
+        """不正なパラメータのテスト"""
+        assert client.get("/api/fetch-logs/stats?group_by=foo").status_code == 400
+        assert client.get("/api/fetch-logs/stats?bucket=week").status_code == 400
+        assert client.get("/api/fetch-logs/stats?since=abc").status_code == 400
+
+
+class TestSymbolAPI:
+    """シンボル検証・補完APIのテスト"""
+
+    @pytest.fixture
+    def symbol_index(self, app, tmp_path):
+        """シンボルマスタを読み込んだインデックス"""
+        path = tmp_path / "symbols.csv"
+        path.write_text("symbol,name,exchange\nTEST.T,Test Company,TSE\n")
+
+        index = SymbolIndexService(str(path))
+        with app.app_context():
+            index.load()
+        app.config["SYMBOL_VALIDATION_ENABLED"] = True
+        with patch("app.routes.api.symbol_index", index):
+            yield index
+
+    def test_fetch_data_rejects_unknown_symbols(self, client, symbol_index):
+        """マスタにないシンボルを拒否するテスト"""
+        payload = {"symbols": ["TEST.T", "NOPE.T"]}
+
+        response = client.post(
+            "/api/fetch-data", data=json.dumps(payload), content_type="application/json"
+        )
+
+        assert response.status_code == 400
+        assert json.loads(response.data)["invalid_symbols"] == ["NOPE.T"]
+
+    def test_fetch_data_skips_validation_without_master(self, app, client, tmp_path):
+        """マスタがない場合は上流へ問い合わせずに受け付けるテスト"""
+        index = SymbolIndexService(str(tmp_path / "missing.csv"))
+        app.config["SYMBOL_VALIDATION_ENABLED"] = True
+
+        with patch("app.routes.api.symbol_index", index), patch(
+            "app.routes.api.yahoo_service.lookup_symbol"
+        ) as mock_lookup, patch(
+            "app.routes.api.yahoo_service._request_stock_data", return_value=None
+        ):
+            response = client.post(
+                "/api/fetch-data", json={"symbols": ["TEST.T", "NOPE.T"]}
+            )
+
+        assert response.status_code == 202
+        mock_lookup.assert_not_called()
+
+    def test_remote_fallback_lets_upstream_errors_through(
+        self, app, client, symbol_index
+    ):
+        """上流の検索APIの障害時は拒否せず、否定キャッシュにも記録しないテスト"""
+        app.config["SYMBOL_VALIDATION_REMOTE_FALLBACK"] = True
+
+        with patch(
+            "app.routes.api.yahoo_service.lookup_symbol", return_value=None
+        ), patch("app.routes.api.yahoo_service._request_stock_data", return_value=None):
+            response = client.post("/api/fetch-data", json={"symbols": ["NEW.T"]})
+        assert response.status_code == 202
+        assert "NEW.T" not in symbol_index._negative
+
+        with patch("app.routes.api.yahoo_service.lookup_symbol", return_value=False):
+            response = client.post("/api/fetch-data", json={"symbols": ["NEW.T"]})
+        assert response.status_code == 400
+
+    def test_symbol_search(self, client, symbol_index):
+        """補完APIのテスト"""
+        response = client.get("/api/symbols/search?q=te")
+        assert response.status_code == 200
+
+        data = json.loads(response.data)
+        assert data["results"][0]["symbol"] == "TEST.T"
+
+
+class TestDeltaSyncAPI:
+    """差分同期APIのテスト"""
+
+    @pytest.fixture
+    def stocks(self, app):
+        """更新時刻の異なるテストデータ"""
+        history = {
+            "timestamps": [1700000000, 1700086400, 1700172800],
+            "close": [1.0, 2.0, 3.0],
+        }
+        with app.app_context():
+            for i, symbol in enumerate(["OLD.T", "NEW1.T", "NEW2.T"]):
+                db.session.add(
+                    StockData(
+                        symbol=symbol,
+                        company_name=symbol,
+                        current_price=1.0,
+                        historical_data=history,
+                        updated_at=datetime(2024, 1, 1 + i),
+                    )
+                )
+            db.session.commit()
+
+    def test_stock_detail_since(self, client, stocks):
+        """since指定の詳細取得で新しい足のみが返るテスト"""
+        response = client.get("/api/stocks/NEW2.T?since=1700100000")
+        data = json.loads(response.data)
+
+        assert data["changed"] is True
+        # 基準時刻以前の直近1本 + それ以降の足
+        assert data["historical_data"]["timestamps"] == [1700086400, 1700172800]
+        assert data["historical_data"]["close"] == [2.0, 3.0]
+
+    def test_stock_detail_unchanged(self, client, stocks):
+        """基準時刻以降に更新がない場合のテスト"""
+        response = client.get("/api/stocks/OLD.T?since=2024-01-02T00:00:00Z")
+        data = json.loads(response.data)
+
+        assert data == {
+            "symbol": "OLD.T",
+            "changed": False,
+            "updated_at": "2024-01-01T00:00:00",
+        }
+
+    def test_changes_feed_paging(self, client, stocks):
+        """変更フィードのページングテスト"""
+        response = client.get("/api/changes?since=2024-01-01T12:00:00Z&limit=1")
+        data = json.loads(response.data)
+
+        assert [item["symbol"] for item in data["items"]] == ["NEW1.T"]
+        assert data["has_more"] is True
+
+        response = client.get(
+            f"/api/changes?since={data['next_since']}"
+            f"&after_id={data['next_after_id']}&limit=1"
+        )
+        data = json.loads(response.data)
+        assert [item["symbol"] for item in data["items"]] == ["NEW2.T"]
+        assert data["has_more"] is False
+
+    def test_changes_requires_since(self, client):
+        """since未指定のエラーテスト"""
+        assert client.get("/api/changes").status_code == 400
+
+
+class TestResponseEncoding:
+    """JSONエンコードとレスポンス圧縮のテスト"""
+
+    @pytest.fixture
+    def large_stock(self, app):
+        """1年分の履歴を持つテストデータ"""
+        with app.app_context():
+            db.session.add(
+                StockData(
+                    symbol="BIG.T",
+                    company_name="Big Company",
+                    current_price=1.0,
+                    historical_data={
+                        "timestamps": list(range(1700000000, 1700000000 + 252)),
+                        "close": [1000.0 + i for i in range(252)],
+                    },
+                )
+            )
+            db.session.commit()
+
+    def test_json_provider_numpy(self, app):
+        """NumPy配列のシリアライズテスト"""
+        np = pytest.importorskip("numpy")
+
+        data = json.loads(app.json.dumps({"values": np.array([1.5, 2.5])}))
+        assert data == {"values": [1.5, 2.5]}
+
+    def test_json_provider_datetime_matches_default(self, app):
+        """日時が標準のJSONプロバイダと同じ形式で出力されるテスト"""
+        from flask.json.provider import DefaultJSONProvider
+
+        value = {"at": datetime(2026, 1, 5, 9, 30, tzinfo=UTC)}
+        expected = json.loads(DefaultJSONProvider(app).dumps(value))
+
+        assert json.loads(app.json.dumps(value)) == expected
+        with app.test_request_context():
+            assert json.loads(app.json.response(value).data) == expected
+
+    def test_gzip_large_response(self, client, large_stock):
+        """大きなレスポンスがgzip圧縮されるテスト"""
+        response = client.get("/api/stocks/BIG.T", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        data = json.loads(gzip.decompress(response.data))
+        assert len(data["historical_data"]["close"]) == 252
+
+    def test_no_compression_for_small_or_unaccepted(self, client, large_stock):
+        """小さなレスポンス・非対応クライアントは圧縮しないテスト"""
+        response = client.get("/api/stocks", headers={"Accept-Encoding": "gzip"})
+        assert "Content-Encoding" not in response.headers
+
+        response = client.get("/api/stocks/BIG.T")
+        assert "Content-Encoding" not in response.headers
+        assert json.loads(response.data)["symbol"] == "BIG.T"
+
+
+class TestPriceBarAPI:
+    """価格バー取得APIのテスト"""
+
+    def test_get_bars(self, app, client):
+        """足の種類を指定した取得テスト"""
+        with app.app_context():
+            db.session.add(
+                PriceBar(
+                    symbol="BAR.T",
+                    interval="1h",
+                    bar_time=datetime(2026, 1, 5, 0, 0),
+                    open=1.0,
+                    high=2.0,
+                    low=0.5,
+                    close=1.5,
+                    volume=100,
+                )
+            )
+            db.session.commit()
+
+        response = client.get(
+            "/api/stocks/BAR.T/bars?interval=1h&start=2026-01-01&end=2026-01-31"
+        )
+        assert response.status_code == 200
+
+        data = json.loads(response.data)
+        assert data["close"] == [1.5]
+        assert data["timestamps"] == [1767571200]
+
+    def test_invalid_interval(self, client):
+        """不正な足種別のテスト"""
+        assert client.get("/api/stocks/BAR.T/bars?interval=2m").status_code == 400
+
+        response = client.post(
+            "/api/fetch-data",
+            data=json.dumps({"symbols": ["BAR.T"], "interval": "2m"}),
+            content_type="application/json",
+        )
+        assert response.status_code == 400
+
+
+class TestScreenerAPI:
+    """スクリーナーAPIのテスト"""
+
+    @pytest.fixture
+    def screener(self, app):
+        """テストデータを保存し、未構築のスクリーナーに差し替え"""
+        closes = [100.0] * 10 + [94.0]
+        stock = StockData(
+            symbol="DROP.T",
+            company_name="Drop",
+            current_price=94.0,
+            currency="JPY",
+            exchange="Tokyo",
+            historical_data={"close": closes, "volume": [100] * 11},
+        )
+        db.session.add(stock)
+        db.session.commit()
+
+        with patch("app.routes.api.screener_service", ScreenerService()) as screener:
+            yield screener
+
+    def test_screener(self, client, screener):
+        """条件に一致する銘柄が返るテスト"""
+        payload = {"filters": [{"field": "change_pct", "op": "<=", "value": -5}]}
+
+        response = client.post(
+            "/api/screener", data=json.dumps(payload), content_type="application/json"
+        )
+        assert response.status_code == 200
+
+        data = json.loads(response.data)
+        assert data["count"] == 1
+        assert data["results"][0]["symbol"] == "DROP.T"
+        assert data["results"][0]["change_pct"] == pytest.approx(-6.0)
+
+    def test_screener_invalid_filter(self, client, screener):
+        """不正な条件式で400が返るテスト"""
+        payload = {"filters": [{"field": "change_pct", "op": "~", "value": 1}]}
+
+        response = client.post(
+            "/api/screener", data=json.dumps(payload), content_type="application/json"
+        )
+        assert response.status_code == 400
+
+
+class TestCorrelationAPI:
+    """相関分析APIのテスト"""
+
+    def test_correlation(self, client):
+        """相関行列が返るテスト"""
+        for symbol, closes in [
+            ("A.T", [1.0, 2.0, 1.0, 2.0]),
+            ("B.T", [2.0, 4.0, 2.0, 4.0]),
+        ]:
+            db.session.add(
+                StockData(
+                    symbol=symbol,
+                    company_name=symbol,
+                    current_price=closes[-1],
+                    historical_data={
+                        "timestamps": [i * 86400 for i in range(4)],
+                        "close": closes,
+                    },
+                )
+            )
+        db.session.commit()
+
+        payload = {"symbols": ["A.T", "B.T"], "lookback": 3}
+        response = client.post(
+            "/api/analytics/correlation",
+            data=json.dumps(payload),
+            content_type="application/json",
+        )
+        assert response.status_code == 200
+
+        data = json.loads(response.data)
+        assert data["observations"] == 3
+        assert data["correlation"][0][1] == pytest.approx(1.0)
+
+    def test_correlation_requires_symbols(self, client):
+        """シンボル不足で400が返るテスト"""
+        response = client.post(
+            "/api/analytics/correlation",
+            data=json.dumps({"symbols": ["A.T"]}),
+            content_type="application/json",
+        )
+        assert response.status_code == 400
+
+
+class TestBacktestAPI:
+    """バックテストAPIのテスト"""
+
+    def test_backtest(self, client):
+        """バックテスト結果が返るテスト"""
+        closes = [10.0, 11.0, 12.0, 11.0, 13.0, 14.0]
+        db.session.add(
+            StockData(
+                symbol="BT.T",
+                company_name="Backtest",
+                current_price=closes[-1],
+                historical_data={
+                    "timestamps": [i * 86400 for i in range(len(closes))],
+                    "close": closes,
+                },
+            )
+        )
+        db.session.commit()
+
+        payload = {
+            "symbols": ["BT.T"],
+            "strategy": "threshold",
+            "params": {"window": 1, "threshold": [0, 5]},
+        }
+        response = client.post(
+            "/api/backtest", data=json.dumps(payload), content_type="application/json"
+        )
+        assert response.status_code == 200
+
+        data = json.loads(response.data)
+        assert data["bars"] == 6
+        assert [run["params"]["threshold"] for run in data["runs"]] == [0, 5]
+
+    def test_backtest_invalid_strategy(self, client):
+        """未対応の戦略で400が返るテスト"""
+        payload = {"symbols": ["BT.T"], "strategy": "magic", "params": {}}
+        response = client.post(
+            "/api/backtest", data=json.dumps(payload), content_type="application/json"
+        )
+        assert response.status_code == 400
+
+    def test_backtest_rejects_large_grid_before_expanding(self, client):
+        """組み合わせ数が上限を超える場合は展開前に400が返るテスト"""
+        payload = {
+            "symbols": ["BT.T"],
+            "strategy": "sma_crossover",
+            "params": {"fast": list(range(1, 1001)), "slow": list(range(2, 1002))},
+        }
+        with patch("app.routes.api.expand_grid") as mock_expand:
+            response = client.post("/api/backtest", json=payload)
+
+        assert response.status_code == 400
+        assert "10000" in response.get_json()["error"]
+        mock_expand.assert_not_called()
+
+
+class TestAdjustedPriceAPI:
+    """調整済み価格APIのテスト"""
+
+    def test_adjusted_history(self, client):
+        """adjusted=trueで配当落ち前の価格が調整されるテスト"""
+        db.session.add(
+            StockData(
+                symbol="DIV.T",
+                company_name="Dividend",
+                current_price=90.0,
+                historical_data={"timestamps": [100, 200], "close": [100.0, 90.0]},
+                adjustment_factors={
+                    "timestamps": [200],
+                    "price": [0.9],
+                },
+            )
+        )
+        db.session.commit()
+
+        raw = json.loads(client.get("/api/stocks/DIV.T").data)
+        adjusted = json.loads(client.get("/api/stocks/DIV.T?adjusted=true").data)
+
+        assert raw["historical_data"]["close"] == [100.0, 90.0]
+        assert adjusted["historical_data"]["close"] == pytest.approx([90.0, 90.0])
+        assert adjusted["historical_data"]["adjusted"] is True
+
+
+class TestProfilingAPI:
+    """リクエストのプロファイル取得のテスト"""
+
+    TOKEN = "secret-token"
+
+    @pytest.fixture
+    def store(self, app):
+        """トークンを設定し、空のプロファイル保存先に差し替え"""
+        app.config["PROFILING_TOKEN"] = self.TOKEN
+        store = ProfileStore(keep=5, max_per_minute=2)
+        with patch("app.profiling.profile_store", store), patch(
+            "app.routes.api.profile_store", store
+        ):
+            yield store
+
+    def _headers(self, token=TOKEN):
+        return {"X-Profile-Token": token}
+
+    def test_profile_with_header(self, client, store):
+        """トークン付きヘッダーのリクエストがプロファイルされるテスト"""
+        response = client.get("/api/stocks", headers=self._headers())
+        profile_id = response.headers["X-Profile-Id"]
+
+        listing = client.get("/api/admin/profiles", headers=self._headers())
+        assert listing.get_json()["profiles"][0]["path"] == "/api/stocks"
+        assert "raw" not in listing.get_json()["profiles"][0]
+
+        detail = client.get(
+            f"/api/admin/profiles/{profile_id}", headers=self._headers()
+        )
+        top = detail.get_json()["top"]
+        assert top and {"function", "calls", "cumtime_ms", "callers"} <= set(top[0])
+
+        raw = client.get(
+            f"/api/admin/profiles/{profile_id}/download", headers=self._headers()
+        )
+        assert raw.status_code == 200
+        assert isinstance(marshal.loads(raw.data), dict)
+
+    def test_rate_limit_and_auth(self, client, store):
+        """不正なトークンは対象外・認証エラー、1分あたりの上限を超えると取得しないテスト"""
+        response = client.get("/api/stocks", headers=self._headers("wrong"))
+        assert "X-Profile-Id" not in response.headers
+        assert client.get("/api/admin/profiles").status_code == 403
+
+        profiled = [
+            "X-Profile-Id" in client.get("/api/stocks", headers=self._headers()).headers
+            for _ in range(3)
+        ]
+        assert profiled == [True, True, False]
+        assert store.status()["skipped"] == 1
+
+    def test_admin_toggle(self, client, store):
+        """管理APIで有効化した期間はパスが一致するリクエストを取得するテスト"""
+        response = client.post(
+            "/api/admin/profiling",
+            json={"path_prefix": "/api/stocks", "sample_rate": 1.0},
+            headers=self._headers(),
+        )
+        assert response.get_json()["enabled"] is True
+
+        assert "X-Profile-Id" in client.get("/api/stocks").headers
+        assert "X-Profile-Id" not in client.get("/api/fetch-lanes").headers
+
+        response = client.post(
+            "/api/admin/profiling", json={"enabled": False}, headers=self._headers()
+        )
+        assert response.get_json()["enabled"] is False
+        assert "X-Profile-Id" not in client.get("/api/stocks").headers
+
+        response = client.post(
+            "/api/admin/profiling", json={"sample_rate": 2}, headers=self._headers()
+        )
+        assert response.status_code == 400
+
+    def test_redis_store_shared_between_workers(self):
+        """Redis共有時は有効化・取得結果・件数制限が全ワーカーで共有されるテスト"""
+        client = FakeRedis()
+        worker_a = ProfileStore(
+            keep=2, max_per_minute=2, redis_client=client, toggle_cache_seconds=0
+        )
+        worker_b = ProfileStore(
+            keep=2, max_per_minute=2, redis_client=client, toggle_cache_seconds=0
+        )
+
+        worker_a.enable("/api/stocks", 1.0, 60)
+        assert worker_b.wants("/api/stocks/A.T", explicit=False)
+        assert worker_b.status()["enabled"] is True
+
+        # 取得中は他のワーカーも取得しない
+        assert worker_a.try_start()
+        assert not worker_b.try_start()
+        worker_a.finish({"id": "p1", "path": "/api/stocks", "top": [], "raw": b"\x00"})
+
+        assert worker_b.try_start()
+        worker_b.finish({"id": "p2", "path": "/api/stocks", "top": [], "raw": b"\x01"})
+        assert not worker_a.try_start()  # 1分あたり2件の上限
+
+        assert [record["id"] for record in worker_a.list()] == ["p2", "p1"]
+        assert worker_a.get("p2")["raw"] == b"\x01"
+        assert worker_b.status()["skipped"] == 2
+
+        worker_b.disable()
+        assert worker_a.status()["enabled"] is False
+
+    def test_redis_outage_skips_profiling(self, client, app):
+        """Redisに接続できない間はプロファイルせず、リクエストは通常どおり処理するテスト"""
+        app.config["PROFILING_TOKEN"] = self.TOKEN
+        broken = Mock()
+        for name in ("get", "set", "incr", "delete"):
+            getattr(broken, name).side_effect = ConnectionError("redis down")
+        store = ProfileStore(redis_client=broken, toggle_cache_seconds=0)
+
+        with patch("app.profiling.profile_store", store):
+            response = client.get("/api/stocks", headers=self._headers())
+            assert response.status_code == 200
+            assert "X-Profile-Id" not in response.headers
+            assert client.get("/api/stocks").status_code == 200
+
+        # 取得枠が解放され、接続の回復後は再び取得できる
+        store.redis = FakeRedis()
+        assert store.try_start()
+        store.finish(None)
+
+
+class TestQueryMetrics:
+    """SQLクエリの計測とN+1検出のテスト"""
+
+    @pytest.fixture
+    def stocks(self, app):
+        """取得ログ付きの銘柄データ"""
+        with app.app_context():
+            for i in range(12):
+                stock = StockData(
+                    symbol=f"S{i}.T",
+                    company_name=f"Stock {i}",
+                    current_price=float(i),
+                    currency="JPY",
+                    exchange="TSE",
+                )
+                db.session.add(stock)
+                db.session.flush()
+                db.session.add(
+                    FetchLog(
+                        task_id="task-1",
+                        symbol=stock.symbol,
+                        status="success",
+                        started_at=datetime.now(UTC),
+                        stock_data_id=stock.id,
+                    )
+                )
+            db.session.commit()
+        query_metrics.reset()
+
+    def test_endpoint_query_budgets(self, app, client, stocks):
+        """主要エンドポイントのクエリ数の上限"""
+        with assert_max_queries(2):
+            client.get("/api/stocks")
+        with assert_max_queries(1):
+            client.get("/api/stocks/S1.T")
+        # 読み取りキャッシュを有効にした場合、2回目はキャッシュから返す
+        app.extensions["stock_cache"] = StockCache()
+        client.get("/api/stocks/S1.T")
+        with assert_max_queries(0):
+            client.get("/api/stocks/S1.T")
+        with assert_max_queries(1):
+            client.get("/api/changes?since=0")
+        with assert_max_queries(2):
+            client.get("/api/fetch-logs/stats?group_by=exchange")
+
+    def test_request_metrics(self, client, stocks):
+        """リクエストごとのクエリ数がヘッダーと集計APIに出力されるテスト"""
+        response = client.get("/api/stocks")
+        assert response.headers["X-DB-Query-Count"] == "2"
+        assert float(response.headers["X-DB-Time-Ms"]) >= 0
+
+        metrics = client.get("/api/metrics/db").get_json()["endpoints"]
+        assert metrics["api.get_stocks"]["requests"] == 1
+        assert metrics["api.get_stocks"]["max_queries"] == 2
+
+    def test_n_plus_one_detection(self, app, client, stocks, capsys):
+        """関連の遅延読み込みによる同一クエリの繰り返しを検出するテスト"""
+
+        def list_log_symbols():
+            return {"symbols": [log.stock_data.symbol for log in FetchLog.query.all()]}
+
+        app.add_url_rule("/test/n-plus-one", view_func=list_log_symbols)
+        response = client.get("/test/n-plus-one")
+
+        assert response.headers["X-DB-Query-Count"] == "13"
+        assert query_metrics.snapshot()["list_log_symbols"]["n_plus_one"] == 1
+        assert "N+1の可能性" in capsys.readouterr().out
+
+    def test_slow_query_log_redacts_parameters(self, app, client, stocks, capsys):
+        """遅いクエリのログにパラメータの値を出さないテスト"""
+        app.config["SQL_SLOW_QUERY_MS"] = 0
+
+        client.get("/api/stocks/SECRET.T")
+
+        output = capsys.readouterr().out
+        assert "遅いクエリ" in output
+        assert "SECRET.T" not in output
+
+    def test_normalize_and_redact(self):
+        """SQLの正規化とパラメータの伏せ字"""
+        assert (
+            normalize_statement("SELECT *  FROM t\n WHERE a = 'x' AND b = 10")
+            == "SELECT * FROM t WHERE a = ? AND b = ?"
+        )
+        assert redact_parameters({"symbol": "A.T"}) == {"symbol": "?"}
+        assert redact_parameters(("A.T", 1)) == ["?", "?"]
+        assert redact_parameters([("A.T",), ("B.T",)]) == [["?"], "... 2 rows"]
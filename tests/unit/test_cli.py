@@ -0,0 +1,200 @@
+"""
+単体テスト: CLIコマンドのテスト
+外部APIはモック化
+"""
+
+import json
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from app import create_app, db
+from app.models.stock_data import PriceBar, StockData
+
+
+@pytest.fixture
+def app():
+    """テスト用Flaskアプリケーション"""
+    app = create_app("testing")
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def symbols_file(tmp_path):
+    """シンボル一覧ファイル"""
+    path = tmp_path / "symbols.txt"
+    path.write_text("# 銘柄一覧\nAAA.T\nBBB.T\n\nCCC.T\nAAA.T\n", encoding="utf-8")
+    return path
+
+
+def _fake_stock_data(symbol, interval="1d"):
+    return {
+        "symbol": symbol,
+        "company_name": f"{symbol} Company",
+        "current_price": 100.0,
+        "currency": "JPY",
+        "market_state": "CLOSED",
+        "timezone": "JST",
+        "exchange": "Tokyo",
+        "historical_data": {},
+    }
+
+
+class TestBackfillCommand:
+    """backfillコマンドのテスト"""
+
+    def test_backfill_saves_all_symbols(self, app, symbols_file):
+        """全シンボルが保存されチェックポイントが記録されるテスト"""
+        runner = app.test_cli_runner()
+
+        with patch(
+            "app.cli.YahooFinanceService._request_stock_data",
+            side_effect=_fake_stock_data,
+        ):
+            result = runner.invoke(
+                args=["backfill", str(symbols_file), "--batch-size", "2"]
+            )
+
+        assert result.exit_code == 0, result.output
+        assert "成功 3 件" in result.output
+        assert StockData.query.count() == 3
+
+        checkpoint = json.loads(
+            (symbols_file.parent / "symbols.txt.checkpoint.json").read_text()
+        )
+        assert checkpoint["completed"] == ["AAA.T", "BBB.T", "CCC.T"]
+
+    def test_backfill_resumes_from_checkpoint(self, app, symbols_file, tmp_path):
+        """チェックポイントから再開し失敗分のみ再取得するテスト"""
+        checkpoint = tmp_path / "progress.json"
+        checkpoint.write_text(json.dumps({"completed": ["AAA.T"], "failed": []}))
+        runner = app.test_cli_runner()
+
+        with patch(
+            "app.cli.YahooFinanceService._request_stock_data",
+            side_effect=lambda s, i: None if s == "CCC.T" else _fake_stock_data(s),
+        ) as mock_fetch:
+            result = runner.invoke(
+                args=["backfill", str(symbols_file), "--checkpoint", str(checkpoint)]
+            )
+
+        assert result.exit_code == 0, result.output
+        assert sorted(c.args[0] for c in mock_fetch.call_args_list) == [
+            "BBB.T",
+            "CCC.T",
+        ]
+        saved = json.loads(checkpoint.read_text())
+        assert saved["completed"] == ["AAA.T", "BBB.T"]
+        assert saved["failed"] == ["CCC.T"]
+
+
+class TestSnapshotCommand:
+    """snapshotコマンドのテスト"""
+
+    @pytest.fixture
+    def bars(self, app):
+        """2銘柄・2か月分の日足"""
+        for symbol in ("AAA.T", "BBB.T"):
+            for day in (datetime(2026, 1, 30), datetime(2026, 2, 2)):
+                db.session.add(
+                    PriceBar(
+                        symbol=symbol,
+                        interval="1d",
+                        bar_time=day,
+                        open=1.0,
+                        high=2.0,
+                        low=0.5,
+                        close=1.5,
+                        volume=100,
+                    )
+                )
+        db.session.commit()
+
+    @pytest.mark.parametrize("file_format", ["arrow", "parquet"])
+    def test_snapshot_roundtrip(self, app, bars, tmp_path, file_format):
+        """書き出したスナップショットをメモリマップで読み込めるテスト"""
+        pytest.importorskip("pyarrow")
+        from app.services.snapshot_reader import SnapshotReader
+
+        runner = app.test_cli_runner()
+        result = runner.invoke(
+            args=[
+                "snapshot",
+                str(tmp_path),
+                "--format",
+                file_format,
+                "--partition-by",
+                "month",
+                "--interval",
+                "1d",
+            ]
+        )
+        assert result.exit_code == 0, result.output
+
+        reader = SnapshotReader(str(tmp_path))
+        assert reader.partitions("1d") == ["month=2026-01", "month=2026-02"]
+
+        arrays = reader.to_numpy("1d", partitions=["month=2026-02"])
+        assert sorted(arrays["symbol"].tolist()) == ["AAA.T", "BBB.T"]
+        assert arrays["close"].tolist() == [1.5, 1.5]
+        assert reader.to_pandas("1d")["volume"].sum() == 400
+
+    def test_snapshot_requires_pyarrow(self, app, tmp_path):
+        """pyarrow未インストール時はエラー終了するテスト"""
+        runner = app.test_cli_runner()
+
+        with patch("app.services.snapshot_reader.pa", None):
+            result = runner.invoke(args=["snapshot", str(tmp_path)])
+
+        assert result.exit_code != 0
+        assert "pyarrow" in result.output
+
+
+class TestPartitionBarsCommand:
+    """partition-barsコマンドのテスト"""
+
+    def test_noop_without_postgresql(self, app):
+        """PostgreSQL以外では何もしないテスト"""
+        runner = app.test_cli_runner()
+
+        result = runner.invoke(args=["partition-bars"])
+
+        assert result.exit_code == 0, result.output
+        assert "不要" in result.output
+
+
+class TestResumeTasksCommand:
+    """resume-tasksコマンドのテスト"""
+
+    def test_resume_tasks(self, app, tmp_path):
+        """停止したタスクを残りの銘柄から最後まで実行するテスト"""
+        from app.config import Config
+        from app.services.progress import FileProgressBackend, ProgressService
+
+        progress_file = str(tmp_path / "progress.json")
+        progress = ProgressService(FileProgressBackend(progress_file))
+        progress.initialize_task("task-1", 3, {"symbols": ["AAA.T", "BBB.T", "CCC.T"]})
+        progress.update_progress("task-1", 1)
+        progress.backend.update(
+            task_id="task-1",
+            fields={"updated_at": "2000-01-01", "heartbeat_at": "2000-01-01"},
+        )
+
+        runner = app.test_cli_runner()
+        with patch.object(Config, "PROGRESS_FILE", progress_file), patch(
+            "app.cli.YahooFinanceService._request_stock_data",
+            side_effect=_fake_stock_data,
+        ) as fetch:
+            result = runner.invoke(args=["resume-tasks"])
+            again = runner.invoke(args=["resume-tasks"])
+
+        assert result.exit_code == 0, result.output
+        assert "再開: 1 件" in result.output
+        assert [c.args[0] for c in fetch.call_args_list] == ["BBB.T", "CCC.T"]
+        assert progress.get_status("task-1")["status"] == "completed"
+        assert "再開: 0 件" in again.output
@@ -1,14 +1,59 @@
+import json
 import os
 import tempfile
+import threading
+import time
+from datetime import UTC, datetime
 from unittest.mock import Mock, patch
 
+import numpy as np
 import pytest
+import requests
 
 from app import create_app, db
-from app.models.stock_data import StockData
-from app.services.database import DatabaseService
-from app.services.progress import ProgressService
+from app.config import TestingConfig
+from app.models.stock_data import FetchLog, PriceBar, StockData
+from app.services.adjustments import (
+    apply_adjustments,
+    compute_factors,
+    merge_actions,
+    parse_events,
+)
+from app.services.analytics import AnalyticsService, align_closes
+from app.services.backtest import (
+    BacktestService,
+    expand_grid,
+    moving_average,
+    run_strategy,
+)
+from app.services.data_quality import clean_history
+from app.services.database import (
+    DatabaseService,
+    add_save_listener,
+    remove_save_listener,
+)
+from app.services.fetch_log import FetchLogWriter
+from app.services.job_runner import JobRunner
+from app.services.partitioning import (
+    PricePartitionManager,
+    interval_partition_ddl,
+    month_partition_ddl,
+    month_partition_name,
+    months_between,
+)
+from app.services.price_bars import PriceBarService
+from app.services.progress import (
+    FileProgressBackend,
+    ProgressService,
+    RedisProgressBackend,
+)
+from app.services.quote_hub import QuoteHub, QuoteSubscription
+from app.services.screener import ScreenerService
+from app.services.stock_cache import LocalCache, StockCache
+from app.services.symbol_index import SymbolIndexService
+from app.services.upstream import CircuitBreaker, UpstreamClient
 from app.services.yahoo_finance import YahooFinanceService
+from tests.helpers import FakeRedis
 
 
 @pytest.fixture
@@ -77,11 +122,39 @@ class TestYahooFinanceService:
         assert result["current_price"] == 1500.0
         assert result["currency"] == "JPY"
         assert "historical_data" in result
+        assert result["corporate_actions"] == {"dividends": [], "splits": []}
 
         # APIが正しく呼ばれたか確認
         mock_get.assert_called_once()
         args, kwargs = mock_get.call_args
         assert "TEST.T" in args[0]
+        assert kwargs["params"]["events"] == "div,splits"
+
+    @patch("app.services.yahoo_finance.requests.get")
+    def test_lookup_symbol_upstream_error(self, mock_get):
+        """検索APIの障害時は見つからない場合と区別してNoneを返すテスト"""
+        mock_get.side_effect = requests.exceptions.ConnectionError("down")
+
+        service = YahooFinanceService()
+        assert service.lookup_symbol("TEST.T") is None
+        assert service.validate_symbol("TEST.T") is False
+
+    @patch("app.services.yahoo_finance.requests.get")
+    def test_fetch_quote(self, mock_get, sample_yahoo_response):
+        """配信用の最新株価取得テスト"""
+        sample_yahoo_response["chart"]["result"][0]["meta"][
+            "chartPreviousClose"
+        ] = 1200.0
+        mock_response = Mock()
+        mock_response.json.return_value = sample_yahoo_response
+        mock_get.return_value = mock_response
+
+        quote = YahooFinanceService().fetch_quote("TEST.T")
+
+        assert quote["price"] == 1500.0
+        assert quote["change"] == 300.0
+        assert quote["change_pct"] == 25.0
+        assert mock_get.call_args.kwargs["params"] == {"interval": "1d", "range": "1d"}
 
     @patch("app.services.yahoo_finance.requests.get")
     def test_fetch_stock_data_api_error(self, mock_get):
@@ -260,6 +333,84 @@ class TestDatabaseService:
             assert result is False
 
 
+class TestReadReplicaRouting:
+    """リードレプリカ振り分けのテスト"""
+
+    @pytest.fixture
+    def replica_app(self, tmp_path):
+        """レプリカ（別SQLiteファイル）付きのテスト用アプリケーション"""
+        replica_uri = f"sqlite:///{tmp_path / 'replica.db'}"
+
+        with patch.object(TestingConfig, "SQLALCHEMY_REPLICA_URIS", [replica_uri]):
+            app = create_app("testing")
+
+        with app.app_context():
+            db.create_all()
+            db.metadata.create_all(db.engines["replica_0"])
+            yield app
+            db.drop_all()
+            # バインド用に生成されたメタデータを他のテストへ持ち越さない
+            db.metadatas.pop("replica_0", None)
+
+    def _insert(self, engine, company_name):
+        """指定エンジンにテストデータを直接投入"""
+        with engine.begin() as conn:
+            conn.execute(
+                StockData.__table__.insert().values(
+                    symbol="REPL.T",
+                    company_name=company_name,
+                    current_price=100.0,
+                    currency="JPY",
+                    created_at=datetime.now(UTC),
+                    updated_at=datetime.now(UTC),
+                )
+            )
+
+    def test_reads_go_to_replica(self, replica_app):
+        """読み取りがレプリカに振り分けられるテスト"""
+        with patch("app.services.database._last_write_at", None):
+            self._insert(db.engines[None], "Primary")
+            self._insert(db.engines["replica_0"], "Replica")
+
+            service = DatabaseService()
+            result = service.get_stock_by_symbol("REPL.T")
+
+            assert result["company_name"] == "Replica"
+            assert service.get_stock_count() == 1
+
+    def test_read_your_writes_uses_primary(self, replica_app):
+        """書き込み直後はプライマリから読むテスト"""
+        self._insert(db.engines["replica_0"], "Replica")
+
+        service = DatabaseService()
+        service.save_stock_data(
+            {
+                "symbol": "REPL.T",
+                "company_name": "Primary",
+                "current_price": 100.0,
+                "currency": "JPY",
+                "market_state": "CLOSED",
+                "timezone": "JST",
+                "exchange": "Tokyo",
+                "historical_data": None,
+            }
+        )
+
+        result = service.get_stock_by_symbol("REPL.T")
+        assert result["company_name"] == "Primary"
+
+    def test_fallback_to_primary_on_replica_error(self, replica_app):
+        """レプリカ障害時にプライマリへフォールバックするテスト"""
+        with patch("app.services.database._last_write_at", None):
+            self._insert(db.engines[None], "Primary")
+            db.metadata.drop_all(db.engines["replica_0"])
+
+            service = DatabaseService()
+            result = service.get_stock_by_symbol("REPL.T")
+
+            assert result["company_name"] == "Primary"
+
+
 class TestProgressService:
     """プログレスサービスのテスト"""
 
@@ -331,3 +482,1346 @@ class TestProgressService:
 
         status = service.get_status("not-exist")
         assert status is None
+
+
+class TestProgressBackends:
+    """プログレスバックエンドのテスト"""
+
+    def test_file_backend_sees_other_instance_updates(self, tmp_path):
+        """別インスタンスによるファイル更新が反映されるテスト"""
+        progress_file = str(tmp_path / "progress.json")
+        reader = ProgressService(FileProgressBackend(progress_file))
+        writer = ProgressService(FileProgressBackend(progress_file))
+
+        writer.initialize_task("shared-1", 2)
+        writer.update_progress("shared-1", 1, "1件完了")
+
+        status = reader.get_status("shared-1")
+        assert status is not None
+        assert status["current_item"] == 1
+
+    def test_file_backend_failed_save_keeps_previous_file(self, tmp_path):
+        """保存に失敗しても既存ファイルが壊れないテスト"""
+        progress_file = str(tmp_path / "progress.json")
+        service = ProgressService(FileProgressBackend(progress_file))
+        service.initialize_task("atomic-1", 2)
+
+        with patch("app.services.progress.json.dump", side_effect=TypeError("書き込み失敗")):
+            service.update_progress("atomic-1", 1)
+
+        with open(progress_file, "r", encoding="utf-8") as f:
+            assert json.load(f)["atomic-1"]["current_item"] == 0
+        assert os.listdir(tmp_path) == ["progress.json"]
+
+    def test_redis_backend_shared_between_services(self):
+        """Redisバックエンドでサービス間の状態が共有されるテスト"""
+        client = FakeRedis()
+        writer = ProgressService(RedisProgressBackend(client))
+        reader = ProgressService(RedisProgressBackend(client))
+
+        writer.initialize_task("redis-1", 4)
+        writer.update_progress("redis-1", 2, "2件完了")
+        writer.complete_task("redis-1")
+
+        status = reader.get_status("redis-1")
+        assert status["status"] == "completed"
+        assert status["current_item"] == 2
+        assert status["details"][0]["message"] == "2件完了"
+        assert "redis-1" in reader.get_all_tasks()
+
+    def test_redis_backend_ttl_and_notifications(self):
+        """TTL設定と変更通知のテスト"""
+        client = FakeRedis()
+        backend = RedisProgressBackend(client, ttl_seconds=60)
+        pubsub = backend.subscribe()
+        service = ProgressService(backend)
+
+        service.initialize_task("redis-2", 1)
+        service.error_task("redis-2", "失敗")
+
+        assert "progress:task:redis-2" in client.expiry
+        message = json.loads(pubsub.get_message()["data"])
+        assert message == {
+            "task_id": "redis-2",
+            "status": "running",
+            "progress": 0,
+            "message": "タスクを開始しました",
+        }
+        assert json.loads(pubsub.get_message()["data"])["status"] == "error"
+
+    def test_redis_backend_trims_details(self):
+        """詳細履歴が最新20件に制限されるテスト"""
+        service = ProgressService(RedisProgressBackend(FakeRedis()))
+        service.initialize_task("redis-3", 30)
+
+        for i in range(25):
+            service.update_progress("redis-3", i + 1)
+
+        status = service.get_status("redis-3")
+        assert len(status["details"]) == 20
+        assert status["details"][-1]["item"] == 25
+
+    def test_update_unknown_task(self):
+        """存在しないタスクの更新テスト"""
+        service = ProgressService(RedisProgressBackend(FakeRedis()))
+        assert service.update_progress("missing", 1) is False
+
+    @pytest.mark.parametrize("backend_type", ["file", "redis"])
+    def test_claim_task_only_once(self, tmp_path, backend_type):
+        """同じ時点のタスクを引き受けられるのは1回のみのテスト"""
+        if backend_type == "file":
+            backend = FileProgressBackend(str(tmp_path / "progress.json"))
+        else:
+            backend = RedisProgressBackend(FakeRedis())
+        service = ProgressService(backend)
+        service.initialize_task("claim-1", 3)
+        snapshot = service.get_status("claim-1")
+
+        assert service.claim_task("claim-1", snapshot, {"updated_at": "later"})
+        assert not service.claim_task("claim-1", snapshot, {"updated_at": "later"})
+        assert service.get_status("claim-1")["owner"].endswith(f":{os.getpid()}")
+
+        service.cancel_task("claim-1")
+        latest = service.get_status("claim-1")
+        assert not service.claim_task("claim-1", latest, {"message": "再開"})
+
+    def test_live_task_is_not_stale(self, tmp_path):
+        """進捗が古くても生存時刻が更新されているタスクは停止とみなさないテスト"""
+        service = ProgressService(FileProgressBackend(str(tmp_path / "progress.json")))
+        service.initialize_task("live-1", 3)
+        service.initialize_task("other-1", 3)
+        stale = "2000-01-01T00:00:00+00:00"
+        for task_id in ("live-1", "other-1"):
+            service.backend.update(
+                task_id, {"updated_at": stale, "heartbeat_at": stale}
+            )
+        # 別のプロセスが引き受けたタスクの生存時刻は更新しない
+        service.backend.update("other-1", {"owner": "other-host:1"})
+
+        assert service.heartbeat(["live-1", "other-1"]) == 1
+        assert list(service.find_stale_tasks(600)) == ["other-1"]
+
+    def test_find_duplicate_uses_index(self):
+        """重複判定が全タスクを読まずに索引から引くテスト"""
+        client = FakeRedis()
+        service = ProgressService(RedisProgressBackend(client))
+        service.initialize_task(
+            "dup-1", 1, {"fingerprint": "fp", "idempotency_key": "key-1"}
+        )
+        service.initialize_task(
+            "dup-2", 1, {"fingerprint": "fp", "idempotency_key": "key-1"}
+        )
+
+        with patch.object(service.backend, "load_all", side_effect=AssertionError):
+            # 冪等キーは最初のタスク、フィンガープリントは実行中の最新タスクを指す
+            assert service.find_duplicate("other", "key-1") == "dup-1"
+            assert service.find_duplicate("fp") == "dup-2"
+            service.complete_task("dup-2")
+            assert service.find_duplicate("fp") is None
+        assert client.expiry["progress:index:fingerprint:fp"]
+
+
+class TestFetchLogWriter:
+    """取得ログ書き込みのテスト"""
+
+    def test_buffers_until_batch_size(self, app):
+        """件数しきい値までバッファされるテスト"""
+        with app.app_context():
+            writer = FetchLogWriter(max_batch_size=3, flush_interval=3600)
+
+            for symbol in ["A.T", "B.T"]:
+                writer.record("task-1", symbol, "success", datetime.now(UTC))
+
+            assert writer.pending == 2
+            assert FetchLog.query.count() == 0
+
+            writer.record("task-1", "C.T", "error", datetime.now(UTC))
+
+            assert writer.pending == 0
+            assert FetchLog.query.count() == 3
+
+    def test_fetch_multiple_symbols_records_logs(self, app):
+        """一括取得で銘柄ごとの取得ログが記録されるテスト"""
+        with app.app_context():
+            service = YahooFinanceService()
+
+            def fake_request(symbol, interval="1d"):
+                if symbol == "BAD.T":
+                    raise ValueError("broken payload")
+                return {
+                    "symbol": symbol,
+                    "company_name": "Good Company",
+                    "current_price": 100.0,
+                    "currency": "JPY",
+                    "market_state": "CLOSED",
+                    "timezone": "JST",
+                    "exchange": "Tokyo",
+                    "historical_data": {},
+                }
+
+            with patch.object(service, "_request_stock_data", side_effect=fake_request):
+                task_id = service.fetch_multiple_symbols(["GOOD.T", "BAD.T"])
+
+            logs = {
+                log.symbol: log for log in FetchLog.query.filter_by(task_id=task_id)
+            }
+            assert logs["GOOD.T"].status == "success"
+            assert logs["GOOD.T"].stock_data.symbol == "GOOD.T"
+            assert logs["GOOD.T"].duration_ms >= 0
+            assert logs["BAD.T"].status == "error"
+            assert "broken payload" in logs["BAD.T"].error_detail
+            assert logs["BAD.T"].stock_data_id is None
+
+
+class TestSymbolIndexService:
+    """シンボルマスタのテスト"""
+
+    @pytest.fixture
+    def master_file(self, tmp_path):
+        """シンボルマスタCSV"""
+        path = tmp_path / "symbols.csv"
+        path.write_text(
+            "symbol,name,exchange\n"
+            "7203.T,Toyota Motor Corp,TSE\n"
+            "7201.T,Nissan Motor Co,TSE\n"
+            "AAPL,Apple Inc,NASDAQ\n",
+            encoding="utf-8",
+        )
+        return str(path)
+
+    def test_validate_and_negative_cache(self, app, master_file):
+        """検証と否定キャッシュのテスト"""
+        with app.app_context():
+            index = SymbolIndexService(master_file)
+            index.load()
+            remote = Mock(return_value=False)
+
+            assert index.validate("7203.T", remote) is True
+            assert index.validate("aapl", remote) is True
+            assert index.validate("UNKNOWN", remote) is False
+            assert index.validate("UNKNOWN", remote) is False
+            remote.assert_called_once_with("UNKNOWN")
+
+    def test_upstream_error_is_not_cached(self, app, master_file):
+        """上流の障害で確認できないシンボルは受け付け、否定キャッシュに記録しないテスト"""
+        with app.app_context():
+            index = SymbolIndexService(master_file)
+            index.load()
+            remote = Mock(side_effect=[None, False])
+
+            assert index.validate("FLAKY.T", remote) is True
+            assert index.validate("FLAKY.T", remote) is False
+            assert remote.call_count == 2
+
+    def test_negative_cache_is_bounded(self, app, master_file):
+        """否定キャッシュが件数上限で古い順に削除されるテスト"""
+        app.config["SYMBOL_NEGATIVE_CACHE_MAX_ENTRIES"] = 2
+        with app.app_context():
+            index = SymbolIndexService(master_file)
+            index.load()
+            remote = Mock(return_value=False)
+
+            for symbol in ["X1", "X2", "X3"]:
+                index.validate(symbol, remote)
+
+            assert list(index._negative) == ["X2", "X3"]
+            index.validate("X1", remote)
+            assert remote.call_count == 4
+
+    def test_refresh_runs_in_background(self, app, master_file):
+        """初回は同期的に読み込み、再読み込みはリクエストのスレッド外で行われるテスト"""
+        app.config["SYMBOL_MASTER_REFRESH_SECONDS"] = 0
+        index = SymbolIndexService(master_file)
+        with app.app_context(), patch.object(
+            index, "load", wraps=index.load
+        ) as mock_load:
+            index.refresh_if_stale()
+            assert index.contains("7203.T")
+            assert not index._refreshing
+
+            with patch("app.services.symbol_index.threading.Thread") as thread:
+                index.refresh_if_stale()
+            thread.return_value.start.assert_called_once()
+
+        assert mock_load.call_count == 1
+
+    def test_search_prefix(self, app, master_file):
+        """前方一致検索のテスト"""
+        with app.app_context():
+            index = SymbolIndexService(master_file)
+            index.load()
+
+            symbols = [r["symbol"] for r in index.search("72")]
+            assert symbols == ["7201.T", "7203.T"]
+            assert index.search("moto", limit=1)[0]["symbol"] == "7201.T"
+            assert index.search("apple")[0]["exchange"] == "NASDAQ"
+            assert index.search("") == []
+
+    def test_includes_stored_symbols(self, app, master_file):
+        """保存済みシンボルがマスタに含まれるテスト"""
+        with app.app_context():
+            db.session.add(
+                StockData(symbol="SAVED.T", company_name="Saved", current_price=1.0)
+            )
+            db.session.commit()
+
+            index = SymbolIndexService(master_file)
+            assert index.load() == 4
+            assert index.contains("SAVED.T")
+
+
+class TestPriceBarService:
+    """価格バー（複数の足種別）のテスト"""
+
+    def _minute_bars(self, start, count):
+        """1分足の履歴データ"""
+        return {
+            "timestamps": [start + i * 60 for i in range(count)],
+            "open": [100.0 + i for i in range(count)],
+            "high": [101.0 + i for i in range(count)],
+            "low": [99.0 + i for i in range(count)],
+            "close": [100.5 + i for i in range(count)],
+            "volume": [10] * count,
+        }
+
+    def test_store_and_get_bars(self, app):
+        """保存・取得と上書きのテスト"""
+        with app.app_context():
+            service = PriceBarService()
+            start = int(datetime(2026, 1, 5, tzinfo=UTC).timestamp())
+            history = self._minute_bars(start, 3)
+            history["close"][2] = None  # 欠損した足は保存しない
+
+            assert service.store_bars("BAR.T", "1m", history) == 2
+            history["close"][1] = 999.0
+            service.store_bars("BAR.T", "1m", history)
+
+            bars = service.get_bars(
+                "BAR.T", "1m", start=datetime(2026, 1, 1), end=datetime(2026, 1, 6)
+            )
+            assert bars["timestamps"] == [start, start + 60]
+            assert bars["close"] == [100.5, 999.0]
+
+    def test_rollup_aggregates_buckets(self, app):
+        """下位足から上位足への集約テスト"""
+        with app.app_context():
+            service = PriceBarService()
+            start = int(datetime(2026, 1, 5, 9, 0, tzinfo=UTC).timestamp())
+            service.store_bars("BAR.T", "1m", self._minute_bars(start, 7))
+
+            assert service.rollup("1m", datetime(2026, 1, 6)) == 2
+            db.session.commit()
+
+            bars = service.get_bars(
+                "BAR.T", "5m", start=datetime(2026, 1, 1), end=datetime(2026, 1, 6)
+            )
+            assert bars["timestamps"] == [start, start + 300]
+            assert bars["open"] == [100.0, 105.0]
+            assert bars["high"] == [105.0, 107.0]
+            assert bars["low"] == [99.0, 104.0]
+            assert bars["close"] == [104.5, 106.5]
+            assert bars["volume"] == [50, 20]
+
+    def test_rollup_in_batches(self, app):
+        """分割して読み込んでも区間をまたがず同じ結果になるテスト"""
+        with app.app_context():
+            service = PriceBarService()
+            start = int(datetime(2026, 1, 5, 9, 0, tzinfo=UTC).timestamp())
+            service.store_bars("A.T", "1m", self._minute_bars(start, 23))
+            service.store_bars("B.T", "1m", self._minute_bars(start, 4))
+
+            with patch("app.services.price_bars.ROLLUP_BATCH_SIZE", 7):
+                assert service.rollup("1m", datetime(2026, 1, 6)) == 6
+            db.session.commit()
+
+            bars = service.get_bars(
+                "A.T", "5m", start=datetime(2026, 1, 1), end=datetime(2026, 1, 6)
+            )
+            assert bars["timestamps"] == [start + i * 300 for i in range(5)]
+            assert bars["volume"] == [50, 50, 50, 50, 30]
+            assert bars["close"][-1] == 122.5
+
+    def test_apply_retention(self, app):
+        """保持期間を過ぎた足が集約後に削除されるテスト"""
+        with app.app_context():
+            service = PriceBarService()
+            now = datetime(2026, 1, 20)
+            old = int(datetime(2026, 1, 5, tzinfo=UTC).timestamp())
+            recent = int(datetime(2026, 1, 19, tzinfo=UTC).timestamp())
+            service.store_bars("BAR.T", "1m", self._minute_bars(old, 5))
+            service.store_bars("BAR.T", "1m", self._minute_bars(recent, 5))
+
+            results = service.apply_retention(now)
+
+            assert results["1m"] == {
+                "rolled_up": 1,
+                "purged": 5,
+                "dropped_partitions": 0,
+            }
+            assert PriceBar.query.filter_by(interval="1m").count() == 5
+            assert PriceBar.query.filter_by(interval="5m").count() == 1
+
+    def test_partition_error_is_recorded(self, app):
+        """パーティション作成の失敗が取得失敗として記録されるテスト"""
+        from app.services.partitioning import PartitionError
+
+        with app.app_context():
+            start = int(datetime(2026, 1, 5, tzinfo=UTC).timestamp())
+            stock_data = {
+                "symbol": "BAR.T",
+                "company_name": "Bar",
+                "current_price": 2.0,
+                "currency": "JPY",
+                "market_state": "REGULAR",
+                "timezone": "JST",
+                "exchange": "Tokyo",
+                "interval": "1m",
+                "historical_data": self._minute_bars(start, 2),
+            }
+            attempt = {"symbol": "BAR.T", "error_detail": None}
+            log_writer = Mock()
+
+            with patch(
+                "app.services.price_bars.partition_manager.ensure_range",
+                side_effect=PartitionError("未移行"),
+            ):
+                success = YahooFinanceService().store_fetch_result(
+                    "task-1",
+                    stock_data,
+                    {
+                        **attempt,
+                        "started_at": None,
+                        "completed_at": None,
+                        "duration_ms": None,
+                    },
+                    DatabaseService(),
+                    log_writer,
+                )
+
+            assert success is False
+            assert log_writer.record.call_args.kwargs["error_detail"] == "未移行"
+            assert PriceBar.query.count() == 0
+
+    def test_intraday_fetch_keeps_daily_history(self, app):
+        """日中足の取得で日足履歴が上書きされないテスト"""
+        with app.app_context():
+            db.session.add(
+                StockData(
+                    symbol="BAR.T",
+                    company_name="Bar",
+                    current_price=1.0,
+                    historical_data={"timestamps": [1], "close": [1.0]},
+                )
+            )
+            db.session.commit()
+
+            service = YahooFinanceService()
+            start = int(datetime.now(UTC).timestamp()) // 300 * 300
+            intraday = {
+                "symbol": "BAR.T",
+                "company_name": "Bar",
+                "current_price": 2.0,
+                "currency": "JPY",
+                "market_state": "REGULAR",
+                "timezone": "JST",
+                "exchange": "Tokyo",
+                "interval": "5m",
+                "historical_data": self._minute_bars(start, 2),
+            }
+            with patch.object(service, "_request_stock_data", return_value=intraday):
+                service.fetch_multiple_symbols(["BAR.T"], interval="5m")
+
+            stock = StockData.query.filter_by(symbol="BAR.T").first()
+            assert stock.current_price == 2.0
+            assert stock.historical_data == {"timestamps": [1], "close": [1.0]}
+            assert PriceBar.query.filter_by(symbol="BAR.T", interval="5m").count() == 2
+
+
+class TestPricePartitioning:
+    """価格バーのパーティション管理のテスト"""
+
+    def test_parent_table_ddl(self):
+        """PostgreSQLでは足の種類でLIST分割されるテスト"""
+        from sqlalchemy.dialects import postgresql
+        from sqlalchemy.schema import CreateTable
+
+        ddl = str(CreateTable(PriceBar.__table__).compile(dialect=postgresql.dialect()))
+        assert "PARTITION BY LIST (interval)" in ddl
+
+    def test_partition_ddl(self):
+        """足の種類・月別パーティションのDDLテスト"""
+        month = datetime(2026, 12, 1)
+        assert month_partition_name("1m", month) == "price_bars_1m_2026_12"
+        assert month_partition_ddl("1m", month) == (
+            "CREATE TABLE IF NOT EXISTS price_bars_1m_2026_12 "
+            "PARTITION OF price_bars_1m "
+            "FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')"
+        )
+        assert "FOR VALUES IN ('5m') PARTITION BY RANGE (bar_time)" in (
+            interval_partition_ddl("5m")[0]
+        )
+        assert months_between(datetime(2026, 11, 15), datetime(2027, 1, 2)) == [
+            datetime(2026, 11, 1),
+            datetime(2026, 12, 1),
+            datetime(2027, 1, 1),
+        ]
+
+    def test_noop_on_sqlite(self, app):
+        """SQLiteではパーティション操作を行わないテスト"""
+        with app.app_context():
+            manager = PricePartitionManager()
+            assert not manager.is_supported()
+            assert manager.ensure_partitions(now=datetime(2026, 1, 20)) == []
+            assert manager.drop_expired("1m", datetime(2026, 1, 1)) == []
+
+
+class TestScreenerService:
+    """スクリーナーのテスト"""
+
+    def _history(self, closes, volumes):
+        return {
+            "timestamps": list(range(len(closes))),
+            "open": closes,
+            "high": [c + 1 for c in closes],
+            "low": [c - 1 for c in closes],
+            "close": closes,
+            "volume": volumes,
+        }
+
+    @pytest.fixture
+    def screener(self, app):
+        """2銘柄を読み込んだスクリーナー"""
+        with app.app_context():
+            db_service = DatabaseService()
+            for symbol, closes, volumes in [
+                ("DOWN.T", [100.0] * 25 + [90.0], [100] * 25 + [300]),
+                ("UP.T", [100.0] * 25 + [102.0], [100] * 26),
+            ]:
+                db_service.save_stock_data(
+                    {
+                        "symbol": symbol,
+                        "company_name": symbol,
+                        "current_price": closes[-1],
+                        "currency": "JPY",
+                        "market_state": "CLOSED",
+                        "timezone": "JST",
+                        "exchange": "Tokyo",
+                        "historical_data": self._history(closes, volumes),
+                    }
+                )
+
+            screener = ScreenerService(window=30)
+            assert screener.load() == 2
+            yield screener
+
+    def test_screen_derived_fields(self, screener):
+        """騰落率と出来高比率による絞り込みのテスト"""
+        result = screener.screen(
+            [
+                {"field": "change_pct", "op": "<", "value": -5},
+                {"field": "volume_ratio", "op": ">", "value": 1},
+                {"field": "exchange", "op": "==", "value": "Tokyo"},
+            ]
+        )
+
+        assert result["total"] == 2
+        assert [item["symbol"] for item in result["results"]] == ["DOWN.T"]
+        assert result["results"][0]["change_pct"] == pytest.approx(-10.0)
+        assert result["results"][0]["volume_ratio"] == pytest.approx(3.0)
+
+    def test_screen_sort_and_return(self, screener):
+        """N日リターンでの並び替えと52週高値からの乖離のテスト"""
+        result = screener.screen(
+            [{"field": "high_52w_pct", "op": "between", "value": [-20, 0]}],
+            sort="return_5d",
+            order="asc",
+        )
+
+        assert [item["symbol"] for item in result["results"]] == ["DOWN.T", "UP.T"]
+        assert result["results"][1]["return_5d"] == pytest.approx(2.0)
+
+    def test_incremental_update(self, app, screener):
+        """保存通知による行の差し替えと銘柄追加のテスト"""
+        add_save_listener(screener.on_stock_saved)
+        try:
+            with app.app_context():
+                db_service = DatabaseService()
+                db_service.save_stock_data(
+                    {
+                        "symbol": "UP.T",
+                        "company_name": "UP.T",
+                        "current_price": 80.0,
+                        "currency": "JPY",
+                        "market_state": "REGULAR",
+                        "timezone": "JST",
+                        "exchange": "Tokyo",
+                    }
+                )
+                db_service.save_stock_data(
+                    {
+                        "symbol": "NEW.O",
+                        "company_name": "New",
+                        "current_price": 10.0,
+                        "currency": "USD",
+                        "market_state": "REGULAR",
+                        "timezone": "EST",
+                        "exchange": "NASDAQ",
+                        "historical_data": self._history([10.0, 10.0], [1, 1]),
+                    }
+                )
+        finally:
+            remove_save_listener(screener.on_stock_saved)
+
+        result = screener.screen([{"field": "price", "op": "<", "value": 85}])
+        assert result["total"] == 3
+        assert {item["symbol"] for item in result["results"]} == {"UP.T", "NEW.O"}
+
+    def test_invalid_filter(self, screener):
+        """不正な条件式のテスト"""
+        with pytest.raises(ValueError):
+            screener.screen([{"field": "unknown", "op": ">", "value": 1}])
+        with pytest.raises(ValueError):
+            screener.screen([{"field": "exchange", "op": ">", "value": 1}])
+
+
+class TestAnalyticsService:
+    """相関分析のテスト"""
+
+    def _save(self, symbol, days, closes):
+        DatabaseService().save_stock_data(
+            {
+                "symbol": symbol,
+                "company_name": symbol,
+                "current_price": closes[-1],
+                "currency": "JPY",
+                "market_state": "CLOSED",
+                "timezone": "JST",
+                "exchange": "Tokyo",
+                "historical_data": {
+                    "timestamps": [day * 86400 + 3600 for day in days],
+                    "close": closes,
+                },
+            }
+        )
+
+    def test_align_closes_forward_fills(self):
+        """日付の整列と欠損日の前方埋めのテスト"""
+        histories = {
+            "A": {"timestamps": [0, 86400, 2 * 86400], "close": [1.0, 2.0, 3.0]},
+            "B": {"timestamps": [0, 2 * 86400], "close": [10.0, 30.0]},
+        }
+
+        closes, days = align_closes(histories, ["A", "B"], lookback=5)
+
+        assert days.tolist() == [0, 1, 2]
+        assert closes.tolist() == [[1.0, 10.0], [2.0, 10.0], [3.0, 30.0]]
+
+    def test_correlation_and_cache(self, app):
+        """相関行列の算出とキャッシュのテスト"""
+        with app.app_context():
+            days = list(range(20000, 20030))
+            rng = np.random.default_rng(0)
+            base = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(days))))
+            self._save("A.T", days, base.tolist())
+            self._save("B.T", days, (base * 2).tolist())
+            self._save("C.T", days, (100 / base).tolist())
+
+            service = AnalyticsService()
+            result = service.correlation(["A.T", "B.T", "C.T", "NONE.T"], lookback=10)
+
+            assert result["symbols"] == ["A.T", "B.T", "C.T"]
+            assert result["missing"] == ["NONE.T"]
+            assert result["observations"] == 10
+            corr = np.array(result["correlation"])
+            assert corr[0, 1] == pytest.approx(1.0)
+            assert corr[0, 2] == pytest.approx(-1.0)
+            assert result["cached"] is False
+
+            assert (
+                service.correlation(["C.T", "B.T", "A.T", "NONE.T"], 10)["cached"]
+                is False
+            )
+            assert service.correlation(["A.T", "B.T", "C.T", "NONE.T"], 10)["cached"]
+
+            # いずれかの銘柄が更新されるとキャッシュは使われない
+            self._save("A.T", days + [20030], base.tolist() + [base[-1]])
+            assert not service.correlation(["A.T", "B.T", "C.T", "NONE.T"], 10)[
+                "cached"
+            ]
+
+
+class TestBacktestService:
+    """バックテストのテスト"""
+
+    CLOSES = np.array([[1.0, 10.0], [2.0, 10.0], [4.0, 20.0], [2.0, 20.0], [4.0, 10.0]])
+
+    def test_expand_grid(self):
+        """パラメータの組み合わせ展開と検証のテスト"""
+        combos = expand_grid("sma_crossover", {"fast": [1, 5], "slow": [3, 10]})
+        assert combos == [
+            {"fast": 1, "slow": 3},
+            {"fast": 1, "slow": 10},
+            {"fast": 5, "slow": 10},
+        ]
+        with pytest.raises(ValueError):
+            expand_grid("unknown", {})
+        with pytest.raises(ValueError):
+            expand_grid("threshold", {"window": 0, "threshold": 1})
+
+    def test_sma_crossover(self):
+        """移動平均クロスの評価額・売買回数のテスト（翌日から反映）"""
+        equity, trades, exposure = run_strategy(
+            "sma_crossover", self.CLOSES, [{"fast": 1, "slow": 2}]
+        )
+
+        assert equity[0, :, 0].tolist() == [1.0, 1.0, 2.0, 1.0, 1.0]
+        assert equity[0, :, 1].tolist() == [1.0, 1.0, 1.0, 1.0, 1.0]
+        assert trades[0].tolist() == [3.0, 2.0]
+        assert exposure[0].tolist() == [0.5, 0.25]
+
+    def test_rebalance(self):
+        """定期リバランスの評価額のテスト"""
+        equity, trades, _ = run_strategy(
+            "rebalance", self.CLOSES, [{"period": 1}, {"period": 100}]
+        )
+
+        assert equity[0, :, 0].tolist() == [1.0, 1.5, 3.0, 2.25, 2.8125]
+        assert equity[1, :, 0].tolist() == [1.0, 1.5, 3.0, 2.0, 2.5]
+        assert trades[:, 0].tolist() == [4.0, 1.0]
+
+    def test_rebalance_fee_on_turnover(self):
+        """リバランス時の売買金額に手数料が課されるテスト"""
+        equity, _, _ = run_strategy(
+            "rebalance", self.CLOSES, [{"period": 1}, {"period": 100}], 0.01
+        )
+
+        # 1日目の比率は 2:1 → 等金額に戻す売買は評価額の1/3
+        assert equity[0, 1, 0] == pytest.approx(1.5)
+        assert equity[0, 2, 0] == pytest.approx(3.0 * (1 - 0.01 / 3))
+        # リバランスしない場合は手数料がかからない
+        assert equity[1, :, 0].tolist() == [1.0, 1.5, 3.0, 2.0, 2.5]
+
+    def test_sma_crossover_uneven_histories(self):
+        """履歴の開始日が異なる銘柄も開始後は売買されるテスト"""
+        closes = np.array(
+            [[1.0, np.nan], [2.0, np.nan], [3.0, 1.0], [4.0, 2.0], [5.0, 3.0]]
+        )
+
+        averages = moving_average(closes, 2)
+        assert np.isnan(averages[:3, 1]).all()
+        assert averages[3:, 1].tolist() == [1.5, 2.5]
+        assert averages[1:, 0].tolist() == [1.5, 2.5, 3.5, 4.5]
+
+        _, trades, exposure = run_strategy(
+            "sma_crossover", closes, [{"fast": 1, "slow": 2}]
+        )
+        assert trades[0, 1] > 0
+        assert exposure[0, 1] > 0
+
+    def test_run_with_process_pool(self, app):
+        """プロセスプールでの実行結果が逐次実行と一致するテスト"""
+        with app.app_context():
+            rng = np.random.default_rng(1)
+            closes = (100 * np.exp(np.cumsum(rng.normal(0, 0.02, 60)))).tolist()
+            DatabaseService().save_stock_data(
+                {
+                    "symbol": "BT.T",
+                    "company_name": "Backtest",
+                    "current_price": closes[-1],
+                    "currency": "JPY",
+                    "market_state": "CLOSED",
+                    "timezone": "JST",
+                    "exchange": "Tokyo",
+                    "historical_data": {
+                        "timestamps": [(20000 + i) * 86400 for i in range(60)],
+                        "close": closes,
+                    },
+                }
+            )
+            app.config["BACKTEST_PARALLEL_MIN_RUNS"] = 1
+
+            service = BacktestService()
+            params = {"fast": [2, 3, 5], "slow": [10, 20]}
+            serial = service.run(["BT.T", "NONE.T"], "sma_crossover", params)
+            parallel = service.run(
+                ["BT.T"], "sma_crossover", params, workers=2, include_equity=True
+            )
+
+            assert serial["missing"] == ["NONE.T"]
+            assert serial["bars"] == 60
+            assert [run["total_return"] for run in serial["runs"]] == [
+                run["total_return"] for run in parallel["runs"]
+            ]
+            assert len(parallel["runs"][0]["equity"]) == len(parallel["dates"]) == 60
+
+
+class TestPriceAdjustments:
+    """配当・株式分割の調整のテスト"""
+
+    # Yahoo Financeのチャートと同様に、200の株式分割（2:1）は反映済みの四本値
+    HISTORY = {
+        "timestamps": [100, 200, 300, 400],
+        "open": [100.0, 100.0, 100.0, 50.0],
+        "high": [100.0, 100.0, 100.0, 50.0],
+        "low": [100.0, 100.0, 100.0, 50.0],
+        "close": [100.0, 100.0, 100.0, None],
+        "volume": [20, 20, 20, 40],
+    }
+
+    def test_parse_events(self):
+        """Yahoo Financeのeventsの変換テスト"""
+        events = {
+            "dividends": {"300": {"amount": 10.0, "date": 300}},
+            "splits": {
+                "200": {"date": 200, "numerator": 2, "denominator": 1},
+            },
+        }
+        assert parse_events(events) == {
+            "dividends": [[300, 10.0]],
+            "splits": [[200, 2.0, 1.0]],
+        }
+        assert parse_events(None) == {"dividends": [], "splits": []}
+
+    def test_merge_and_apply(self):
+        """イベント追加時の係数算出と調整済み価格のテスト"""
+        incoming = {"dividends": [[300, 10.0]], "splits": [[200, 2.0, 1.0]]}
+        actions, changed = merge_actions(None, incoming, self.HISTORY)
+        assert changed
+        assert actions["dividends"] == [[300, 10.0, 0.9]]
+
+        # 既知のイベントのみなら再計算しない
+        _, changed = merge_actions(actions, incoming, self.HISTORY)
+        assert not changed
+
+        # 分割は四本値に反映済みのため、係数には配当のみを含める
+        factors = compute_factors(actions)
+        assert factors["timestamps"] == [300]
+        assert factors["price"] == pytest.approx([0.9])
+        assert "volume" not in factors
+
+        adjusted = apply_adjustments(self.HISTORY, factors)
+        assert adjusted["adjusted"] is True
+        assert adjusted["close"][:3] == pytest.approx([90.0, 90.0, 100.0])
+        assert adjusted["close"][3] is None
+        assert adjusted["volume"] == [20, 20, 20, 40]
+
+    @patch("app.services.yahoo_finance.requests.get")
+    def test_split_in_chart_payload_not_applied_twice(self, mock_get, app):
+        """分割を含む実際の形式のチャートで、分割前の価格が二重に調整されないテスト"""
+        day = 86400
+        start = 1717372800  # 2024-06-03 00:00 UTC
+        timestamps = [start + day * i for i in range(5)]
+        split_at = timestamps[2]
+        dividend_at = timestamps[4]
+        # quoteは分割調整済み（分割前の実際の終値は2倍）、adjcloseは配当も反映済み
+        closes = [101.0, 102.0, 100.0, 99.0, 97.0]
+        payload = {
+            "chart": {
+                "result": [
+                    {
+                        "meta": {
+                            "currency": "JPY",
+                            "symbol": "SPLT.T",
+                            "exchangeName": "JPX",
+                            "regularMarketPrice": 97.0,
+                            "timezone": "JST",
+                        },
+                        "timestamp": timestamps,
+                        "events": {
+                            "dividends": {
+                                str(dividend_at): {
+                                    "amount": 1.98,
+                                    "date": dividend_at,
+                                }
+                            },
+                            "splits": {
+                                str(split_at): {
+                                    "date": split_at,
+                                    "numerator": 2,
+                                    "denominator": 1,
+                                    "splitRatio": "2:1",
+                                }
+                            },
+                        },
+                        "indicators": {
+                            "quote": [
+                                {
+                                    "open": [100.0, 101.0, 101.0, 100.0, 98.0],
+                                    "high": [102.0, 103.0, 101.5, 100.5, 98.5],
+                                    "low": [99.5, 100.5, 99.0, 98.5, 96.5],
+                                    "close": closes,
+                                    "volume": [2000, 1800, 900, 1000, 1100],
+                                }
+                            ],
+                            "adjclose": [
+                                {"adjclose": [c * 0.98 for c in closes[:4]] + [97.0]}
+                            ],
+                        },
+                    }
+                ],
+                "error": None,
+            }
+        }
+        mock_response = Mock()
+        mock_response.json.return_value = payload
+        mock_get.return_value = mock_response
+
+        with app.app_context():
+            stock_data = YahooFinanceService().fetch_stock_data("SPLT.T")
+            assert stock_data["corporate_actions"]["splits"] == [[split_at, 2.0, 1.0]]
+            db_service = DatabaseService()
+            db_service.save_stock_data(stock_data)
+
+            stock = db_service.get_stock_by_symbol("SPLT.T")
+            factors = db_service.get_adjustment_factors("SPLT.T")
+            adjusted = apply_adjustments(stock["historical_data"], factors)
+
+        # 調整後の終値はYahooのadjcloseと一致し、出来高は変更しない
+        adjclose = payload["chart"]["result"][0]["indicators"]["adjclose"][0]
+        assert adjusted["close"] == pytest.approx(adjclose["adjclose"])
+        assert adjusted["open"][0] == pytest.approx(98.0)
+        assert adjusted["volume"] == [2000, 1800, 900, 1000, 1100]
+
+    def test_factors_recomputed_on_new_event(self, app):
+        """保存時に新しいイベントがあった場合のみ係数を更新するテスト"""
+        with app.app_context():
+            db_service = DatabaseService()
+            stock_data = {
+                "symbol": "ADJ.T",
+                "company_name": "Adjusted",
+                "current_price": 50.0,
+                "currency": "JPY",
+                "market_state": "CLOSED",
+                "timezone": "JST",
+                "exchange": "Tokyo",
+                "historical_data": self.HISTORY,
+                "corporate_actions": {"dividends": [], "splits": [[200, 2.0, 1.0]]},
+            }
+            db_service.save_stock_data(stock_data)
+            assert db_service.get_adjustment_factors("ADJ.T")["price"] == []
+
+            # 取得期間外になったイベントは保持し、新しいイベントを追加する
+            stock_data["corporate_actions"] = {
+                "dividends": [[300, 10.0]],
+                "splits": [],
+            }
+            db_service.save_stock_data(stock_data)
+
+            factors = db_service.get_adjustment_factors("ADJ.T")
+            assert factors["timestamps"] == [300]
+            stock = db_service.get_stock_by_symbol("ADJ.T")
+            assert len(stock["corporate_actions"]["splits"]) == 1
+
+
+class TestDataQuality:
+    """取り込み時のデータ品質チェックのテスト"""
+
+    def test_clean_history(self):
+        """欠損・重複・順序の乱れ・高安値の不整合の整形テスト"""
+        history = {
+            "timestamps": [300, 100, 200, 200, None, 400],
+            "open": [3.0, 1.0, None, 2.0, 9.0, 4.0],
+            "high": [3.0, 1.0, 2.0, 2.0, 9.0, 3.0],
+            "low": [3.0, 1.0, 2.0, 2.0, 9.0, 4.0],
+            "close": [3.0, 1.0, 2.0, 2.5, 9.0, None],
+            "volume": [0, 10, 20, None, 90, 40],
+        }
+
+        cleaned, report = clean_history(history, "1m")
+
+        assert cleaned["timestamps"] == [100, 200, 300]
+        assert cleaned["close"] == [1.0, 2.5, 3.0]
+        assert cleaned["high"] == [1.0, 2.5, 3.0]
+        assert cleaned["volume"] == [10, 0, 0]
+        assert report["input_bars"] == 6
+        assert report["output_bars"] == 3
+        assert report["null_bars"] == 2
+        assert report["duplicates"] == 1
+        assert report["out_of_order"] == 1
+        assert report["filled_values"] == 0
+        assert report["ohlc_fixed"] == 1
+        # 欠損して0で補完した出来高は出来高ゼロに数えない
+        assert report["zero_volume"] == 1
+        assert report["missing_volume"] == 1
+
+    def test_detect_gaps_and_spikes(self):
+        """欠損区間と一時的な跳ね（異常値）の検出テスト"""
+        rng = np.random.default_rng(2)
+        closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, 50)))
+        closes[25] *= 1.5
+        timestamps = np.arange(50) * 60
+        timestamps[40:] += 300  # 5本分の欠損
+        history = {"timestamps": timestamps.tolist(), "close": closes.tolist()}
+
+        _, report = clean_history(history, "1m")
+
+        assert report["outliers"] == 1
+        assert report["outlier_timestamps"] == [25 * 60]
+        assert report["gaps"] == 1
+        assert report["max_gap_seconds"] == 360
+
+    def test_empty_history(self):
+        """履歴なしの場合のテスト"""
+        cleaned, report = clean_history(None)
+        assert cleaned is None
+        assert report["output_bars"] == 0
+
+
+class TestUpstreamClient:
+    """上流ホストのサーキットブレーカー・ヘッジ要求のテスト"""
+
+    HOSTS = ["https://primary", "https://secondary"]
+
+    def _response(self, status=200):
+        response = Mock()
+        response.status_code = status
+        if status >= 400:
+            error = requests.HTTPError(response=response)
+            response.raise_for_status.side_effect = error
+        return response
+
+    def test_circuit_breaker_states(self):
+        """連続失敗で開き、待機後の試行で閉じるテスト"""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        breaker.record_failure()
+        assert breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert not breaker.allow_request()
+
+        time.sleep(0.06)
+        assert breaker.allow_request()  # 半開状態の試行は1件のみ
+        assert not breaker.allow_request()
+        breaker.record_success()
+        assert breaker.state == "closed"
+
+    @patch("app.services.upstream.requests.get")
+    def test_failover_and_open_circuit(self, mock_get):
+        """障害ホストを飛ばして次のホストへ切り替えるテスト"""
+
+        def fake_get(url, params=None, timeout=None):
+            if url.startswith("https://primary"):
+                raise requests.ConnectionError("down")
+            return self._response()
+
+        mock_get.side_effect = fake_get
+        client = UpstreamClient(self.HOSTS, failure_threshold=2, reset_timeout=60)
+
+        for _ in range(3):
+            client.get("/chart", params={})
+
+        called = [c.args[0] for c in mock_get.call_args_list]
+        # 2回失敗した後はサーキットが開き、primaryには送らない
+        assert called.count("https://primary/chart") == 2
+        assert called.count("https://secondary/chart") == 3
+
+    @patch("app.services.upstream.requests.get")
+    def test_client_error_does_not_open_circuit(self, mock_get):
+        """404などの要求エラーはホスト障害として扱わないテスト"""
+        mock_get.return_value = self._response(404)
+        client = UpstreamClient(self.HOSTS, failure_threshold=1)
+
+        with pytest.raises(requests.HTTPError):
+            client.get("/chart", params={})
+
+        assert mock_get.call_count == 1
+        assert client.breakers["https://primary"].state == "closed"
+
+    @patch("app.services.upstream.requests.get")
+    def test_hedged_request(self, mock_get):
+        """応答が遅い場合に別ホストへのヘッジ要求の応答を使うテスト"""
+        fast = self._response()
+
+        def fake_get(url, params=None, timeout=None):
+            if url.startswith("https://primary"):
+                time.sleep(0.5)
+                return self._response()
+            return fast
+
+        mock_get.side_effect = fake_get
+        client = UpstreamClient(self.HOSTS, hedge_enabled=True, hedge_min_delay=0.01)
+        for _ in range(20):
+            client.latency.record(0.01)
+
+        started = time.perf_counter()
+        assert client.get("/chart", params={}) is fast
+        assert time.perf_counter() - started < 0.4
+
+
+class TestJobRunner:
+    """優先度レーン付きジョブ実行のテスト"""
+
+    @staticmethod
+    def _steps(name, count, log, delay=0.0, done=None):
+        for _ in range(count):
+            time.sleep(delay)
+            log.append(name)
+            yield
+        if done is not None:
+            done.set()
+
+    def test_weighted_lane_selection(self):
+        """レーンの重みに比例して実行順が割り当てられるテスト"""
+        runner = JobRunner(weights={"interactive": 4, "bulk": 1})
+        runner.lanes["interactive"].jobs.append(iter(()))
+        runner.lanes["bulk"].jobs.append(iter(()))
+
+        picked = []
+        for _ in range(10):
+            lane, job = runner._take()
+            picked.append(next(n for n, v in runner.lanes.items() if v is lane))
+            lane.running -= 1
+            lane.jobs.append(job)
+
+        assert picked.count("interactive") == 8
+        assert picked.count("bulk") == 2
+
+    def test_lane_cap(self):
+        """同時実行数の上限に達したレーンは選ばれないテスト"""
+        runner = JobRunner(caps={"bulk": 1})
+        runner.lanes["bulk"].jobs.extend([iter(()), iter(())])
+
+        assert runner._take() is not None
+        assert runner._take() is None
+
+    def test_interactive_not_blocked_by_bulk(self, app):
+        """一括取得の実行中でもinteractiveのジョブがすぐに実行されるテスト"""
+        app.config["FETCH_WORKERS"] = 2
+        runner = JobRunner(caps={"bulk": 1})
+        log = []
+        done = threading.Event()
+
+        with app.app_context():
+            runner.submit("bulk", self._steps("bulk", 50, log, delay=0.01))
+            runner.submit("interactive", self._steps("interactive", 3, log, done=done))
+
+            assert done.wait(timeout=2)
+            assert log.count("bulk") < 50
+            runner.shutdown()
+
+        assert log.count("bulk") == 50
+
+    def test_heartbeat_for_queued_and_running_jobs(self, app):
+        """待機中・実行中のジョブのキーが生存通知され、終了後は外れるテスト"""
+        app.config["FETCH_WORKERS"] = 1
+        beats = []
+        runner = JobRunner(heartbeat=beats.append, heartbeat_seconds=0.01)
+        log = []
+
+        with app.app_context():
+            runner.submit("bulk", self._steps("a", 10, log, delay=0.01), key="task-a")
+            runner.submit("bulk", self._steps("b", 10, log, delay=0.01), key="task-b")
+            assert runner.active_keys() == ["task-a", "task-b"]
+            runner.shutdown()
+
+        assert ["task-a", "task-b"] in beats
+        assert runner.active_keys() == []
+
+    def test_eager_when_no_workers(self, app):
+        """FETCH_WORKERSが0の場合は登録時に同期実行されるテスト"""
+        runner = JobRunner()
+        log = []
+
+        with app.app_context():
+            runner.submit("bulk", self._steps("bulk", 3, log))
+
+        assert log == ["bulk"] * 3
+        with pytest.raises(ValueError):
+            with app.app_context():
+                runner.submit("unknown", iter(()))
+
+
+class TestQuoteHub:
+    """株価のリアルタイム配信のテスト"""
+
+    @staticmethod
+    def _quote(symbol, price, market_time=1):
+        return {"symbol": symbol, "price": price, "market_time": market_time}
+
+    def test_shared_poller_per_symbol(self):
+        """購読者数に関わらず銘柄ごとのポーリングは1本であるテスト"""
+        calls = []
+
+        def fetcher(symbol):
+            calls.append(symbol)
+            return self._quote(symbol, 100.0)
+
+        hub = QuoteHub(fetcher, poll_interval=0.02)
+        subscriptions = [hub.subscribe(["A.T"]) for _ in range(5)]
+        subscriptions.append(hub.subscribe(["A.T", "B.T"]))
+
+        for subscription in subscriptions:
+            assert subscription.get(timeout=1)[0]["price"] == 100.0
+        time.sleep(0.1)
+
+        assert hub.stats()["pollers"] == 2
+        assert hub.stats()["symbols"]["A.T"] == 6
+        # 価格が変わらない間は再配信しない
+        assert subscriptions[0].get(timeout=0.05) == []
+        # 購読者数ではなくポーリング間隔に比例した回数しか取得しない
+        assert calls.count("A.T") < 15
+
+        for subscription in subscriptions:
+            hub.unsubscribe(subscription)
+        assert hub.stats() == {"symbols": {}, "pollers": 0}
+
+        stopped_at = len(calls)
+        time.sleep(0.1)
+        assert len(calls) <= stopped_at + 2
+
+    def test_slow_consumer_receives_latest(self):
+        """送信が遅い購読者には銘柄ごとの最新値のみが残るテスト"""
+        subscription = QuoteSubscription(["A.T"])
+        for price in (1.0, 2.0, 3.0):
+            subscription.push(self._quote("A.T", price))
+        subscription.push(self._quote("B.T", 9.0))
+
+        updates = subscription.get(timeout=0)
+
+        assert [(q["symbol"], q["price"]) for q in updates] == [
+            ("A.T", 3.0),
+            ("B.T", 9.0),
+        ]
+        assert subscription.dropped == 2
+
+    def test_poll_error_keeps_running(self):
+        """上流のエラーでポーリングが止まらないテスト"""
+        results = iter([requests.ConnectionError("down"), self._quote("A.T", 5.0)])
+
+        def fetcher(symbol):
+            result = next(results, self._quote("A.T", 5.0))
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        hub = QuoteHub(fetcher, poll_interval=0.01)
+        subscription = hub.subscribe(["A.T"])
+        try:
+            assert subscription.get(timeout=1)[0]["price"] == 5.0
+        finally:
+            hub.unsubscribe(subscription)
+
+
+class TestStockCache:
+    """銘柄データの2階層キャッシュのテスト"""
+
+    def test_local_cache_bounds(self):
+        """件数・サイズの上限とTTLで追い出されるテスト"""
+        cache = LocalCache(max_entries=2, max_bytes=10, ttl_seconds=60)
+        cache.set("a", b"1111")
+        cache.set("b", b"2222")
+        cache.get("a")  # aを最近使用にする
+        cache.set("c", b"3333")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == b"1111"
+        assert cache.evictions == 1
+
+        cache.set("d", b"44444444")
+        assert cache.size <= 10
+        assert cache.get("a") is None
+
+        cache.set("big", b"x" * 11)
+        assert cache.get("big") is None
+
+        expiring = LocalCache(max_entries=2, max_bytes=10, ttl_seconds=0.01)
+        expiring.set("a", b"1")
+        time.sleep(0.02)
+        assert expiring.get("a") is None
+
+    def test_read_through_and_metrics(self):
+        """読み込み結果を保存し、呼び出しごとに独立した辞書を返すテスト"""
+        cache = StockCache()
+        loader = Mock(return_value={"symbol": "A.T", "current_price": 1.0})
+
+        first = cache.get_or_load("A.T", loader)
+        first["current_price"] = 999.0
+        second = cache.get_or_load("A.T", loader)
+
+        assert second["current_price"] == 1.0
+        assert loader.call_count == 1
+        assert cache.get_or_load("NONE.T", lambda: None) is None
+
+        stats = cache.stats()
+        assert stats["local_hits"] == 1
+        assert stats["misses"] == 2
+        assert stats["entries"] == 1
+        assert stats["bytes"] > 0
+
+    def test_shared_tier_and_invalidation(self):
+        """Redisの共有階層と、pub/subによる他ワーカーの無効化のテスト"""
+        redis = FakeRedis()
+        worker_a = StockCache(redis_client=redis, background_listener=False)
+        worker_b = StockCache(redis_client=redis, background_listener=False)
+        loader = Mock(return_value={"symbol": "A.T", "current_price": 1.0})
+
+        worker_a.get_or_load("A.T", loader)
+        worker_b.get_or_load("A.T", loader)
+        assert loader.call_count == 1
+        assert worker_b.stats()["shared_hits"] == 1
+
+        worker_a.invalidate("A.T")
+        assert worker_b.process_invalidations() == 1
+        assert worker_b.stats()["remote_invalidations"] == 1
+
+        loader.return_value = {"symbol": "A.T", "current_price": 2.0}
+        assert worker_b.get_or_load("A.T", loader)["current_price"] == 2.0
+        assert loader.call_count == 2
+
+    def test_shared_tier_skips_value_invalidated_by_other_worker(self):
+        """読み込み中に他ワーカーが無効化した値を共有階層に書き戻さないテスト"""
+        redis = FakeRedis()
+        worker_a = StockCache(redis_client=redis, background_listener=False)
+        worker_b = StockCache(redis_client=redis, background_listener=False)
+
+        def stale_loader():
+            worker_b.invalidate("A.T")
+            return {"symbol": "A.T", "current_price": 1.0}
+
+        worker_a.get_or_load("A.T", stale_loader)
+        assert redis.get("stock-cache:A.T") is None
+
+        fresh = worker_b.get_or_load(
+            "A.T", lambda: {"symbol": "A.T", "current_price": 2.0}
+        )
+        assert fresh["current_price"] == 2.0
+        assert redis.get("stock-cache:A.T") is not None
+
+    def test_invalidated_during_load_is_not_stored(self):
+        """読み込み中に無効化された値はキャッシュしないテスト"""
+        cache = StockCache()
+
+        def loader():
+            cache.invalidate("A.T")
+            return {"symbol": "A.T", "current_price": 1.0}
+
+        cache.get_or_load("A.T", loader)
+        assert cache.stats()["entries"] == 0
+
+    def test_database_service_invalidates_on_save(self, app):
+        """保存・削除時にキャッシュが無効化されるテスト"""
+        sample_stock_data = {
+            "symbol": "TEST.T",
+            "company_name": "Test Company",
+            "current_price": 1500.0,
+            "currency": "JPY",
+            "market_state": "CLOSED",
+            "timezone": "JST",
+            "exchange": "Tokyo",
+        }
+        app.extensions["stock_cache"] = StockCache()
+        with app.app_context():
+            service = DatabaseService()
+            service.save_stock_data(sample_stock_data)
+            assert service.get_stock_by_symbol("TEST.T")["current_price"] == 1500.0
+
+            service.save_stock_data({**sample_stock_data, "current_price": 1600.0})
+            assert service.get_stock_by_symbol("TEST.T")["current_price"] == 1600.0
+            assert service.get_stock_by_symbol("TEST.T")["current_price"] == 1600.0
+
+            service.delete_stock("TEST.T")
+            assert service.get_stock_by_symbol("TEST.T") is None
+
+            stats = app.extensions["stock_cache"].stats()
+            assert stats["local_hits"] == 1
+            assert stats["invalidations"] == 3